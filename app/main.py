@@ -1,17 +1,94 @@
 from __future__ import annotations
 
-from pathlib import Path
-from fastapi import FastAPI, File, UploadFile
-from fastapi.responses import JSONResponse, FileResponse
+from contextlib import asynccontextmanager
+from pathlib import Path, PurePosixPath
+from typing import Iterator, List, Optional, Tuple
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+from fastapi import FastAPI, File, Query, Request, UploadFile
+from fastapi.responses import JSONResponse, FileResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
 from dotenv import load_dotenv
 
-from app.services.pipeline import parse_excel
-
 load_dotenv()  
 
-app = FastAPI(title="Excel Data Cleaner", version="1.0.0")
+from app.models.schemas import ExportFormat, ExportLayout, JobStatus, MappingCorrection, OutputFormat
+from app.services.llm_mapper import MAPPING_FAILED_WARNING, mapper_mode
+from app.services.metrics import (
+    HTTP_REQUESTS,
+    HTTP_SECONDS,
+    PROFILE_HEADER,
+    PROFILING_ENABLED,
+    PROMETHEUS_MEDIA_TYPE,
+    REGISTRY as METRICS,
+    STAGE_SECONDS,
+    SamplingProfiler,
+)
+from app.services.cells import dump_json
+from app.services.executor import ExecutorBusy, get_executor, shutdown_executor
+from app.services.export import ExportUnavailable, check_export_format, export_archive
+from app.services.incremental import get_incremental_store
+from app.services.jobs import QueueFull, get_job_queue, shutdown_job_queue
+from app.services.pipeline import (
+    iter_parse_batch,
+    parse_batch,
+    parse_excel_async,
+    parse_excel_incremental,
+    parse_workbook,
+    stream_parse_excel_async,
+)
+from app.services.registry import RegistrySnapshot, get_registry, get_registry_service
+from app.services.result_cache import get_result_cache, result_cache_key
+from app.services.streaming import DEFAULT_CHUNK_CELLS, NDJSON_MEDIA_TYPE, error_lines, iter_batch_ndjson, iter_ndjson
+from app.services.templates import get_template_store
+from app.services.uploads import SpooledUpload, UploadTooLarge, max_upload_bytes, spool_stream, spool_upload
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    get_registry()
+    get_executor()
+    get_job_queue()
+    yield
+    shutdown_job_queue()
+    shutdown_executor()
+
+
+app = FastAPI(title="Excel Data Cleaner", version="1.0.0", lifespan=lifespan)
 
 BASE_DIR = Path(__file__).resolve().parent
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "1000"))
+# Routes taking one workbook: a Content-Length beyond the upload limit plus multipart framing is refused up front.
+SINGLE_UPLOAD_ROUTES = {"/parse", "/parse/stream", "/jobs"}
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+def _too_large(max_bytes: int) -> JSONResponse:
+    return JSONResponse(status_code=413, content={"status": "error", "warnings": [f"Upload exceeds the {max_bytes} byte limit."]})
+
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    length = request.headers.get("content-length")
+    if request.method == "POST" and request.url.path in SINGLE_UPLOAD_ROUTES and length and length.isdigit():
+        limit = max_upload_bytes()
+        if int(length) > limit + MULTIPART_OVERHEAD_BYTES:
+            return _too_large(limit)
+    return await call_next(request)
+
+# Registered last so it is the outermost middleware and also counts requests the size guard rejects.
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = getattr(request.scope.get("route"), "path", None)
+    if route is None:
+        # Uploads refused by the size guard never reach routing.
+        route = request.url.path if request.url.path in SINGLE_UPLOAD_ROUTES else "unmatched"
+    HTTP_SECONDS.observe(time.perf_counter() - start, method=request.method, route=route)
+    HTTP_REQUESTS.inc(method=request.method, route=route, status=str(response.status_code))
+    return response
 
 @app.get("/")
 def home():
@@ -21,15 +98,410 @@ def home():
 def health():
     return {"status": "ok"}
 
-@app.post("/parse")
-async def parse(file: UploadFile = File(...)):
+@app.get("/metrics")
+def metrics():
+    return Response(content=METRICS.render(), media_type=PROMETHEUS_MEDIA_TYPE)
+
+def _registry_info(snapshot: RegistrySnapshot) -> dict:
+    return {
+        "version": snapshot.version,
+        "parameters": len(snapshot.parameters),
+        "assets": len(snapshot.assets),
+        "loaded_at": snapshot.loaded_at,
+    }
+
+@app.get("/registry")
+def registry_info():
+    return _registry_info(get_registry())
+
+@app.post("/registry/reload")
+def registry_reload():
+    try:
+        return _registry_info(get_registry_service().reload())
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"status": "error", "warnings": [f"Registry reload failed: {e}"]})
+
+async def _receive_upload(file: UploadFile) -> Tuple[Optional[SpooledUpload], Optional[JSONResponse]]:
+    """Spool a single .xlsx upload to disk, or return the error response to send instead."""
     filename = file.filename or ""
     if not filename.lower().endswith(".xlsx"):
-        return JSONResponse(status_code=400, content={"status": "error", "warnings": ["Only .xlsx files are supported."]})
+        return None, JSONResponse(status_code=400, content={"status": "error", "warnings": ["Only .xlsx files are supported."]})
+    try:
+        upload = await spool_upload(file)
+    except UploadTooLarge as e:
+        return None, _too_large(e.max_bytes)
+    if not upload.size:
+        upload.close()
+        return None, JSONResponse(status_code=400, content={"status": "error", "warnings": ["Empty file upload."]})
+    return upload, None
+
+def _busy(e: ExecutorBusy) -> JSONResponse:
+    return JSONResponse(status_code=503, headers={"Retry-After": "1"}, content={"status": "error", "warnings": [str(e)]})
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [t.strip() for t in header.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+def _cacheable(result) -> bool:
+    """Only successful results that did not fall back after a failed mapping call are cached."""
+    if result.status != "success":
+        return False
+    parts = getattr(result, "sheets", None) or [result]
+    return not any(w.startswith(MAPPING_FAILED_WARNING) for part in parts for w in part.warnings)
+
+@app.post("/parse")
+async def parse(
+    request: Request,
+    file: UploadFile = File(...),
+    all_sheets: bool = Query(False),
+    output: OutputFormat = Query("cells", alias="format"),
+    timings: bool = Query(False),
+    incremental: Optional[str] = Query(None, min_length=1, description="Key of a growing log: return only rows added since its last parse"),
+    export: Optional[ExportFormat] = Query(None, description="Return the cells as a zipped CSV, Parquet or Arrow IPC table"),
+    layout: ExportLayout = Query("long", description="Export layout: one row per cell (long) or per sheet row (wide)"),
+):
+    """Parse an upload. `timings=true` adds per-stage timings to meta; an `X-Profile: 1` header
+    adds sampled call stacks as meta["profile"]. Either option bypasses the result cache.
+
+    The upload is spooled to a temp file (limit: UPLOAD_MAX_BYTES) and parsed from disk.
+    With `incremental=<key>`, only rows appended to the first sheet since the last parse
+    under that key are parsed and returned (see meta["incremental"]).
+    With `export=csv|parquet|arrow`, the first sheet is written straight to a table file and
+    returned zipped with a `<name>.sidecar.json` describing columns, warnings and unmapped columns.
+    """
+    if incremental is not None and all_sheets:
+        return JSONResponse(status_code=400, content={"status": "error", "warnings": ["Incremental parsing covers the first sheet only."]})
+    if export is not None and (all_sheets or incremental is not None):
+        return JSONResponse(status_code=400, content={"status": "error", "warnings": ["Exports cover a full parse of the first sheet only."]})
+    if export is not None:
+        try:
+            check_export_format(export)
+        except ExportUnavailable as e:
+            return JSONResponse(status_code=501, content={"status": "error", "warnings": [str(e)]})
+    upload, invalid = await _receive_upload(file)
+    if invalid is not None:
+        return invalid
+    with upload:
+        if incremental is not None:
+            return await _parse_incremental(upload, incremental, output, timings)
+        if export is not None:
+            return await _parse_export(upload, export, layout, timings)
+        return await _parse_upload(request, upload, all_sheets, output, timings)
+
+async def _parse_incremental(upload: SpooledUpload, key: str, output: OutputFormat, timings: bool) -> Response:
+    executor = get_executor()
+    try:
+        with executor.admit():
+            result = await executor.run(parse_excel_incremental, upload.path, key, output, timings, True)
+    except ExecutorBusy as e:
+        return _busy(e)
+    return Response(content=dump_json(result), media_type="application/json")
+
+async def _parse_export(upload: SpooledUpload, fmt: ExportFormat, layout: ExportLayout, timings: bool) -> Response:
+    executor = get_executor()
+    directory = tempfile.mkdtemp(prefix="export-", dir=os.getenv("UPLOAD_SPOOL_DIR") or None)
+    stem = PurePosixPath(upload.filename).stem or "export"
+    try:
+        with executor.admit():
+            archive, sidecar = await executor.run(export_archive, upload.path, directory, stem, fmt, layout, timings)
+    except ExecutorBusy as e:
+        shutil.rmtree(directory, ignore_errors=True)
+        return _busy(e)
+    except Exception:
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+    if archive is None:
+        shutil.rmtree(directory, ignore_errors=True)
+        return JSONResponse(content=sidecar.model_dump(mode="json"))
+    return FileResponse(
+        archive,
+        media_type="application/zip",
+        filename=os.path.basename(archive),
+        background=BackgroundTask(shutil.rmtree, directory, ignore_errors=True),
+    )
+
+@app.delete("/parse/incremental/{key}")
+def reset_incremental(key: str):
+    """Forget the state kept for an incremental key; its next upload is parsed in full."""
+    if not get_incremental_store().delete(key):
+        return JSONResponse(status_code=404, content={"status": "error", "warnings": [f"Unknown incremental key '{key}'."]})
+    return {"status": "success", "key": key}
+
+async def _parse_upload(request: Request, upload: SpooledUpload, all_sheets: bool, output: OutputFormat, timings: bool) -> Response:
+    profile = PROFILING_ENABLED and request.headers.get(PROFILE_HEADER, "").lower() in ("1", "true", "yes")
+    diagnostic = timings or profile
+    templates = get_template_store()
+    # Corrected template mappings and the mapper in use (Gemini model or the no-key
+    # fallback) change results, so both are part of the key.
+    key = result_cache_key(
+        upload.sha256, get_registry().version, {
+            "all_sheets": all_sheets,
+            "format": output,
+            "templates": templates.revision if templates is not None else None,
+            "mapper": mapper_mode(),
+        }
+    )
+    etag = f'"{key}"'
+    cache = get_result_cache()
+    if not diagnostic:
+        if _etag_matches(request, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        cached = cache.get(key) if cache is not None else None
+        if cached is not None:
+            return Response(content=cached, media_type="application/json", headers={"ETag": etag})
+
+    executor = get_executor()
+    profiler = SamplingProfiler().start() if profile else None
+    try:
+        with executor.admit():
+            if all_sheets:
+                processes = executor.use_processes(upload.size)
+                pool = executor.pool(processes) if processes else None
+                result = await executor.run(parse_workbook, upload.path, None, False, pool, output, None, True)
+            else:
+                result = await parse_excel_async(upload.path, executor, output, timings, compact=True)
+    except ExecutorBusy as e:
+        return _busy(e)
+    finally:
+        if profiler is not None:
+            profiler.stop()
+
+    if profiler is not None:
+        result.meta["profile"] = profiler.report()
+    start = time.perf_counter()
+    body = dump_json(result)
+    STAGE_SECONDS.observe(time.perf_counter() - start, stage="serialize")
+    if diagnostic or not _cacheable(result):
+        return Response(content=body, media_type="application/json")
+    if cache is not None:
+        cache.put(key, body)
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+@app.post("/parse/stream")
+async def parse_stream(file: UploadFile = File(...), chunk_cells: int = Query(DEFAULT_CHUNK_CELLS, ge=1)):
+    """Stream the first sheet as NDJSON: header/mapping preamble, parsed-row chunks, warnings/meta trailer."""
+    upload, invalid = await _receive_upload(file)
+    if invalid is not None:
+        return invalid
+
+    executor = get_executor()
+    try:
+        executor.acquire()
+    except ExecutorBusy as e:
+        upload.close()
+        return _busy(e)
+
+    try:
+        stream = await stream_parse_excel_async(upload.path, executor=executor)
+        body = iter_ndjson(stream, chunk_cells) if stream is not None else error_lines(["Workbook appears to be empty."])
+    except Exception as e:
+        body = error_lines([str(e)])
+
+    def release_when_done() -> Iterator[bytes]:
+        try:
+            yield from body
+        finally:
+            executor.release()
+            upload.close()
+
+    return StreamingResponse(release_when_done(), media_type=NDJSON_MEDIA_TYPE)
+
+
+def _zip_members(archive: str, spooled: List[SpooledUpload], warnings: List[str]) -> None:
+    """Spool every .xlsx member of the archive at `archive` to its own temp file."""
+    limit = max_upload_bytes()
+    with zipfile.ZipFile(archive) as zf:
+        for info in zf.infolist():
+            name = PurePosixPath(info.filename)
+            if info.is_dir() or "__MACOSX" in name.parts or name.name.startswith("~$"):
+                continue
+            if name.suffix.lower() != ".xlsx":
+                continue
+            try:
+                with zf.open(info) as member:
+                    spooled.append(spool_stream(member, info.filename, limit))
+            except UploadTooLarge as e:
+                warnings.append(f"{info.filename}: skipped ({e})")
+
+async def _batch_inputs(files: List[UploadFile]) -> Tuple[List[SpooledUpload], List[str]]:
+    """Spool every .xlsx upload and every .xlsx inside uploaded .zip archives to disk.
+
+    Each upload and each archive member may be at most UPLOAD_MAX_BYTES; larger ones are
+    skipped with a warning. The caller closes the returned uploads.
+    """
+    spooled: List[SpooledUpload] = []
+    warnings: List[str] = []
+    for file in files:
+        filename = file.filename or ""
+        is_zip = filename.lower().endswith(".zip")
+        if not is_zip and not filename.lower().endswith(".xlsx"):
+            warnings.append(f"{filename}: skipped (only non-empty .xlsx or .zip uploads are supported).")
+            continue
+        try:
+            upload = await spool_upload(file)
+        except UploadTooLarge as e:
+            warnings.append(f"{filename}: skipped ({e})")
+            continue
+        if is_zip:
+            with upload:
+                try:
+                    _zip_members(upload.path, spooled, warnings)
+                except zipfile.BadZipFile:
+                    warnings.append(f"{filename}: not a valid zip archive.")
+        elif upload.size:
+            spooled.append(upload)
+        else:
+            upload.close()
+            warnings.append(f"{filename}: skipped (only non-empty .xlsx or .zip uploads are supported).")
+    return spooled, warnings
+
+def _close_all(uploads: List[SpooledUpload]) -> None:
+    for upload in uploads:
+        upload.close()
+
+@app.post("/parse/batch")
+async def parse_batch_endpoint(
+    files: List[UploadFile] = File(...),
+    output: OutputFormat = Query("cells", alias="format"),
+    stream: bool = Query(False),
+    max_workers: Optional[int] = Query(None, ge=1),
+):
+    """Parse many workbooks (or .zip archives of them) with one shared column-mapping call.
+
+    Returns a manifest with one result per file, or with `stream=true` NDJSON "file" lines
+    in completion order followed by a trailer.
+    """
+    spooled, warnings = await _batch_inputs(files)
+    if not spooled:
+        return JSONResponse(status_code=400, content={"status": "error", "warnings": warnings or ["No .xlsx files in upload."]})
+    if len(spooled) > BATCH_MAX_FILES:
+        _close_all(spooled)
+        return JSONResponse(status_code=413, content={"status": "error", "warnings": [f"Batch has {len(spooled)} files; the limit is {BATCH_MAX_FILES}."]})
+
+    inputs = [(u.filename, u.path) for u in spooled]
+    executor = get_executor()
+    processes = executor.use_processes(sum(u.size for u in spooled))
+    pool = executor.pool(processes) if processes else None
+    workers = max_workers or executor.max_workers
+
+    if stream:
+        try:
+            executor.acquire()
+        except ExecutorBusy as e:
+            _close_all(spooled)
+            return _busy(e)
+
+        meta: dict = {}
+
+        def release_when_done() -> Iterator[bytes]:
+            try:
+                yield from iter_batch_ndjson(iter_parse_batch(inputs, workers, pool, output, meta, compact=True), meta, warnings)
+            finally:
+                executor.release()
+                _close_all(spooled)
+
+        return StreamingResponse(release_when_done(), media_type=NDJSON_MEDIA_TYPE)
+
+    try:
+        with executor.admit():
+            result = await executor.run(parse_batch, inputs, workers, pool, output, True)
+    except ExecutorBusy as e:
+        return _busy(e)
+    finally:
+        _close_all(spooled)
+
+    result.warnings = warnings + result.warnings
+    return Response(content=dump_json(result), media_type="application/json")
+
+
+def _template_not_found(template_id: str) -> JSONResponse:
+    return JSONResponse(status_code=404, content={"status": "error", "warnings": [f"Unknown template '{template_id}'."]})
+
+@app.get("/templates")
+def list_templates(limit: int = Query(100, ge=1, le=1000)):
+    """Known sheet layouts, most recently used first (empty unless TEMPLATE_STORE_ENABLED is set)."""
+    store = get_template_store()
+    return [t.info() for t in store.list(limit)] if store is not None else []
+
+@app.get("/templates/{template_id}")
+def get_template(template_id: str):
+    store = get_template_store()
+    template = store.get(template_id) if store is not None else None
+    return template.info() if template is not None else _template_not_found(template_id)
+
+@app.put("/templates/{template_id}/mappings")
+def correct_template(template_id: str, corrections: List[MappingCorrection]):
+    """Persist corrected column mappings; sheets matching the template are parsed with them from now on."""
+    store = get_template_store()
+    registry = get_registry()
+    try:
+        template = store.correct(template_id, corrections, registry.param_names, registry.asset_names) if store is not None else None
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"status": "error", "warnings": [str(e)]})
+    return template.info() if template is not None else _template_not_found(template_id)
+
+@app.delete("/templates/{template_id}")
+def delete_template(template_id: str):
+    store = get_template_store()
+    template = store.get(template_id) if store is not None else None
+    if template is None or not store.delete(template_id):
+        return _template_not_found(template_id)
+    return template.info()
+
+def _job_not_found(job_id: str) -> JSONResponse:
+    return JSONResponse(status_code=404, content={"status": "error", "warnings": [f"Unknown job '{job_id}'."]})
+
+@app.post("/jobs", status_code=202)
+async def submit_job(
+    file: UploadFile = File(...),
+    all_sheets: bool = Query(False),
+    output: OutputFormat = Query("cells", alias="format"),
+    priority: int = Query(0, description="Higher runs first"),
+):
+    """Queue a parse and return its job id at once; poll GET /jobs/{id} for progress and the result."""
+    upload, invalid = await _receive_upload(file)
+    if invalid is not None:
+        return invalid
+    try:
+        return get_job_queue().submit(upload, all_sheets, output, priority)
+    except QueueFull as e:
+        return JSONResponse(status_code=503, headers={"Retry-After": "5"}, content={"status": "error", "warnings": [str(e)]})
+    finally:
+        upload.close()
+
+@app.get("/jobs")
+def list_jobs(status: Optional[JobStatus] = Query(None), limit: int = Query(100, ge=1, le=1000)):
+    return get_job_queue().list(status, limit)
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str, include_result: bool = Query(True)):
+    """Job status and progress; once the job has finished, its parse response is included as "result"."""
+    queue = get_job_queue()
+    info = queue.get(job_id)
+    if info is None:
+        return _job_not_found(job_id)
+    body = info.model_dump_json().encode("utf-8")
+    result = queue.result(job_id) if include_result and info.status in ("succeeded", "failed") else None
+    if result is not None:
+        body = body[:-1] + b',"result":' + result + b"}"
+    return Response(content=body, media_type="application/json")
 
-    file_bytes = await file.read()
-    if not file_bytes:
-        return JSONResponse(status_code=400, content={"status": "error", "warnings": ["Empty file upload."]})
+@app.get("/jobs/{job_id}/result")
+def get_job_result(job_id: str):
+    queue = get_job_queue()
+    info = queue.get(job_id)
+    if info is None:
+        return _job_not_found(job_id)
+    result = queue.result(job_id)
+    if result is None:
+        return JSONResponse(status_code=409, content={"status": "error", "warnings": [f"Job is {info.status}; no result yet."]})
+    return Response(content=result, media_type="application/json")
 
-    result = parse_excel(file_bytes)
-    return JSONResponse(content=result.model_dump())
\ No newline at end of file
+@app.delete("/jobs/{job_id}")
+def cancel_job(job_id: str):
+    """Cancel a queued or running job, or delete a finished one and its result."""
+    info = get_job_queue().cancel(job_id)
+    return info if info is not None else _job_not_found(job_id)
@@ -1,10 +1,14 @@
 from __future__ import annotations
 
-from pydantic import BaseModel, Field
-from typing import List, Optional, Literal, Any, Dict
+from pydantic import BaseModel, Field, PrivateAttr
+from typing import List, Optional, Literal, Any, Dict, Union
 
 
 Confidence = Literal["high", "medium", "low"]
+OutputFormat = Literal["cells", "columnar"]
+ExportFormat = Literal["csv", "parquet", "arrow"]
+ExportLayout = Literal["long", "wide"]
+JobStatus = Literal["queued", "running", "succeeded", "failed", "cancelled"]
 
 
 class ColumnInput(BaseModel):
@@ -50,4 +54,124 @@ class ParseResponse(BaseModel):
     unmapped_columns: List[UnmappedColumn] = Field(default_factory=list)
     warnings: List[str] = Field(default_factory=list)
     meta: Dict[str, Any] = Field(default_factory=dict)
+    # Only parsers called with compact=True (the API and job paths) leave parsed_data empty
+    # and keep large results' cells here (see app.services.cells); `dump_json` encodes them.
+    _cells: Any = PrivateAttr(default=None)
 
+
+
+class ColumnarColumn(BaseModel):
+    col: int = Field(ge=0, description="0-indexed column index")
+    header: str
+    param_name: str
+    asset_name: Optional[str] = None
+    confidence: Confidence = Field(description="Mapping confidence; per-cell downgrades are listed in exceptions")
+    rows: List[int] = Field(default_factory=list, description="1-indexed Excel row numbers")
+    raw_values: List[Any] = Field(default_factory=list)
+    parsed_values: List[Optional[float]] = Field(default_factory=list)
+
+
+class CellException(BaseModel):
+    row: int = Field(ge=1)
+    col: int = Field(ge=0)
+    raw_value: Any = None
+    confidence: Confidence
+
+
+class ColumnarParseResponse(BaseModel):
+    status: Literal["success", "error"]
+    header_row: Optional[int] = Field(default=None, description="1-indexed Excel row number for detected header")
+    columns: List[ColumnarColumn] = Field(default_factory=list, description="One entry per mapped column")
+    exceptions: List[CellException] = Field(default_factory=list, description="Cells whose confidence differs from their column's")
+    unmapped_columns: List[UnmappedColumn] = Field(default_factory=list)
+    warnings: List[str] = Field(default_factory=list)
+    meta: Dict[str, Any] = Field(default_factory=dict)
+
+
+SheetResponse = Union[ParseResponse, ColumnarParseResponse]
+
+
+class WorkbookParseResponse(BaseModel):
+    status: Literal["success", "error"]
+    sheets: List[SheetResponse] = Field(default_factory=list, description="One result per sheet, in workbook order")
+    warnings: List[str] = Field(default_factory=list)
+    meta: Dict[str, Any] = Field(default_factory=dict)
+
+
+class BatchFileResult(BaseModel):
+    filename: str
+    result: SheetResponse
+
+
+class BatchParseResponse(BaseModel):
+    status: Literal["success", "error"]
+    files: List[BatchFileResult] = Field(default_factory=list, description="One result per uploaded workbook, in upload order")
+    warnings: List[str] = Field(default_factory=list)
+    meta: Dict[str, Any] = Field(default_factory=dict)
+
+
+class JobProgress(BaseModel):
+    rows_processed: int = 0
+    rows_total: Optional[int] = Field(default=None, description="Rows declared by the sheet dimensions, when recorded")
+
+
+class JobInfo(BaseModel):
+    id: str
+    status: JobStatus
+    priority: int = 0
+    filename: str = ""
+    all_sheets: bool = False
+    format: OutputFormat = "cells"
+    progress: JobProgress = Field(default_factory=JobProgress)
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    warnings: List[str] = Field(default_factory=list)
+
+
+class TemplateColumn(BaseModel):
+    col: int = Field(ge=0)
+    header: str
+    param_name: Optional[str] = None
+    asset_name: Optional[str] = None
+    confidence: Confidence
+    reason: str
+
+
+class TemplateInfo(BaseModel):
+    id: str
+    sheet_name: str
+    header_row: int = Field(ge=1, description="1-indexed Excel row number of the header")
+    columns: List[TemplateColumn] = Field(default_factory=list)
+    registry_version: str
+    corrected: bool = False
+    hits: int = 0
+    created_at: float
+    updated_at: float
+
+
+class MappingCorrection(BaseModel):
+    col: int = Field(ge=0, description="0-indexed column index")
+    param_name: Optional[str] = None
+    asset_name: Optional[str] = None
+
+
+class ExportColumn(BaseModel):
+    name: str
+    type: Literal["int", "float", "string"]
+    col: Optional[int] = Field(default=None, description="0-indexed source column (wide layout)")
+    header: Optional[str] = None
+    param_name: Optional[str] = None
+    asset_name: Optional[str] = None
+
+
+class ExportSidecar(BaseModel):
+    status: Literal["success", "error"]
+    format: ExportFormat
+    layout: ExportLayout
+    header_row: Optional[int] = Field(default=None, description="1-indexed Excel row number for detected header")
+    columns: List[ExportColumn] = Field(default_factory=list, description="Columns of the exported table, in order")
+    rows_written: int = 0
+    unmapped_columns: List[UnmappedColumn] = Field(default_factory=list)
+    warnings: List[str] = Field(default_factory=list)
+    meta: Dict[str, Any] = Field(default_factory=dict)
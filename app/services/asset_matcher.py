@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from typing import Dict, List, Optional, Tuple
+
 from .utils import normalize_text
 
 
@@ -44,17 +45,52 @@ def build_asset_aliases(assets: List[Dict]) -> Dict[str, str]:
     return alias_map
 
 
-def extract_asset_from_header(original_header: str, alias_map: Dict[str, str]) -> Tuple[Optional[str], str]:
-    """Return (asset_name, header_without_asset)."""
-    norm = normalize_text(original_header)
+_END = ""
+
+
+class AssetMatcher:
+    """Token trie over the normalized aliases of an asset registry.
+
+    Aliases only match on whole tokens of the normalized header, so "tg1" does not match
+    inside "tg10". When several aliases match, the longest wins; ties go to the alias
+    registered first.
+    """
 
-    aliases = sorted(alias_map.keys(), key=len, reverse=True)
-    for alias in aliases:
-        if not alias:
-            continue
-        if alias in norm:
-            asset = alias_map[alias]
-            return asset, original_header
+    def __init__(self, alias_map: Dict[str, str]):
+        self._root: Dict[str, Dict] = {}
+        for rank, (alias, name) in enumerate(alias_map.items()):
+            tokens = alias.split()
+            if not tokens:
+                continue
+            node = self._root
+            for tok in tokens:
+                node = node.setdefault(tok, {})
+            node.setdefault(_END, (len(alias), -rank, name))
 
-    return None, original_header
+    def match_tokens(self, tokens: List[str]) -> Optional[str]:
+        best: Optional[Tuple[int, int, str]] = None
+        root = self._root
+        for start in range(len(tokens)):
+            node = root.get(tokens[start])
+            pos = start + 1
+            while node is not None:
+                hit = node.get(_END)
+                if hit is not None and (best is None or hit[:2] > best[:2]):
+                    best = hit
+                if pos >= len(tokens):
+                    break
+                node = node.get(tokens[pos])
+                pos += 1
+        return best[2] if best else None
 
+    def match(self, header: Optional[str]) -> Optional[str]:
+        return self.match_tokens(normalize_text(header).split())
+
+    def match_many(self, headers: List[Optional[str]]) -> List[Optional[str]]:
+        """Match a whole header row at once."""
+        return [self.match(h) for h in headers]
+
+
+def extract_asset_from_header(original_header: str, matcher: AssetMatcher) -> Tuple[Optional[str], str]:
+    """Return (asset_name, header_without_asset)."""
+    return matcher.match(original_header), original_header
@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+import os
+
+from pydantic import BaseModel
+from pydantic_core import to_json
+
+from app.models.schemas import (
+    BatchFileResult,
+    BatchParseResponse,
+    ColumnMapping,
+    ParsedCell,
+    ParseResponse,
+    WorkbookParseResponse,
+)
+
+
+# With compact=True (for results that are only serialized), sheets yielding at least this
+# many cells keep them only in a CellTable: building a ParsedCell model costs several
+# microseconds per cell. Other results always fill ParseResponse.parsed_data.
+COMPACT_MIN_CELLS = int(os.getenv("COMPACT_MIN_CELLS", "20000"))
+
+_PARSED_DATA = b'"parsed_data":['
+
+# (Excel row numbers, raw values per active column, parsed values per active column)
+Block = Tuple[List[int], List[List[Any]], List[List[Optional[float]]]]
+
+
+def cell_confidence(confidence: str, raw_val: Any, parsed_val: Optional[float]) -> str:
+    """Downgrade a high-confidence mapping for cells whose non-empty value did not parse."""
+    if parsed_val is None and raw_val not in (None, "", " ", "N/A", "NA"):
+        if confidence == "high":
+            return "medium"
+    return confidence
+
+
+class CellTable:
+    """Parsed cells of one sheet kept column-wise per block of rows, not as ParsedCell models.
+
+    A block holds its rows' Excel numbers and, for each active mapping, the raw and parsed
+    value lists from column-wise parsing; column, parameter, asset and confidence live once
+    per mapping. Cells come out in row order, as models or encoded straight to JSON.
+    """
+
+    __slots__ = ("mappings", "_blocks", "_count")
+
+    def __init__(self, mappings: List[ColumnMapping]):
+        self.mappings = mappings
+        self._blocks: List[Block] = []
+        self._count = 0
+
+    def append(self, excel_rows: List[int], raw_cols: List[List[Any]], parsed_cols: List[List[Optional[float]]]) -> None:
+        if excel_rows and self.mappings:
+            self._blocks.append((excel_rows, raw_cols, parsed_cols))
+            self._count += len(excel_rows) * len(self.mappings)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def iter_blocks(self) -> Iterator[Block]:
+        """(Excel rows, raw columns, parsed columns) of each block, in row order."""
+        return iter(self._blocks)
+
+    def iter_rows(self) -> Iterator[List[ParsedCell]]:
+        """Yield the cells of each row as ParsedCell models."""
+        for excel_rows, raw_cols, parsed_cols in self._blocks:
+            for i, excel_row in enumerate(excel_rows):
+                yield [
+                    ParsedCell(
+                        row=excel_row,
+                        col=m.column_index,
+                        param_name=m.param_name,
+                        asset_name=m.asset_name,
+                        raw_value=raw[i],
+                        parsed_value=parsed[i],
+                        confidence=cell_confidence(m.confidence, raw[i], parsed[i]),
+                    )
+                    for m, raw, parsed in zip(self.mappings, raw_cols, parsed_cols)
+                ]
+
+    def __iter__(self) -> Iterator[ParsedCell]:
+        for cells in self.iter_rows():
+            yield from cells
+
+    def _block_dicts(self, block: Block) -> List[Dict[str, Any]]:
+        excel_rows, raw_cols, parsed_cols = block
+        columns = list(zip(self.mappings, raw_cols, parsed_cols))
+        return [
+            {
+                "row": excel_row,
+                "col": m.column_index,
+                "param_name": m.param_name,
+                "asset_name": m.asset_name,
+                "raw_value": raw[i],
+                "parsed_value": parsed[i],
+                "confidence": cell_confidence(m.confidence, raw[i], parsed[i]),
+            }
+            for i, excel_row in enumerate(excel_rows)
+            for m, raw, parsed in columns
+        ]
+
+    def to_json(self) -> bytes:
+        """The cells as a JSON array, byte-identical to dumping the equivalent ParsedCell list."""
+        return b"[" + b",".join(to_json(self._block_dicts(b))[1:-1] for b in self._blocks) + b"]"
+
+
+def rechunk(tables: Iterable[CellTable], rows_per_chunk: int) -> Iterator[CellTable]:
+    """Regroup the rows of consecutive tables (sharing mappings) into tables of `rows_per_chunk` rows."""
+    pending: Optional[CellTable] = None
+    pending_rows = 0
+    for table in tables:
+        for excel_rows, raw_cols, parsed_cols in table.iter_blocks():
+            start = 0
+            while start < len(excel_rows):
+                if pending is None:
+                    pending, pending_rows = CellTable(table.mappings), 0
+                stop = min(len(excel_rows), start + rows_per_chunk - pending_rows)
+                pending.append(
+                    excel_rows[start:stop], [c[start:stop] for c in raw_cols], [c[start:stop] for c in parsed_cols]
+                )
+                pending_rows += stop - start
+                start = stop
+                if pending_rows >= rows_per_chunk:
+                    yield pending
+                    pending = None
+    if pending is not None:
+        yield pending
+
+
+def compact_response(table: CellTable, **fields: Any) -> ParseResponse:
+    """A ParseResponse holding `table`'s cells: as `parsed_data` models below COMPACT_MIN_CELLS,
+    otherwise only in the table (parsed_data stays empty; see `dump_json` and `iter_cells`)."""
+    if len(table) < COMPACT_MIN_CELLS:
+        return ParseResponse(parsed_data=list(table), **fields)
+    response = ParseResponse(**fields)
+    response._cells = table
+    return response
+
+
+def iter_cells(response: ParseResponse) -> Iterator[ParsedCell]:
+    """All cells of a ParseResponse, whether they are held in `parsed_data` or in a compact table."""
+    return iter(response._cells) if response._cells is not None else iter(response.parsed_data)
+
+
+def _parse_responses(model: BaseModel) -> Iterator[ParseResponse]:
+    """ParseResponses nested in `model`, in the order its JSON lists them."""
+    if isinstance(model, ParseResponse):
+        yield model
+    elif isinstance(model, WorkbookParseResponse):
+        for sheet in model.sheets:
+            yield from _parse_responses(sheet)
+    elif isinstance(model, BatchParseResponse):
+        for item in model.files:
+            yield from _parse_responses(item)
+    elif isinstance(model, BatchFileResult):
+        yield from _parse_responses(model.result)
+
+
+def dump_json(model: BaseModel) -> bytes:
+    """`model.model_dump_json()` as bytes, with compact cell tables encoded into their `parsed_data`."""
+    body = model.model_dump_json().encode("utf-8")
+    responses = list(_parse_responses(model))
+    if all(r._cells is None for r in responses):
+        return body
+    # Quotes inside JSON strings are escaped, so the key only occurs as a real key.
+    parts: List[bytes] = []
+    pos = search = 0
+    for r in responses:
+        at = body.index(_PARSED_DATA, search) + len(_PARSED_DATA)
+        search = at
+        if r._cells is not None:
+            parts += [body[pos:at - 1], r._cells.to_json()]
+            pos = at + 1
+    parts.append(body[pos:])
+    return b"".join(parts)
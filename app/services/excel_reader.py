@@ -1,21 +1,99 @@
 from __future__ import annotations
 
-from io import BytesIO
-from typing import List, Any, Tuple
+from typing import Any, Iterator, List, Optional, Tuple
+import os
 import openpyxl
 
+from . import xlsx_fast
+from .xlsx_fast import WorkbookSource, as_file
 
-def read_first_sheet(file_bytes: bytes) -> Tuple[str, List[List[Any]]]:
-    wb = openpyxl.load_workbook(BytesIO(file_bytes), data_only=True, read_only=True)
-    ws = wb.worksheets[0]
-    rows: List[List[Any]] = []
-    max_cols = 0
-    for row in ws.iter_rows(values_only=True):
-        row_list = list(row)
-        max_cols = max(max_cols, len(row_list))
-        rows.append(row_list)
+
+READER_BACKENDS = ("fast", "openpyxl")
+
+
+def _backend(backend: Optional[str]) -> str:
+    backend = backend or os.getenv("EXCEL_READER_BACKEND", "fast")
+    if backend not in READER_BACKENDS:
+        raise ValueError(f"Unknown EXCEL_READER_BACKEND '{backend}' (expected fast or openpyxl).")
+    return backend
+
+
+def source_size(source: WorkbookSource) -> int:
+    """Size in bytes of an in-memory workbook or of the file at a path."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return len(source)
+    return os.path.getsize(source)
+
+
+def iter_sheet_rows(source: WorkbookSource, sheet_index: int = 0, backend: Optional[str] = None) -> Tuple[str, Iterator[List[Any]]]:
+    """Return (sheet_title, row_iterator) without materializing the sheet.
+
+    Rows are padded to the sheet's declared width when the workbook records one;
+    the workbook is closed once the iterator is exhausted or garbage collected.
+    The "fast" backend (EXCEL_READER_BACKEND, default) decodes the sheet XML directly and
+    falls back to openpyxl for archives it cannot read; both produce the same rows.
+    `source` may be the workbook's bytes or a path; a path is read from disk as rows are
+    consumed instead of being loaded into memory.
+    """
+    if _backend(backend) == "fast":
+        try:
+            return xlsx_fast.iter_sheet_rows(source, sheet_index)
+        except xlsx_fast.UnsupportedWorkbook:
+            pass
+    return _iter_sheet_rows_openpyxl(source, sheet_index)
+
+
+def _iter_sheet_rows_openpyxl(source: WorkbookSource, sheet_index: int) -> Tuple[str, Iterator[List[Any]]]:
+    wb = openpyxl.load_workbook(as_file(source), data_only=True, read_only=True)
+    ws = wb.worksheets[sheet_index]
+    width = ws.max_column or 0
+
+    def rows() -> Iterator[List[Any]]:
+        try:
+            for row in ws.iter_rows(values_only=True):
+                row_list = list(row)
+                if len(row_list) < width:
+                    row_list.extend([None] * (width - len(row_list)))
+                yield row_list
+        finally:
+            wb.close()
+
+    return ws.title, rows()
+
+
+def read_first_sheet(source: WorkbookSource, backend: Optional[str] = None) -> Tuple[str, List[List[Any]]]:
+    title, row_iter = iter_sheet_rows(source, backend=backend)
+    rows: List[List[Any]] = list(row_iter)
+    max_cols = max((len(r) for r in rows), default=0)
     for r in rows:
         if len(r) < max_cols:
             r.extend([None] * (max_cols - len(r)))
-    return ws.title, rows
+    return title, rows
+
+
+def list_sheet_names(source: WorkbookSource, backend: Optional[str] = None) -> List[str]:
+    """Worksheet titles in `iter_sheet_rows` index order; chartsheets hold no rows and are left out."""
+    if _backend(backend) == "fast":
+        try:
+            return xlsx_fast.list_sheet_names(source)
+        except xlsx_fast.UnsupportedWorkbook:
+            pass
+    wb = openpyxl.load_workbook(as_file(source), data_only=True, read_only=True)
+    try:
+        return [ws.title for ws in wb.worksheets]
+    finally:
+        wb.close()
+
 
+def sheet_row_counts(source: WorkbookSource, backend: Optional[str] = None) -> List[Optional[int]]:
+    """Row count each worksheet declares in its dimension, without reading cells; None where unknown."""
+    if _backend(backend) == "fast":
+        try:
+            return xlsx_fast.sheet_row_counts(source)
+        except xlsx_fast.UnsupportedWorkbook:
+            pass
+    wb = openpyxl.load_workbook(as_file(source), data_only=True, read_only=True)
+    try:
+        return [ws.max_row for ws in wb.worksheets]
+    finally:
+        wb.close()
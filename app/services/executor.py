@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Literal, Optional
+import asyncio
+import multiprocessing
+import os
+import threading
+
+from .metrics import active_profiler
+
+
+ExecutorMode = Literal["thread", "process", "auto"]
+
+
+class ExecutorBusy(RuntimeError):
+    """Raised when a parse is refused because the executor's queue is full."""
+
+
+class ParseExecutor:
+    """Runs CPU-bound parse work off the event loop on a thread pool or a process pool.
+
+    mode="thread" keeps everything in threads, "process" sends sheet work to worker
+    processes, and "auto" uses processes only for uploads of at least
+    `process_threshold_bytes`. At most `max_workers + max_queue` parses are admitted at
+    once; further requests get `ExecutorBusy` so the API can shed load.
+    """
+
+    def __init__(
+        self,
+        mode: ExecutorMode = "thread",
+        max_workers: Optional[int] = None,
+        max_queue: int = 32,
+        process_threshold_bytes: int = 5 * 1024 * 1024,
+    ):
+        if mode not in ("thread", "process", "auto"):
+            raise ValueError(f"Unknown executor mode '{mode}' (expected thread, process or auto).")
+        self.mode = mode
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.process_threshold_bytes = process_threshold_bytes
+        self._threads = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="parse")
+        self._processes: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._active = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    def use_processes(self, size_bytes: int) -> bool:
+        if self.mode == "process":
+            return True
+        return self.mode == "auto" and size_bytes >= self.process_threshold_bytes
+
+    def acquire(self) -> None:
+        """Reserve a parse slot or raise ExecutorBusy; pair with `release`."""
+        with self._lock:
+            if self._active >= self.capacity:
+                raise ExecutorBusy(f"Parser is busy ({self._active} parses in flight); retry later.")
+            self._active += 1
+
+    def release(self) -> None:
+        with self._lock:
+            self._active -= 1
+
+    @contextmanager
+    def admit(self) -> Iterator[None]:
+        """Reserve a parse slot for the duration of a request, or raise ExecutorBusy."""
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def _process_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._processes is None:
+                self._processes = ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._processes
+
+    def pool(self, processes: bool = False) -> Executor:
+        return self._process_pool() if processes else self._threads
+
+    async def run(self, fn: Callable[..., Any], *args: Any, processes: bool = False) -> Any:
+        loop = asyncio.get_running_loop()
+        profiler = active_profiler()
+        if profiler is not None and not processes:
+            # Threads doing a profiled request's work are sampled while they do it.
+            fn = profiler.wrap(fn)
+        return await loop.run_in_executor(self.pool(processes), fn, *args)
+
+    def shutdown(self) -> None:
+        self._threads.shutdown(wait=False, cancel_futures=True)
+        if self._processes is not None:
+            self._processes.shutdown(wait=False, cancel_futures=True)
+
+
+_default_executor: Optional[ParseExecutor] = None
+_default_lock = threading.Lock()
+
+
+def get_executor() -> ParseExecutor:
+    """Process-wide executor configured from PARSE_EXECUTOR, PARSE_MAX_WORKERS, PARSE_MAX_QUEUE
+    and PARSE_PROCESS_THRESHOLD_BYTES."""
+    global _default_executor
+    with _default_lock:
+        if _default_executor is None:
+            workers = os.getenv("PARSE_MAX_WORKERS")
+            _default_executor = ParseExecutor(
+                mode=os.getenv("PARSE_EXECUTOR", "thread"),  # type: ignore[arg-type]
+                max_workers=int(workers) if workers else None,
+                max_queue=int(os.getenv("PARSE_MAX_QUEUE", "32")),
+                process_threshold_bytes=int(os.getenv("PARSE_PROCESS_THRESHOLD_BYTES", str(5 * 1024 * 1024))),
+            )
+        return _default_executor
+
+
+def shutdown_executor() -> None:
+    global _default_executor
+    with _default_lock:
+        if _default_executor is not None:
+            _default_executor.shutdown()
+            _default_executor = None
@@ -0,0 +1,227 @@
+from __future__ import annotations
+
+from datetime import date, datetime, time as dt_time
+from typing import Any, List, Optional, Tuple
+import csv
+import os
+import zipfile
+
+from app.models.schemas import ColumnMapping, ExportColumn, ExportFormat, ExportLayout, ExportSidecar
+from .cells import Block, cell_confidence
+from .excel_reader import WorkbookSource
+from .metrics import StageTimings
+from .pipeline import ParseStream, stream_parse_excel
+
+
+EXPORT_EXTENSIONS = {"csv": "csv", "parquet": "parquet", "arrow": "arrow"}
+# Parquet row groups and Arrow record batches hold at least this many rows (the last may hold fewer).
+EXPORT_ROW_GROUP_ROWS = int(os.getenv("EXPORT_ROW_GROUP_ROWS", "65536"))
+
+_LONG_COLUMNS = [
+    ExportColumn(name="row", type="int"),
+    ExportColumn(name="col", type="int"),
+    ExportColumn(name="param_name", type="string"),
+    ExportColumn(name="asset_name", type="string"),
+    ExportColumn(name="raw_value", type="string"),
+    ExportColumn(name="parsed_value", type="float"),
+    ExportColumn(name="confidence", type="string"),
+]
+
+
+class ExportUnavailable(RuntimeError):
+    """The requested export format needs an optional dependency that is not installed."""
+
+
+def _pyarrow() -> Any:
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ExportUnavailable("Parquet and Arrow exports require the optional pyarrow package.") from None
+    return pyarrow
+
+
+def check_export_format(fmt: ExportFormat) -> None:
+    """Raise ExportUnavailable before any parsing if `fmt` cannot be written here."""
+    if fmt != "csv":
+        _pyarrow()
+
+
+def _raw_text(value: Any) -> Optional[str]:
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (datetime, date, dt_time)):
+        return value.isoformat()
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+def _wide_columns(stream: ParseStream, active: List[ColumnMapping]) -> List[ExportColumn]:
+    """`row` plus one float column per mapped (param_name, asset_name); repeats get a column suffix."""
+    headers = {c.column_index: c.original_header for c in stream.columns}
+    columns = [ExportColumn(name="row", type="int")]
+    seen = {"row"}
+    for m in active:
+        name = m.param_name if m.asset_name is None else f"{m.param_name}__{m.asset_name}"
+        if name in seen:
+            name = f"{name}__col{m.column_index}"
+        seen.add(name)
+        columns.append(ExportColumn(
+            name=name, type="float", col=m.column_index, header=headers.get(m.column_index),
+            param_name=m.param_name, asset_name=m.asset_name,
+        ))
+    return columns
+
+
+def _long_block(mappings: List[ColumnMapping], block: Block) -> List[List[Any]]:
+    excel_rows, raw_cols, parsed_cols = block
+    cells = [(i, j) for i in range(len(excel_rows)) for j in range(len(mappings))]
+    return [
+        [excel_rows[i] for i, _ in cells],
+        [mappings[j].column_index for _, j in cells],
+        [mappings[j].param_name for _, j in cells],
+        [mappings[j].asset_name for _, j in cells],
+        [_raw_text(raw_cols[j][i]) for i, j in cells],
+        [parsed_cols[j][i] for i, j in cells],
+        [cell_confidence(mappings[j].confidence, raw_cols[j][i], parsed_cols[j][i]) for i, j in cells],
+    ]
+
+
+def _wide_block(mappings: List[ColumnMapping], block: Block) -> List[List[Any]]:
+    excel_rows, _, parsed_cols = block
+    return [excel_rows] + list(parsed_cols)
+
+
+class _CsvWriter:
+    def __init__(self, path: str, columns: List[ExportColumn]):
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        self._csv = csv.writer(self._file)
+        self._csv.writerow([c.name for c in columns])
+
+    def write(self, data: List[List[Any]]) -> None:
+        self._csv.writerows(zip(*data))
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class _ArrowWriter:
+    """Parquet or Arrow IPC file writer that emits a row group / record batch per EXPORT_ROW_GROUP_ROWS rows."""
+
+    def __init__(self, path: str, columns: List[ExportColumn], fmt: ExportFormat):
+        pa = _pyarrow()
+        types = {"int": pa.int64(), "float": pa.float64(), "string": pa.string()}
+        self._pa = pa
+        self._schema = pa.schema([(c.name, types[c.type]) for c in columns])
+        if fmt == "parquet":
+            self._writer = pa.parquet.ParquetWriter(path, self._schema)
+        else:
+            self._writer = pa.ipc.new_file(path, self._schema)
+        self._pending: List[List[Any]] = [[] for _ in columns]
+        self._rows = 0
+
+    def write(self, data: List[List[Any]]) -> None:
+        for pending, values in zip(self._pending, data):
+            pending.extend(values)
+        self._rows += len(data[0])
+        if self._rows >= EXPORT_ROW_GROUP_ROWS:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._rows:
+            return
+        arrays = [self._pa.array(values, type=field.type) for values, field in zip(self._pending, self._schema)]
+        self._writer.write_table(self._pa.Table.from_arrays(arrays, schema=self._schema))
+        self._pending = [[] for _ in self._pending]
+        self._rows = 0
+
+    def close(self) -> None:
+        self._flush()
+        self._writer.close()
+
+
+def write_stream(stream: ParseStream, path: str, fmt: ExportFormat = "csv", layout: ExportLayout = "long") -> ExportSidecar:
+    """Write a parse's cells to `path` as a table, block by block as rows are parsed.
+
+    The long layout has one row per cell (the columns of ParsedCell); the wide layout one
+    row per sheet row with a float column per mapped (param_name, asset_name). The returned
+    sidecar describes the columns and carries the header row, unmapped columns and warnings.
+    """
+    active = stream.active_mappings()
+    columns = _LONG_COLUMNS if layout == "long" else _wide_columns(stream, active)
+    to_block = _long_block if layout == "long" else _wide_block
+    writer = _CsvWriter(path, columns) if fmt == "csv" else _ArrowWriter(path, columns, fmt)
+    rows = 0
+    try:
+        for table in stream.iter_tables():
+            with stream.timings.stage("export", cells=len(table)):
+                for block in table.iter_blocks():
+                    data = to_block(active, block)
+                    writer.write(data)
+                    rows += len(data[0])
+    finally:
+        writer.close()
+    stream.finish()
+    return ExportSidecar(
+        status="success",
+        format=fmt,
+        layout=layout,
+        header_row=stream.header_row,
+        columns=columns,
+        rows_written=rows,
+        unmapped_columns=stream.unmapped_columns,
+        warnings=stream.warnings,
+        meta=stream.meta,
+    )
+
+
+def export_excel(
+    file_bytes: WorkbookSource,
+    path: str,
+    fmt: ExportFormat = "csv",
+    layout: ExportLayout = "long",
+    report_timings: bool = False,
+) -> ExportSidecar:
+    """Parse the first sheet straight into a CSV, Parquet or Arrow IPC file at `path`.
+
+    Raises ExportUnavailable if the format needs pyarrow and it is missing; parse failures
+    come back as a sidecar with status "error" (and `path` may hold a partial table).
+    """
+    check_export_format(fmt)
+    try:
+        stream = stream_parse_excel(file_bytes, timings=StageTimings(report=report_timings))
+        if stream is None:
+            return ExportSidecar(status="error", format=fmt, layout=layout, warnings=["Workbook appears to be empty."])
+        return write_stream(stream, path, fmt, layout)
+    except ExportUnavailable:
+        raise
+    except Exception as e:
+        return ExportSidecar(status="error", format=fmt, layout=layout, warnings=[str(e)])
+
+
+def export_archive(
+    file_bytes: WorkbookSource,
+    directory: str,
+    stem: str,
+    fmt: ExportFormat = "csv",
+    layout: ExportLayout = "long",
+    report_timings: bool = False,
+) -> Tuple[Optional[str], ExportSidecar]:
+    """Export into `directory` and zip the table with its sidecar as `<stem>.zip`.
+
+    Returns (archive path, sidecar), or (None, sidecar) if the parse failed.
+    """
+    table_path = os.path.join(directory, f"{stem}.{EXPORT_EXTENSIONS[fmt]}")
+    sidecar = export_excel(file_bytes, table_path, fmt, layout, report_timings)
+    if sidecar.status != "success":
+        return None, sidecar
+    archive_path = os.path.join(directory, f"{stem}.zip")
+    # Parquet is compressed already; CSV, Arrow IPC and the sidecar deflate well.
+    table_compression = zipfile.ZIP_STORED if fmt == "parquet" else zipfile.ZIP_DEFLATED
+    with zipfile.ZipFile(archive_path, "w") as archive:
+        archive.write(table_path, os.path.basename(table_path), compress_type=table_compression)
+        archive.writestr(f"{stem}.sidecar.json", sidecar.model_dump_json(indent=2), compress_type=zipfile.ZIP_DEFLATED)
+    os.remove(table_path)
+    return archive_path, sidecar
@@ -1,9 +1,19 @@
 from __future__ import annotations
 
-from typing import List, Any, Tuple
+from itertools import islice
+from typing import Any, Iterable, List, Optional, Tuple
+
 from .utils import normalize_text
 
 
+# Stop scanning once a row scores at least this share of the best score a row of the
+# sheet's width could reach (values above 1 disable early exit).
+DEFAULT_STOP_RATIO = 0.9
+# Rows wider than this are scored on an evenly spaced sample of this many cells.
+DEFAULT_SAMPLE_CELLS = 256
+TITLE_SCAN_ROWS = 10
+
+
 def _row_non_empty_cells(row: List[Any]) -> List[Any]:
     out = []
     for v in row:
@@ -15,49 +25,96 @@ def _row_non_empty_cells(row: List[Any]) -> List[Any]:
     return out
 
 
-def detect_header_row(rows: List[List[Any]], max_scan: int = 30) -> Tuple[int, List[str], List[str]]:
-    """Return (header_row_index_0_based, headers, warnings)."""
-    warnings: List[str] = []
-    scan = rows[:max_scan] if rows else []
-    best_idx = -1
-    best_score = -1.0
-    best_headers: List[str] = []
+def _is_title_row(row: List[Any]) -> bool:
+    """Exactly one non-empty cell, holding a string of 6+ characters; stops at the second value."""
+    found = None
+    for v in row:
+        if v is None or (isinstance(v, str) and v.strip() == ""):
+            continue
+        if found is not None:
+            return False
+        found = v
+    return isinstance(found, str) and len(found.strip()) >= 6
 
-    for i, row in enumerate(scan[:10]):
-        non_empty = _row_non_empty_cells(row)
-        if len(non_empty) == 1 and isinstance(non_empty[0], str) and len(non_empty[0].strip()) >= 6:
-            warnings.append(f"Row {i+1} appears to be a title row, skipped")
 
-    for i, row in enumerate(scan):
-        non_empty = _row_non_empty_cells(row)
-        if len(non_empty) < 2:
-            continue
+def _max_score(width: int) -> float:
+    return width * 2.0 + 5.0 + 3.0 + 2.0
 
-        stringish = sum(1 for v in non_empty if isinstance(v, str))
-        string_ratio = stringish / max(1, len(non_empty))
 
-        if string_ratio < 0.55:
-            continue
+def _score_row(row: List[Any], sample_cells: int) -> Optional[float]:
+    """Header-likeness of a row, or None if it cannot be the header."""
+    cells = row if len(row) <= sample_cells else row[:: -(-len(row) // sample_cells)]
+    non_empty = _row_non_empty_cells(cells)
+    # Scale a sampled row's non-empty count back up to the full width.
+    count = len(non_empty) * len(row) / max(1, len(cells))
+    if count < 2:
+        return None
+
+    stringish = sum(1 for v in non_empty if isinstance(v, str))
+    string_ratio = stringish / max(1, len(non_empty))
+
+    if string_ratio < 0.55:
+        return None
+
+    normalized = [normalize_text(v) for v in non_empty]
+    uniq_ratio = len(set(normalized)) / max(1, len(normalized))
+
+    shortish = sum(1 for v in non_empty if isinstance(v, str) and 1 <= len(v.strip()) <= 40)
+    short_ratio = shortish / max(1, len(non_empty))
 
-        normalized = [normalize_text(v) for v in non_empty]
-        uniq_ratio = len(set(normalized)) / max(1, len(normalized))
+    return (count * 2.0) + (string_ratio * 5.0) + (uniq_ratio * 3.0) + (short_ratio * 2.0)
 
-        shortish = sum(1 for v in non_empty if isinstance(v, str) and 1 <= len(v.strip()) <= 40)
-        short_ratio = shortish / max(1, len(non_empty))
 
-        score = (len(non_empty) * 2.0) + (string_ratio * 5.0) + (uniq_ratio * 3.0) + (short_ratio * 2.0)
+def detect_header_row(
+    rows: Iterable[List[Any]],
+    max_scan: int = 30,
+    stop_ratio: float = DEFAULT_STOP_RATIO,
+    sample_cells: int = DEFAULT_SAMPLE_CELLS,
+) -> Tuple[int, List[str], List[str]]:
+    """Return (header_row_index_0_based, headers, warnings).
 
-        if score > best_score:
-            best_score = score
-            best_idx = i
-            best_headers = ["" if v is None else str(v).strip() for v in row]
+    `rows` may be a lazy iterator: rows are consumed one at a time and reading stops once
+    a row dominates (see DEFAULT_STOP_RATIO and the row after it did not beat it), after
+    the first TITLE_SCAN_ROWS rows have been checked for title rows. Known layouts skip
+    detection altogether through the template store (see templates.TemplateStore).
+    """
+    warnings: List[str] = []
+    best_idx = -1
+    best_score = -1.0
+    best_row: List[Any] = []
+    width = 0
+    settled = False
+    pending: List[Tuple[int, List[Any]]] = []
+
+    def score_pending() -> bool:
+        nonlocal best_idx, best_score, best_row, width
+        settled = False
+        for j, candidate in pending:
+            width = max(width, len(candidate))
+            score = _score_row(candidate, sample_cells)
+            if score is not None and score > best_score:
+                best_score, best_idx, best_row = score, j, candidate
+            # Settle only once the next row failed to beat the candidate: in sheets without a
+            # declared dimension a narrow early row can otherwise look dominant.
+            settled = best_idx < j and best_score >= stop_ratio * _max_score(width)
+            if settled:
+                break
+        pending.clear()
+        return settled
+
+    for i, row in enumerate(islice(rows, max_scan)):
+        if i < TITLE_SCAN_ROWS and _is_title_row(row):
+            warnings.append(f"Row {i+1} appears to be a title row, skipped")
+        if not settled:
+            pending.append((i, row))
+            settled = score_pending()
+        if settled and i >= TITLE_SCAN_ROWS - 1:
+            break
+    score_pending()
 
     if best_idx == -1:
         raise ValueError("Could not detect a header row (no sufficiently header-like row found).")
 
-    headers = []
-    for h in best_headers:
-        headers.append(h if h is not None else "")
-
+    headers = ["" if v is None else str(v).strip() for v in best_row]
     return best_idx, headers, warnings
 
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from app.models.schemas import ColumnInput, ColumnMapping
+from app.services.utils import cache_path
+
+
+DEFAULT_STORE_PATH = cache_path("incremental.sqlite3")
+CHECKSUM_BLOCK_ROWS = 1024
+
+
+def _row_bytes(row: List[Any]) -> bytes:
+    # Trailing empty cells are dropped: buffered rows are padded to the sheet width.
+    end = len(row)
+    while end and row[end - 1] is None:
+        end -= 1
+    return repr(row[:end]).encode("utf-8") + b"\n"
+
+
+def rows_digest(rows: Iterable[List[Any]]) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    for row in rows:
+        h.update(_row_bytes(row))
+    return h.hexdigest()
+
+
+class RowChecksums:
+    """Digests of consecutive blocks of `block_rows` sheet rows, fed one row at a time."""
+
+    def __init__(self, block_rows: int = CHECKSUM_BLOCK_ROWS):
+        self.block_rows = block_rows
+        self.blocks: List[str] = []
+        self.rows = 0
+        self._hash = hashlib.blake2b(digest_size=16)
+
+    def add(self, row: List[Any]) -> Optional[str]:
+        """Hash a row; return the block's digest if the row completed one."""
+        self._hash.update(_row_bytes(row))
+        self.rows += 1
+        if self.rows % self.block_rows:
+            return None
+        self.blocks.append(self._hash.hexdigest())
+        self._hash = hashlib.blake2b(digest_size=16)
+        return self.blocks[-1]
+
+    @property
+    def tail(self) -> str:
+        """Digest of the rows after the last complete block."""
+        return self._hash.hexdigest()
+
+    def wrap(self, rows: Iterable[List[Any]]) -> Iterator[List[Any]]:
+        for row in rows:
+            self.add(row)
+            yield row
+
+
+@dataclass
+class LogState:
+    """What the last parse of a growing log left behind: its layout, mappings and row checksums.
+
+    `prefix` is the digest of the rows down to the header, `rows` the number of rows below it
+    that were parsed, `blocks`/`tail` their RowChecksums digests.
+    """
+    key: str
+    registry_version: str
+    sheet_name: str
+    header_idx: int
+    prefix: str
+    columns: List[ColumnInput]
+    mappings: List[ColumnMapping]
+    warnings: List[str] = field(default_factory=list)
+    rows: int = 0
+    block_rows: int = CHECKSUM_BLOCK_ROWS
+    blocks: List[str] = field(default_factory=list)
+    tail: str = ""
+    updated_at: float = 0.0
+
+    def verify(self, rows: Iterable[List[Any]]) -> Tuple[Optional[RowChecksums], Optional[str]]:
+        """Re-hash the first `self.rows` of `rows` (the rows below the header).
+
+        Returns (checksums to continue from, None) if they are unchanged, else (None, reason).
+        """
+        checks = RowChecksums(self.block_rows)
+        for row in islice(rows, self.rows):
+            digest = checks.add(row)
+            if digest is not None and digest != self.blocks[len(checks.blocks) - 1]:
+                first = self.header_idx + 2 + (len(checks.blocks) - 1) * self.block_rows
+                return None, f"Rows {first}-{first + self.block_rows - 1} changed since the last parse"
+        if checks.rows < self.rows:
+            return None, "The sheet has fewer rows than at the last parse"
+        if checks.tail != self.tail:
+            first = self.header_idx + 2 + len(checks.blocks) * self.block_rows
+            return None, f"Rows {first}-{self.header_idx + 1 + self.rows} changed since the last parse"
+        return checks, None
+
+
+class IncrementalStore:
+    """LogState per client-chosen key, kept in SQLite (`path=None` keeps it in memory)."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path or ":memory:", check_same_thread=False, timeout=30)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS logs (key TEXT PRIMARY KEY, payload TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[LogState]:
+        with self._lock:
+            row = self._conn.execute("SELECT payload FROM logs WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        data = json.loads(row[0])
+        data["columns"] = [ColumnInput.model_validate(c) for c in data["columns"]]
+        data["mappings"] = [ColumnMapping.model_validate(m) for m in data["mappings"]]
+        return LogState(**data)
+
+    def put(self, state: LogState) -> None:
+        state.updated_at = time.time()
+        payload = json.dumps({
+            **{k: v for k, v in state.__dict__.items() if k not in ("columns", "mappings")},
+            "columns": [c.model_dump() for c in state.columns],
+            "mappings": [m.model_dump() for m in state.mappings],
+        }, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO logs (key, payload, updated_at) VALUES (?, ?, ?)",
+                (state.key, payload, state.updated_at),
+            )
+            self._conn.commit()
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            deleted = self._conn.execute("DELETE FROM logs WHERE key = ?", (key,)).rowcount
+            self._conn.commit()
+        return bool(deleted)
+
+
+_default_store: Optional[IncrementalStore] = None
+_default_lock = threading.Lock()
+
+
+def get_incremental_store() -> IncrementalStore:
+    """Process-wide store at INCREMENTAL_STORE_PATH (empty = memory only)."""
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = IncrementalStore(os.getenv("INCREMENTAL_STORE_PATH", DEFAULT_STORE_PATH) or None)
+        return _default_store
@@ -0,0 +1,428 @@
+from __future__ import annotations
+
+from typing import List, Optional, Set
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+
+from app.models.schemas import JobInfo, JobProgress, JobStatus, OutputFormat
+from .cells import dump_json
+from .excel_reader import sheet_row_counts
+from .executor import get_executor
+from .pipeline import parse_excel, parse_workbook
+from .uploads import SpooledUpload
+from .utils import cache_path
+
+
+DEFAULT_JOBS_DIR = cache_path("jobs")
+FINISHED_STATUSES = ("succeeded", "failed", "cancelled")
+
+# Running jobs write their progress (and pick up cancellation requested from another
+# process) at most this often.
+PROGRESS_FLUSH_SECONDS = 1.0
+# Each queue stamps the jobs it runs this often; a running job whose stamp is older than
+# JOB_STALE_SECONDS belongs to a process that died and is queued again.
+HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "5"))
+STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "30"))
+# Finished jobs and their results are deleted this long after they finish (0 keeps them).
+RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", str(7 * 24 * 3600)))
+
+
+class QueueFull(RuntimeError):
+    """Raised when a job is refused because too many jobs are waiting."""
+
+
+class JobCancelled(Exception):
+    pass
+
+
+_COLUMNS = (
+    "id, status, priority, filename, all_sheets, format, rows_processed, rows_total, "
+    "created_at, started_at, finished_at, warnings"
+)
+
+
+def _job_info(row: tuple) -> JobInfo:
+    (job_id, status, priority, filename, all_sheets, output, rows_processed, rows_total,
+     created_at, started_at, finished_at, warnings) = row
+    return JobInfo(
+        id=job_id,
+        status=status,
+        priority=priority,
+        filename=filename,
+        all_sheets=bool(all_sheets),
+        format=output,
+        progress=JobProgress(rows_processed=rows_processed, rows_total=rows_total),
+        created_at=created_at,
+        started_at=started_at,
+        finished_at=finished_at,
+        warnings=json.loads(warnings),
+    )
+
+
+class JobQueue:
+    """Parse jobs persisted in SQLite and run by a pool of background worker threads.
+
+    Each job's upload is kept in `directory/uploads` until the job finishes and its
+    serialized response is written to `directory/results`. Workers take the queued job
+    with the highest priority (oldest first among equals). Cancelling a queued job takes
+    effect at once; a running job stops at its next row block.
+
+    Several processes may share `directory`. Each queue records itself as the owner of the
+    jobs it runs and refreshes their heartbeat; running jobs whose heartbeat went stale
+    (their process died) are queued again. Finished jobs expire after `retention` seconds.
+    """
+
+    def __init__(
+        self,
+        directory: str = DEFAULT_JOBS_DIR,
+        workers: int = 2,
+        max_queued: int = 10_000,
+        retention: float = RETENTION_SECONDS,
+    ):
+        self.directory = directory
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self.retention = retention
+        self.owner = uuid.uuid4().hex
+        self._uploads = os.path.join(directory, "uploads")
+        self._results = os.path.join(directory, "results")
+        os.makedirs(self._uploads, exist_ok=True)
+        os.makedirs(self._results, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(directory, "jobs.sqlite3"), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT UNIQUE NOT NULL, status TEXT NOT NULL, "
+            "priority INTEGER NOT NULL, filename TEXT NOT NULL, all_sheets INTEGER NOT NULL, format TEXT NOT NULL, "
+            "rows_processed INTEGER NOT NULL DEFAULT 0, rows_total INTEGER, cancel_requested INTEGER NOT NULL DEFAULT 0, "
+            "created_at REAL NOT NULL, started_at REAL, finished_at REAL, warnings TEXT NOT NULL DEFAULT '[]', "
+            "owner TEXT, heartbeat_at REAL)"
+        )
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column in ("owner TEXT", "heartbeat_at REAL"):
+            if column.split()[0] not in existing:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column}")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority DESC, seq)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished_at)")
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._cancelled: Set[str] = set()
+        self._threads: List[threading.Thread] = []
+        self._stopping = False
+        self._stopped = threading.Event()
+        with self._lock:
+            self._requeue_stale()
+        self.purge_expired()
+
+    def _upload_path(self, job_id: str) -> str:
+        return os.path.join(self._uploads, f"{job_id}.xlsx")
+
+    def _result_path(self, job_id: str) -> str:
+        return os.path.join(self._results, f"{job_id}.json")
+
+    def submit(self, upload: SpooledUpload, all_sheets: bool = False, output: OutputFormat = "cells", priority: int = 0) -> JobInfo:
+        """Take ownership of a spooled upload and queue it; raise QueueFull past `max_queued` waiting jobs."""
+        job_id = uuid.uuid4().hex
+        shutil.move(upload.path, self._upload_path(job_id))
+        with self._lock:
+            # One write transaction for the count and the insert, so concurrent submits
+            # (from this or another process) cannot push the queue past its limit.
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                queued = self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+                if queued >= self.max_queued:
+                    raise QueueFull(f"Job queue is full ({queued} jobs waiting); retry later.")
+                self._conn.execute(
+                    "INSERT INTO jobs (id, status, priority, filename, all_sheets, format, created_at) "
+                    "VALUES (?, 'queued', ?, ?, ?, ?, ?)",
+                    (job_id, priority, upload.filename, int(all_sheets), output, time.time()),
+                )
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                self._remove(self._upload_path(job_id))
+                raise
+            self._wake.notify()
+        return self.get(job_id)  # type: ignore[return-value]
+
+    def get(self, job_id: str) -> Optional[JobInfo]:
+        with self._lock:
+            row = self._conn.execute(f"SELECT {_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _job_info(row) if row is not None else None
+
+    def list(self, status: Optional[JobStatus] = None, limit: int = 100) -> List[JobInfo]:
+        query = f"SELECT {_COLUMNS} FROM jobs"
+        args: tuple = ()
+        if status is not None:
+            query += " WHERE status = ?"
+            args = (status,)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY seq DESC LIMIT ?", args + (limit,)).fetchall()
+        return [_job_info(r) for r in rows]
+
+    def result(self, job_id: str) -> Optional[bytes]:
+        try:
+            with open(self._result_path(job_id), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def cancel(self, job_id: str) -> Optional[JobInfo]:
+        """Cancel a queued or running job; a finished job is deleted together with its result."""
+        with self._lock:
+            row = self._conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            if row[0] == "queued":
+                self._finish(job_id, "cancelled", [])
+            elif row[0] == "running":
+                self._cancelled.add(job_id)
+                self._conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+                self._conn.commit()
+            else:
+                info = _job_info(self._conn.execute(f"SELECT {_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone())
+                self._conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+                self._conn.commit()
+                self._remove(self._result_path(job_id))
+                return info
+        return self.get(job_id)
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _finish(self, job_id: str, status: JobStatus, warnings: List[str]) -> None:
+        """Record a final status; call with the lock held."""
+        self._conn.execute(
+            "UPDATE jobs SET status = ?, finished_at = ?, warnings = ?, owner = NULL, heartbeat_at = NULL WHERE id = ?",
+            (status, time.time(), json.dumps(warnings), job_id),
+        )
+        self._conn.commit()
+        self._cancelled.discard(job_id)
+        self._remove(self._upload_path(job_id))
+
+    def _claim(self) -> Optional[str]:
+        """Mark the next queued job running and return its id; call with the lock held."""
+        while True:
+            row = self._conn.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' ORDER BY priority DESC, seq LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            # The status check keeps two processes sharing the database from claiming the same job.
+            now = time.time()
+            claimed = self._conn.execute(
+                "UPDATE jobs SET status = 'running', started_at = ?, owner = ?, heartbeat_at = ? "
+                "WHERE id = ? AND status = 'queued'",
+                (now, self.owner, now, row[0]),
+            ).rowcount
+            self._conn.commit()
+            if claimed:
+                return row[0]
+
+    def _requeue(self, job_id: str) -> None:
+        """Put an interrupted job back in the queue; call with the lock held."""
+        self._conn.execute(
+            "UPDATE jobs SET status = 'queued', started_at = NULL, rows_processed = 0, owner = NULL, heartbeat_at = NULL "
+            "WHERE id = ? AND owner = ?",
+            (job_id, self.owner),
+        )
+        self._conn.commit()
+
+    def _owns(self, job_id: str) -> bool:
+        """Whether this queue still runs `job_id` (it was not requeued as stale); call with the lock held."""
+        row = self._conn.execute("SELECT status, owner FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row is not None and row[0] == "running" and row[1] == self.owner
+
+    def _requeue_stale(self) -> int:
+        """Queue again running jobs whose owner stopped heartbeating; call with the lock held."""
+        requeued = self._conn.execute(
+            "UPDATE jobs SET status = 'queued', started_at = NULL, rows_processed = 0, owner = NULL, heartbeat_at = NULL "
+            "WHERE status = 'running' AND (heartbeat_at IS NULL OR heartbeat_at < ?)",
+            (time.time() - STALE_SECONDS,),
+        ).rowcount
+        self._conn.commit()
+        if requeued:
+            self._wake.notify_all()
+        return requeued
+
+    def _heartbeat(self) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET heartbeat_at = ? WHERE owner = ? AND status = 'running'", (time.time(), self.owner)
+            )
+            self._conn.commit()
+            self._requeue_stale()
+
+    def purge_expired(self) -> int:
+        """Delete finished jobs (and their results) older than `retention`; return how many."""
+        if self.retention <= 0:
+            return 0
+        with self._lock:
+            cutoff = time.time() - self.retention
+            expired = [row[0] for row in self._conn.execute(
+                "SELECT id FROM jobs WHERE finished_at < ? AND status IN (?, ?, ?)", (cutoff, *FINISHED_STATUSES)
+            )]
+            self._conn.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id in expired])
+            self._conn.commit()
+        for job_id in expired:
+            self._remove(self._result_path(job_id))
+        return len(expired)
+
+    def _maintain(self) -> None:
+        """Refresh this queue's heartbeats, requeue stale jobs and expire old ones until stopped."""
+        while not self._stopped.wait(HEARTBEAT_SECONDS):
+            self._heartbeat()
+            self.purge_expired()
+
+    def _cancel_requested(self, job_id: str) -> bool:
+        if job_id in self._cancelled:
+            return True
+        row = self._conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def _run(self, job_id: str) -> None:
+        with self._lock:
+            all_sheets, output = self._conn.execute("SELECT all_sheets, format FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        path = self._upload_path(job_id)
+        try:
+            counts = sheet_row_counts(path)
+            declared = counts if all_sheets else counts[:1]
+            total: Optional[int] = None if None in declared else sum(declared)
+        except Exception:
+            total = None
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET rows_total = ? WHERE id = ?", (total, job_id))
+            self._conn.commit()
+
+        last_flush = [time.monotonic()]
+
+        def progress(rows: int) -> None:
+            now = time.monotonic()
+            if self._stopping or job_id in self._cancelled:
+                raise JobCancelled(job_id)
+            if now - last_flush[0] < PROGRESS_FLUSH_SECONDS:
+                return
+            last_flush[0] = now
+            with self._lock:
+                self._conn.execute("UPDATE jobs SET rows_processed = ? WHERE id = ?", (rows, job_id))
+                self._conn.commit()
+                if self._cancel_requested(job_id):
+                    raise JobCancelled(job_id)
+
+        # The parsers usually turn a JobCancelled from `progress` into an error response; the
+        # cancel/stop checks below decide the job status either way.
+        result = None
+        try:
+            if all_sheets:
+                executor = get_executor()
+                processes = executor.use_processes(os.path.getsize(path))
+                result = parse_workbook(path, None, False, executor.pool(processes) if processes else None, output, progress, compact=True)
+            else:
+                result = parse_excel(path, output, progress=progress, compact=True)
+        except JobCancelled:
+            pass
+
+        with self._lock:
+            if not self._owns(job_id):
+                # Requeued as stale while this worker was stalled: the job runs elsewhere now.
+                return
+            if self._cancel_requested(job_id):
+                self._finish(job_id, "cancelled", [])
+                return
+            if self._stopping or result is None:
+                self._requeue(job_id)
+                return
+            with open(self._result_path(job_id) + ".tmp", "wb") as f:
+                f.write(dump_json(result))
+            os.replace(self._result_path(job_id) + ".tmp", self._result_path(job_id))
+            rows = sum(s.meta.get("rows", 0) for s in getattr(result, "sheets", None) or [result])
+            self._conn.execute("UPDATE jobs SET rows_processed = ? WHERE id = ?", (rows, job_id))
+            self._finish(job_id, "succeeded" if result.status == "success" else "failed", result.warnings)
+
+    def _worker(self) -> None:
+        while True:
+            with self._lock:
+                job_id = self._claim()
+                while job_id is None and not self._stopping:
+                    self._wake.wait()
+                    job_id = self._claim()
+                if self._stopping:
+                    if job_id is not None:
+                        self._requeue(job_id)
+                    return
+            try:
+                self._run(job_id)
+            except Exception as e:
+                with self._lock:
+                    if self._owns(job_id):
+                        self._finish(job_id, "failed", [str(e)])
+
+    def start(self) -> "JobQueue":
+        with self._lock:
+            self._stopping = False
+            self._stopped.clear()
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._worker, name=f"job-worker-{len(self._threads)}", daemon=True)
+                self._threads.append(thread)
+                thread.start()
+            thread = threading.Thread(target=self._maintain, name="job-heartbeat", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop the workers; running jobs stop at their next row block and are queued again."""
+        with self._lock:
+            self._stopping = True
+            self._wake.notify_all()
+        self._stopped.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        self._conn.close()
+
+    def wait(self, job_id: str, timeout: float = 30.0, poll: float = 0.05) -> Optional[JobInfo]:
+        """Block until the job finishes (or `timeout` passes) and return its final info."""
+        deadline = time.monotonic() + timeout
+        info = self.get(job_id)
+        while info is not None and info.status not in FINISHED_STATUSES and time.monotonic() < deadline:
+            time.sleep(poll)
+            info = self.get(job_id)
+        return info
+
+
+_default_queue: Optional[JobQueue] = None
+_default_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """Process-wide queue in JOBS_DIR with JOB_WORKERS worker threads and at most JOB_MAX_QUEUED waiting jobs.
+
+    Finished jobs are kept for JOB_RETENTION_SECONDS.
+    """
+    global _default_queue
+    with _default_lock:
+        if _default_queue is None:
+            _default_queue = JobQueue(
+                directory=os.getenv("JOBS_DIR", DEFAULT_JOBS_DIR),
+                workers=int(os.getenv("JOB_WORKERS", "2")),
+                max_queued=int(os.getenv("JOB_MAX_QUEUED", "10000")),
+            ).start()
+        return _default_queue
+
+
+def shutdown_job_queue() -> None:
+    global _default_queue
+    with _default_lock:
+        if _default_queue is not None:
+            _default_queue.stop()
+            _default_queue = None
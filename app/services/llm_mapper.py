@@ -1,14 +1,23 @@
 from __future__ import annotations
 
+import asyncio
 import json
 import os
-from typing import Dict, List, Tuple
-from difflib import SequenceMatcher
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 
 from google import genai
+from google.genai import types
 from pydantic import ValidationError
 
 from app.models.schemas import ColumnInput, ColumnMapping, LLMMappingResponse
+from .metrics import StageTimings, observe_llm_call
+from .mapping_cache import MappingCache, get_mapping_cache, mapping_cache_key
+from .param_index import ParameterIndex
+from .registry import RegistrySnapshot, build_snapshot, get_registry, registry_fingerprint
 from .utils import normalize_text
 
 
@@ -31,29 +40,11 @@ def _extract_json(text: str) -> str:
     return text[start : end + 1]
 
 
-def _fallback_map(columns: List[ColumnInput], parameters: List[Dict]) -> List[ColumnMapping]:
-    param_candidates = []
-    for p in parameters:
-        name = p["name"]
-        disp = p.get("display_name", "")
-        unit = p.get("unit", "")
-        blob = normalize_text(f"{name} {disp} {unit}")
-        param_candidates.append((name, blob))
-
-    def sim(a: str, b: str) -> float:
-        return SequenceMatcher(None, a, b).ratio()
+def _fallback_map(columns: List[ColumnInput], index: ParameterIndex) -> List[ColumnMapping]:
+    matches = index.best_matches([normalize_text(c.normalized_header) for c in columns])
 
     out: List[ColumnMapping] = []
-    for c in columns:
-        h = normalize_text(c.normalized_header)
-        best_name = None
-        best_score = 0.0
-        for name, blob in param_candidates:
-            score = sim(h, blob)
-            if score > best_score:
-                best_score = score
-                best_name = name
-
+    for c, (best_name, best_score) in zip(columns, matches):
         if best_score >= 0.75:
             conf = "high"
         elif best_score >= 0.62:
@@ -74,22 +65,75 @@ def _fallback_map(columns: List[ColumnInput], parameters: List[Dict]) -> List[Co
     return out
 
 
-def map_columns_with_gemini(
-    columns: List[ColumnInput],
-    parameters: List[Dict],
-    assets: List[Dict],
-    model: str = "gemini-2.5-flash-lite",
-    temperature: float = 0.0,
-) -> Tuple[List[ColumnMapping], List[str]]:
-    warnings: List[str] = []
+# Prefixes of the warnings added when the API call failed, or no API key is set, and the
+# fallback mapper was used instead.
+MAPPING_FAILED_WARNING = "Gemini mapping failed"
+NO_API_KEY_WARNING = "GEMINI_API_KEY not set"
+
+DEFAULT_MODEL = "gemini-2.5-flash-lite"
+
+
+def mapper_mode(model: str = DEFAULT_MODEL) -> str:
+    """The model new mappings come from, or "fallback" while GEMINI_API_KEY is unset."""
+    return model if os.getenv("GEMINI_API_KEY") else "fallback"
+
+
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+GEMINI_TIMEOUT_S = float(os.getenv("GEMINI_TIMEOUT_S", "30"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "2"))
+GEMINI_RETRY_BACKOFF_S = float(os.getenv("GEMINI_RETRY_BACKOFF_S", "0.5"))
+
+# Sheets with more columns than this are mapped in batches of this size, one request each.
+MAPPING_BATCH_COLUMNS = int(os.getenv("MAPPING_BATCH_COLUMNS", "40"))
+# Registries up to this many entries go into every prompt whole; larger ones are cut down
+# per batch to the entries its columns plausibly need.
+MAPPING_FULL_REGISTRY_MAX = int(os.getenv("MAPPING_FULL_REGISTRY_MAX", "200"))
+# Parameters offered per column when the registry is cut down (see ParameterIndex.plausible).
+MAPPING_SHORTLIST = int(os.getenv("MAPPING_SHORTLIST", "12"))
+
+_client_lock = threading.Lock()
+_sync_client: Optional[genai.Client] = None
+_sync_semaphore = threading.BoundedSemaphore(GEMINI_MAX_CONCURRENCY)
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Tuple[genai.Client, asyncio.Semaphore]]" = weakref.WeakKeyDictionary()
+
+
+def _new_client() -> genai.Client:
+    http_options = types.HttpOptions(
+        base_url=os.getenv("GEMINI_BASE_URL") or None,
+        timeout=int(GEMINI_TIMEOUT_S * 1000),
+    )
+    return genai.Client(api_key=os.getenv("GEMINI_API_KEY"), http_options=http_options)
+
+
+def _get_sync_client() -> genai.Client:
+    """Long-lived client shared by all threads of this process."""
+    global _sync_client
+    with _client_lock:
+        if _sync_client is None:
+            _sync_client = _new_client()
+        return _sync_client
+
 
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        warnings.append("GEMINI_API_KEY not set; used deterministic fallback header mapper.")
-        return _fallback_map(columns, parameters), warnings
+def _get_async_client() -> Tuple[genai.Client, asyncio.Semaphore]:
+    """Long-lived client and concurrency semaphore for the running event loop."""
+    loop = asyncio.get_running_loop()
+    with _client_lock:
+        entry = _async_clients.get(loop)
+        if entry is None:
+            entry = (_new_client(), asyncio.Semaphore(GEMINI_MAX_CONCURRENCY))
+            _async_clients[loop] = entry
+        return entry
 
-    client = genai.Client()
 
+def reset_clients() -> None:
+    """Drop the shared clients so the next call picks up changed GEMINI_* settings."""
+    global _sync_client
+    with _client_lock:
+        _sync_client = None
+        _async_clients.clear()
+
+
+def _build_prompt(columns: List[ColumnInput], parameters: List[Dict], assets: List[Dict]) -> str:
     payload = {
         "task": "map_headers",
         "asset_registry": [{"name": a["name"], "display_name": a.get("display_name", "")} for a in assets],
@@ -102,18 +146,11 @@ def map_columns_with_gemini(
         },
     }
 
-    prompt = SYSTEM_PROMPT + "\n\nUSER_PAYLOAD_JSON:\n" + json.dumps(payload, ensure_ascii=False)
+    return SYSTEM_PROMPT + "\n\nUSER_PAYLOAD_JSON:\n" + json.dumps(payload, ensure_ascii=False)
 
-    resp = client.models.generate_content(
-        model=model,
-        contents=prompt,
-        config={
-            "temperature": temperature,
-            "response_mime_type": "application/json",
-        },
-    )
 
-    raw_text = (resp.text or "").strip()  
+def _parse_response_text(text: Optional[str]) -> List[ColumnMapping]:
+    raw_text = (text or "").strip()
     json_str = _extract_json(raw_text)
     data = json.loads(json_str)
 
@@ -121,5 +158,279 @@ def map_columns_with_gemini(
         parsed = LLMMappingResponse.model_validate(data)
     except ValidationError as e:
         raise ValueError(f"Gemini JSON failed schema validation: {e}") from e
+    return parsed.mappings
+
+
+# (columns, parameters, assets) sent in one request.
+MappingBatch = Tuple[List[ColumnInput], List[Dict], List[Dict]]
+
+
+def _relevant_assets(columns: List[ColumnInput], assets: List[Dict]) -> List[Dict]:
+    """Assets hinted for, or named (ignoring spacing) in, any of the columns' headers."""
+    hints = {c.asset_hint for c in columns if c.asset_hint}
+    headers = [c.normalized_header.replace(" ", "") for c in columns]
+    out = []
+    for a in assets:
+        names = {normalize_text(a["name"]).replace(" ", ""), normalize_text(a.get("display_name", "")).replace(" ", "")} - {""}
+        if a["name"] in hints or any(n in h for n in names for h in headers):
+            out.append(a)
+    return out
+
+
+def _plan_batches(
+    columns: List[ColumnInput], parameters: List[Dict], assets: List[Dict], index: ParameterIndex
+) -> List[MappingBatch]:
+    """Split the columns into request-sized batches, each with the registry entries it plausibly needs.
+
+    Narrow sheets against small registries stay a single request with the full registries.
+    """
+    if len(columns) <= MAPPING_BATCH_COLUMNS and len(parameters) <= MAPPING_FULL_REGISTRY_MAX and len(assets) <= MAPPING_FULL_REGISTRY_MAX:
+        return [(columns, parameters, assets)]
+
+    batches: List[MappingBatch] = []
+    for start in range(0, len(columns), MAPPING_BATCH_COLUMNS):
+        chunk = columns[start : start + MAPPING_BATCH_COLUMNS]
+        batch_params = parameters
+        if len(parameters) > MAPPING_FULL_REGISTRY_MAX:
+            positions = index.plausible([c.normalized_header for c in chunk], [c.unit_hint for c in chunk], MAPPING_SHORTLIST)
+            batch_params = [parameters[p] for p in positions]
+        batch_assets = _relevant_assets(chunk, assets) if len(assets) > MAPPING_FULL_REGISTRY_MAX else assets
+        batches.append((chunk, batch_params, batch_assets))
+    return batches
+
+
+def _batch_label(columns: List[ColumnInput], batched: bool) -> str:
+    if not batched:
+        return ""
+    return f" for columns {columns[0].column_index}-{columns[-1].column_index}"
+
+
+def _keep_batch_columns(mappings: List[ColumnMapping], columns: List[ColumnInput]) -> List[ColumnMapping]:
+    """Drop mappings the model returned for columns outside the batch it was asked about."""
+    wanted = {c.column_index for c in columns}
+    return [m for m in mappings if m.column_index in wanted]
+
+
+def _lookup_cache(
+    batches: List[MappingBatch],
+    version: str,
+    model: str,
+    cache: MappingCache,
+    stats: Optional[Dict[str, int]],
+) -> List[Tuple[str, Optional[List[ColumnMapping]]]]:
+    out = []
+    for columns, _, _ in batches:
+        key = mapping_cache_key(columns, version, model)
+        cached = cache.get(key)
+        if stats is not None:
+            outcome = "hits" if cached is not None else "misses"
+            stats[outcome] = stats.get(outcome, 0) + 1
+        out.append((key, cached))
+    return out
+
+
+def _fallback_after_failure(
+    columns: List[ColumnInput],
+    error: Optional[Exception],
+    warnings: List[str],
+    index: ParameterIndex,
+    label: str = "",
+) -> List[ColumnMapping]:
+    reason = f"{type(error).__name__}: {error}" if error is not None else "no response"
+    warnings.append(f"{MAPPING_FAILED_WARNING}{label} after {GEMINI_MAX_RETRIES + 1} attempt(s) ({reason}); used deterministic fallback header mapper.")
+    return _fallback_map(columns, index)
+
+
+def _snapshot_for(parameters: List[Dict], assets: List[Dict]) -> RegistrySnapshot:
+    """The current registry snapshot, or a one-off snapshot when mapping against other registry lists."""
+    current = get_registry()
+    if current.version == registry_fingerprint(parameters, assets):
+        return current
+    return build_snapshot(parameters, assets)
+
+
+def _prepare(
+    columns: List[ColumnInput],
+    parameters: List[Dict],
+    assets: List[Dict],
+    model: str,
+    cache: Optional[MappingCache],
+    stats: Optional[Dict[str, int]],
+    registry: Optional[RegistrySnapshot],
+    warnings: List[str],
+) -> Tuple[List[MappingBatch], List[str], List[Optional[List[ColumnMapping]]], ParameterIndex, MappingCache]:
+    """Batch the columns and resolve what the cache (or, without an API key, the fallback) can answer.
+
+    Returns (batches, cache keys, per-batch mappings with None where a request is needed, index, cache).
+    """
+    cache = cache or get_mapping_cache()
+    registry = registry or _snapshot_for(parameters, assets)
+    index = registry.param_index
+    batches = _plan_batches(columns, parameters, assets, index)
+    looked_up = _lookup_cache(batches, registry.version, model, cache, stats)
+    keys = [key for key, _ in looked_up]
+    results = [cached for _, cached in looked_up]
+
+    if any(r is None for r in results) and not os.getenv("GEMINI_API_KEY"):
+        warnings.append(f"{NO_API_KEY_WARNING}; used deterministic fallback header mapper.")
+        results = [r if r is not None else _fallback_map(b[0], index) for r, b in zip(results, batches)]
+    return batches, keys, results, index, cache
+
+
+def _request_batch_sync(
+    client: genai.Client, batch: MappingBatch, model: str, config: Dict, timings: Optional[StageTimings]
+) -> Tuple[Optional[List[ColumnMapping]], Optional[Exception]]:
+    columns, parameters, assets = batch
+    prompt = _build_prompt(columns, parameters, assets)
+    error: Optional[Exception] = None
+    for attempt in range(GEMINI_MAX_RETRIES + 1):
+        if attempt:
+            time.sleep(GEMINI_RETRY_BACKOFF_S * (2 ** (attempt - 1)))
+        resp = None
+        with _sync_semaphore:
+            start = time.perf_counter()
+            try:
+                resp = client.models.generate_content(model=model, contents=prompt, config=config)
+                mappings = _parse_response_text(resp.text)
+            except Exception as e:
+                observe_llm_call(time.perf_counter() - start, "error", resp, timings)
+                error = e
+                continue
+        observe_llm_call(time.perf_counter() - start, "success", resp, timings)
+        return _keep_batch_columns(mappings, columns), None
+    return None, error
+
+
+async def _request_batch_async(
+    client: genai.Client, semaphore: asyncio.Semaphore, batch: MappingBatch, model: str, config: Dict, timings: Optional[StageTimings]
+) -> Tuple[Optional[List[ColumnMapping]], Optional[Exception]]:
+    columns, parameters, assets = batch
+    prompt = _build_prompt(columns, parameters, assets)
+    error: Optional[Exception] = None
+    for attempt in range(GEMINI_MAX_RETRIES + 1):
+        if attempt:
+            await asyncio.sleep(GEMINI_RETRY_BACKOFF_S * (2 ** (attempt - 1)))
+        resp = None
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                resp = await asyncio.wait_for(
+                    client.aio.models.generate_content(model=model, contents=prompt, config=config),
+                    timeout=GEMINI_TIMEOUT_S,
+                )
+                mappings = _parse_response_text(resp.text)
+            except Exception as e:
+                observe_llm_call(time.perf_counter() - start, "error", resp, timings)
+                error = e
+                continue
+        observe_llm_call(time.perf_counter() - start, "success", resp, timings)
+        return _keep_batch_columns(mappings, columns), None
+    return None, error
+
+
+def _merge(
+    batches: List[MappingBatch],
+    keys: List[str],
+    results: List[Optional[List[ColumnMapping]]],
+    outcomes: Dict[int, Tuple[Optional[List[ColumnMapping]], Optional[Exception]]],
+    cache: MappingCache,
+    index: ParameterIndex,
+    warnings: List[str],
+) -> List[ColumnMapping]:
+    """Cache successful batch answers, fall back per failed batch, and concatenate in column order."""
+    merged: List[ColumnMapping] = []
+    for i, (batch, key, result) in enumerate(zip(batches, keys, results)):
+        if result is None:
+            result, error = outcomes[i]
+            if result is not None:
+                cache.put(key, result)
+            else:
+                label = _batch_label(batch[0], len(batches) > 1)
+                result = _fallback_after_failure(batch[0], error, warnings, index, label)
+        merged.extend(result)
+    return merged
+
+
+def map_columns_with_gemini(
+    columns: List[ColumnInput],
+    parameters: List[Dict],
+    assets: List[Dict],
+    model: str = DEFAULT_MODEL,
+    temperature: float = 0.0,
+    cache: Optional[MappingCache] = None,
+    stats: Optional[Dict[str, int]] = None,
+    registry: Optional[RegistrySnapshot] = None,
+    timings: Optional[StageTimings] = None,
+) -> Tuple[List[ColumnMapping], List[str]]:
+    """Map columns via Gemini, serving repeated header templates from the mapping cache.
+
+    Blocking variant for worker threads/processes; calls share one client and at most
+    GEMINI_MAX_CONCURRENCY run at once. Timeouts and errors are retried with backoff and
+    then fall back to `_fallback_map`. `stats`, if given, gets mapping cache "hits" / "misses".
+    Pass the `registry` snapshot the lists came from; without it the current snapshot is used
+    when the lists match it, else a one-off snapshot is built for them;
+    each API attempt's latency and token usage is recorded in `timings` and the /metrics counters.
+
+    Wide sheets are split into batches of MAPPING_BATCH_COLUMNS columns that are requested
+    concurrently, cached separately, and fall back independently when their request fails.
+    """
+    warnings: List[str] = []
+    batches, keys, results, index, cache = _prepare(columns, parameters, assets, model, cache, stats, registry, warnings)
+
+    pending = [i for i, r in enumerate(results) if r is None]
+    outcomes: Dict[int, Tuple[Optional[List[ColumnMapping]], Optional[Exception]]] = {}
+    if pending:
+        client = _get_sync_client()
+        config = {"temperature": temperature, "response_mime_type": "application/json"}
+        if len(pending) == 1:
+            outcomes[pending[0]] = _request_batch_sync(client, batches[pending[0]], model, config, timings)
+        else:
+            # Each thread records into its own StageTimings; they are merged once all finish.
+            batch_timings = [StageTimings() for _ in pending]
+            with ThreadPoolExecutor(max_workers=min(len(pending), GEMINI_MAX_CONCURRENCY)) as pool:
+                futures = [
+                    pool.submit(_request_batch_sync, client, batches[i], model, config, t)
+                    for i, t in zip(pending, batch_timings)
+                ]
+                for i, future in zip(pending, futures):
+                    outcomes[i] = future.result()
+            if timings is not None:
+                for t in batch_timings:
+                    timings.merge_llm(t)
+
+    return _merge(batches, keys, results, outcomes, cache, index, warnings), warnings
+
+
+async def map_columns_with_gemini_async(
+    columns: List[ColumnInput],
+    parameters: List[Dict],
+    assets: List[Dict],
+    model: str = DEFAULT_MODEL,
+    temperature: float = 0.0,
+    cache: Optional[MappingCache] = None,
+    stats: Optional[Dict[str, int]] = None,
+    registry: Optional[RegistrySnapshot] = None,
+    timings: Optional[StageTimings] = None,
+) -> Tuple[List[ColumnMapping], List[str]]:
+    """Async variant of `map_columns_with_gemini` for use on the server's event loop.
+
+    Cache lookups and writes, batch planning and the fallback mapper run in a worker
+    thread; only the Gemini requests are awaited on the loop.
+    """
+    warnings: List[str] = []
+    batches, keys, results, index, cache = await asyncio.to_thread(
+        _prepare, columns, parameters, assets, model, cache, stats, registry, warnings
+    )
+
+    pending = [i for i, r in enumerate(results) if r is None]
+    outcomes: Dict[int, Tuple[Optional[List[ColumnMapping]], Optional[Exception]]] = {}
+    if pending:
+        client, semaphore = _get_async_client()
+        config = {"temperature": temperature, "response_mime_type": "application/json"}
+        answers = await asyncio.gather(*(
+            _request_batch_async(client, semaphore, batches[i], model, config, timings) for i in pending
+        ))
+        outcomes = dict(zip(pending, answers))
 
-    return parsed.mappings, warnings
\ No newline at end of file
+    merged = await asyncio.to_thread(_merge, batches, keys, results, outcomes, cache, index, warnings)
+    return merged, warnings
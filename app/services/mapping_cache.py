@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from app.models.schemas import ColumnInput, ColumnMapping
+from app.services.utils import cache_path
+
+
+DEFAULT_CACHE_PATH = cache_path("mapping_cache.sqlite3")
+
+
+def mapping_cache_key(columns: List[ColumnInput], registry_version: str, model: str) -> str:
+    """Key on the normalized header row (with unit/asset hints), the registries and the model."""
+    signature = [[c.normalized_header, c.unit_hint, c.asset_hint] for c in columns]
+    blob = json.dumps({"columns": signature, "registry": registry_version, "model": model}, ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class MappingCache:
+    """Two-tier LRU/TTL cache of LLM column mappings: an in-process dict in front of a SQLite file.
+
+    `path=None` keeps the cache in memory only. Entries older than `ttl_seconds` are ignored
+    and dropped on lookup; each tier evicts least-recently-used entries beyond its size limit.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_entries: int = 1024,
+        max_disk_entries: int = 50_000,
+        ttl_seconds: float = 7 * 24 * 3600,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl_seconds = ttl_seconds
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _db(self) -> Optional[sqlite3.Connection]:
+        if not self.path:
+            return None
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS mappings ("
+                "key TEXT PRIMARY KEY, payload TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS mappings_accessed ON mappings (accessed)")
+            self._conn.commit()
+        return self._conn
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl_seconds > 0 and now - created > self.ttl_seconds
+
+    def _remember(self, key: str, created: float, payload: str) -> None:
+        self._memory[key] = (created, payload)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[List[ColumnMapping]]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if self._expired(entry[0], now):
+                    del self._memory[key]
+                    entry = None
+                else:
+                    self._memory.move_to_end(key)
+
+            if entry is None:
+                db = self._db()
+                if db is None:
+                    return None
+                row = db.execute("SELECT payload, created FROM mappings WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                payload, created = row
+                if self._expired(created, now):
+                    db.execute("DELETE FROM mappings WHERE key = ?", (key,))
+                    db.commit()
+                    return None
+                db.execute("UPDATE mappings SET accessed = ? WHERE key = ?", (now, key))
+                db.commit()
+                entry = (created, payload)
+                self._remember(key, created, payload)
+
+        return [ColumnMapping.model_validate(m) for m in json.loads(entry[1])]
+
+    def put(self, key: str, mappings: List[ColumnMapping]) -> None:
+        now = time.time()
+        payload = json.dumps([m.model_dump() for m in mappings], ensure_ascii=False)
+        with self._lock:
+            self._remember(key, now, payload)
+            db = self._db()
+            if db is None:
+                return
+            db.execute(
+                "INSERT OR REPLACE INTO mappings (key, payload, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, payload, now, now),
+            )
+            db.execute(
+                "DELETE FROM mappings WHERE key IN ("
+                "SELECT key FROM mappings ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_disk_entries,),
+            )
+            db.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            db = self._db()
+            if db is not None:
+                db.execute("DELETE FROM mappings")
+                db.commit()
+
+
+_default_cache: Optional[MappingCache] = None
+_default_lock = threading.Lock()
+
+
+def get_mapping_cache() -> MappingCache:
+    """Process-wide cache configured from MAPPING_CACHE_PATH / _SIZE / _TTL (empty path = memory only)."""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = MappingCache(
+                path=os.getenv("MAPPING_CACHE_PATH", DEFAULT_CACHE_PATH) or None,
+                max_entries=int(os.getenv("MAPPING_CACHE_SIZE", "1024")),
+                ttl_seconds=float(os.getenv("MAPPING_CACHE_TTL", str(7 * 24 * 3600))),
+            )
+        return _default_cache
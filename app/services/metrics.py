@@ -0,0 +1,323 @@
+from __future__ import annotations
+
+from collections import Counter as _Tally
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+import bisect
+import math
+import os
+import sys
+import threading
+import time
+
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(tuple(str(labels.get(n, "")) for n in self.labelnames), 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, v in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, key)} {_fmt(v)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelValues, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket counts (non-cumulative), then +Inf count, then sum.
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            series[bisect.bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def count(self, **labels: str) -> int:
+        series = self._series.get(tuple(str(labels.get(n, "")) for n in self.labelnames))
+        return int(sum(series[:-1])) if series else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0.0
+                for bound, n in zip(self.buckets + (math.inf,), series[:-1]):
+                    cumulative += n
+                    le = 'le="%s"' % _fmt(bound)
+                    lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {_fmt(cumulative)}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_fmt(series[-1])}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {_fmt(cumulative)}")
+        return lines
+
+
+class MetricsRegistry:
+    """Minimal Prometheus text-format registry (counters and histograms only)."""
+
+    def __init__(self):
+        self._metrics: List[Any] = []
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+HTTP_REQUESTS = REGISTRY.counter("http_requests_total", "HTTP requests by route and status.", ["method", "route", "status"])
+HTTP_SECONDS = REGISTRY.histogram("http_request_seconds", "HTTP request latency by route.", ["method", "route"])
+STAGE_SECONDS = REGISTRY.histogram("parse_stage_seconds", "Wall time per parse stage.", ["stage"])
+STAGE_CPU_SECONDS = REGISTRY.counter("parse_stage_cpu_seconds_total", "CPU time per parse stage.", ["stage"])
+ROWS_TOTAL = REGISTRY.counter("parse_rows_total", "Data rows parsed.")
+CELLS_TOTAL = REGISTRY.counter("parse_cells_total", "Mapped cells parsed.")
+LLM_SECONDS = REGISTRY.histogram("llm_request_seconds", "Latency of each mapping API attempt.", ["outcome"])
+LLM_TOKENS = REGISTRY.counter("llm_tokens_total", "Tokens reported by the mapping API.", ["kind"])
+
+
+class StageTimings:
+    """Wall time, CPU time, row/cell counts and allocations per pipeline stage of one parse.
+
+    Stages that run several times (e.g. once per row block) accumulate. `alloc_blocks` is
+    the net change in live allocator blocks (`sys.getallocatedblocks`) over the stage.
+    `publish` feeds the totals into the process-wide Prometheus metrics; stages that ran in
+    a worker process are therefore only visible in the response meta.
+    """
+
+    def __init__(self, report: bool = False):
+        self.report = report
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.llm: Dict[str, float] = {}
+        self._published = False
+
+    def add(self, name: str, wall: float, cpu: float = 0.0, rows: int = 0, cells: int = 0, alloc_blocks: int = 0) -> None:
+        s = self.stages.get(name)
+        if s is None:
+            s = self.stages[name] = {"wall_ms": 0.0, "cpu_ms": 0.0, "calls": 0, "rows": 0, "cells": 0, "alloc_blocks": 0}
+        s["wall_ms"] += wall * 1000
+        s["cpu_ms"] += cpu * 1000
+        s["calls"] += 1
+        s["rows"] += rows
+        s["cells"] += cells
+        s["alloc_blocks"] += alloc_blocks
+
+    def count(self, name: str, rows: int = 0, cells: int = 0) -> None:
+        """Attribute rows/cells to a stage after it has been timed."""
+        s = self.stages.get(name)
+        if s is not None:
+            s["rows"] += rows
+            s["cells"] += cells
+
+    @contextmanager
+    def stage(self, name: str, rows: int = 0, cells: int = 0) -> Iterator[None]:
+        blocks = sys.getallocatedblocks()
+        cpu = time.thread_time()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(
+                name,
+                time.perf_counter() - start,
+                time.thread_time() - cpu,
+                rows,
+                cells,
+                sys.getallocatedblocks() - blocks,
+            )
+
+    def record_llm(self, seconds: float, outcome: str, prompt_tokens: int = 0, response_tokens: int = 0) -> None:
+        for key, amount in (("attempts", 1), ("latency_ms", seconds * 1000), ("prompt_tokens", prompt_tokens), ("response_tokens", response_tokens)):
+            self.llm[key] = self.llm.get(key, 0) + amount
+        if outcome != "success":
+            self.llm["errors"] = self.llm.get("errors", 0) + 1
+
+    def merge_llm(self, other: "StageTimings") -> None:
+        """Add the LLM attempts recorded in `other` (e.g. by a worker thread) to this parse."""
+        for key, amount in other.llm.items():
+            self.llm[key] = self.llm.get(key, 0) + amount
+
+    def as_dict(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {name: {k: round(v, 3) for k, v in s.items()} for name, s in self.stages.items()}
+        if self.llm:
+            out["llm"] = {k: round(v, 3) for k, v in self.llm.items()}
+        return out
+
+    def publish(self) -> None:
+        if self._published:
+            return
+        self._published = True
+        for name, s in self.stages.items():
+            STAGE_SECONDS.observe(s["wall_ms"] / 1000, stage=name)
+            STAGE_CPU_SECONDS.inc(s["cpu_ms"] / 1000, stage=name)
+        build = self.stages.get("build_cells") or self.stages.get("build_columns")
+        if build is not None:
+            ROWS_TOTAL.inc(build["rows"])
+            CELLS_TOTAL.inc(build["cells"])
+
+
+def observe_llm_call(seconds: float, outcome: str, response: Any = None, timings: Optional[StageTimings] = None) -> None:
+    """Record one mapping API attempt; token counts come from the response's usage metadata when present."""
+    usage = getattr(response, "usage_metadata", None)
+    prompt_tokens = int(getattr(usage, "prompt_token_count", 0) or 0)
+    response_tokens = int(getattr(usage, "candidates_token_count", 0) or 0)
+    LLM_SECONDS.observe(seconds, outcome=outcome)
+    if prompt_tokens:
+        LLM_TOKENS.inc(prompt_tokens, kind="prompt")
+    if response_tokens:
+        LLM_TOKENS.inc(response_tokens, kind="response")
+    if timings is not None:
+        timings.record_llm(seconds, outcome, prompt_tokens, response_tokens)
+
+
+PROFILE_HEADER = "x-profile"
+# Off unless enabled: sampling costs CPU on every profiled request.
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0") not in ("0", "false", "")
+
+_IDLE_FUNCTIONS = {"wait", "select", "poll", "epoll", "_worker", "accept", "sleep", "get", "run_forever", "_run_once"}
+
+
+_active_profiler: ContextVar[Optional["SamplingProfiler"]] = ContextVar("active_profiler", default=None)
+
+
+def active_profiler() -> Optional["SamplingProfiler"]:
+    """The profiler started in the current context (request), if any."""
+    return _active_profiler.get()
+
+
+class SamplingProfiler:
+    """Background thread that samples the Python stacks of attached threads every `interval` seconds.
+
+    Stacks are collapsed to "file:function;..." strings (root first) and counted, the same
+    form flame-graph tools read. Only threads inside `attach()` are sampled, so a request's
+    profile never shows other requests' frames; the executor attaches the threads running
+    work for the context that started the profiler (see `active_profiler`).
+    """
+
+    def __init__(self, interval: float = 0.005, max_depth: int = 40):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples: _Tally = _Tally()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._threads: Set[int] = set()
+        self._threads_lock = threading.Lock()
+        self._token: Any = None
+
+    @contextmanager
+    def attach(self) -> Iterator[None]:
+        """Sample the calling thread until the block exits."""
+        ident = threading.get_ident()
+        with self._threads_lock:
+            self._threads.add(ident)
+        try:
+            yield
+        finally:
+            with self._threads_lock:
+                self._threads.discard(ident)
+
+    def wrap(self, fn: Callable[..., Any]) -> Callable[..., Any]:
+        def run(*args: Any) -> Any:
+            with self.attach():
+                return fn(*args)
+        return run
+
+    def _collapse(self, frame: Any) -> Optional[str]:
+        if frame.f_code.co_name in _IDLE_FUNCTIONS:
+            return None
+        parts: List[str] = []
+        while frame is not None and len(parts) < self.max_depth:
+            code = frame.f_code
+            parts.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        return ";".join(reversed(parts))
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            with self._threads_lock:
+                threads = set(self._threads)
+            if not threads:
+                continue
+            for ident, frame in sys._current_frames().items():
+                if ident not in threads:
+                    continue
+                stack = self._collapse(frame)
+                if stack:
+                    self.samples[stack] += 1
+
+    def start(self) -> "SamplingProfiler":
+        """Start sampling and make this the `active_profiler()` of the calling context."""
+        self._token = _active_profiler.set(self)
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._token is not None:
+            _active_profiler.reset(self._token)
+            self._token = None
+
+    def report(self, top: int = 25) -> Dict[str, Any]:
+        return {
+            "interval_ms": self.interval * 1000,
+            "samples": sum(self.samples.values()),
+            "top": [{"stack": stack, "count": n} for stack, n in self.samples.most_common(top)],
+        }
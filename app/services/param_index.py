@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Tuple
+import zlib
+
+import numpy as np
+
+from .utils import normalize_text
+
+
+DEFAULT_SHORTLIST = 40
+FEATURE_DIM = 1024
+
+
+def _gram_buckets(text: str) -> List[int]:
+    padded = f" {text} "
+    buckets: List[int] = []
+    for n in (2, 3):
+        for i in range(len(padded) - n + 1):
+            buckets.append(zlib.crc32(padded[i : i + n].encode("utf-8")) % FEATURE_DIM)
+    return buckets
+
+
+def _count_matrix(texts: List[str]) -> np.ndarray:
+    counts = np.zeros((len(texts), FEATURE_DIM), dtype=np.float32)
+    for row, text in enumerate(texts):
+        np.add.at(counts[row], _gram_buckets(text), 1.0)
+    return counts
+
+
+def _normalize_rows(m: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return m / norms
+
+
+class ParameterIndex:
+    """Hashed char 2/3-gram TF-IDF index over the parameter registry for the fallback mapper.
+
+    All headers are shortlisted at once with one matrix product against the registry,
+    keeping the `shortlist` most similar parameters per header; only those are scored with
+    difflib's ratio, so scores and thresholds match a full scan whenever the best parameter
+    makes the shortlist.
+    """
+
+    def __init__(self, parameters: List[Dict], shortlist: int = DEFAULT_SHORTLIST):
+        self.shortlist = shortlist
+        self.names: List[str] = [p["name"] for p in parameters]
+        self._by_unit: Dict[str, List[int]] = {}
+        for pos, p in enumerate(parameters):
+            unit = normalize_text(p.get("unit", ""))
+            if unit:
+                self._by_unit.setdefault(unit, []).append(pos)
+        self.blobs: List[str] = [
+            normalize_text(f"{p['name']} {p.get('display_name', '')} {p.get('unit', '')}") for p in parameters
+        ]
+        counts = _count_matrix(self.blobs)
+        df = np.count_nonzero(counts, axis=0)
+        self._idf = (np.log((1 + len(self.blobs)) / (1 + df)) + 1.0).astype(np.float32)
+        self._matrix = _normalize_rows(counts * self._idf)
+
+    def _similarity(self, headers: List[str]) -> np.ndarray:
+        return _normalize_rows(_count_matrix(headers) * self._idf) @ self._matrix.T
+
+    def candidates_many(self, headers: List[str]) -> List[List[int]]:
+        """Registry positions of the parameters most similar to each normalized header."""
+        n = len(self.names)
+        if n <= self.shortlist:
+            return [list(range(n)) for _ in headers]
+        if not headers:
+            return []
+        scores = self._similarity(headers)
+        top = np.argpartition(-scores, self.shortlist - 1, axis=1)[:, : self.shortlist]
+        return [sorted(row.tolist()) for row in top]
+
+    def plausible(self, headers: List[str], unit_hints: List[Optional[str]], k: int) -> List[int]:
+        """Registry positions worth offering the LLM for these headers.
+
+        For each header: its `k` most similar parameters, plus the `k` most similar among
+        the parameters whose unit matches the header's unit hint.
+        """
+        n = len(self.names)
+        if not headers:
+            return []
+        if n <= k:
+            return list(range(n))
+        scores = self._similarity(headers)
+        keep = set(np.argpartition(-scores, k - 1, axis=1)[:, :k].ravel().tolist())
+        for row, unit in zip(scores, unit_hints):
+            same_unit = self._by_unit.get(normalize_text(unit)) if unit else None
+            if same_unit:
+                positions = np.asarray(same_unit)
+                keep.update(positions[np.argsort(-row[positions], kind="stable")[:k]].tolist())
+        return sorted(keep)
+
+    def _score(self, header: str, candidates: List[int]) -> Tuple[Optional[str], float]:
+        best_name: Optional[str] = None
+        best_score = 0.0
+        matcher = SequenceMatcher(None, header, "")
+        for doc_id in candidates:
+            # Candidates are visited in registry order and must beat the best strictly,
+            # which keeps the full scan's tie-breaking; the cheap upper bounds skip most ratios.
+            matcher.set_seq2(self.blobs[doc_id])
+            if matcher.real_quick_ratio() <= best_score or matcher.quick_ratio() <= best_score:
+                continue
+            score = matcher.ratio()
+            if score > best_score:
+                best_score = score
+                best_name = self.names[doc_id]
+        return best_name, best_score
+
+    def best_matches(self, headers: List[str]) -> List[Tuple[Optional[str], float]]:
+        """Return (param_name, difflib ratio) of the best-scoring parameter for each normalized header."""
+        return [self._score(h, c) for h, c in zip(headers, self.candidates_many(headers))]
+
+    def best_match(self, header: str) -> Tuple[Optional[str], float]:
+        return self.best_matches([header])[0]
+
@@ -1,125 +1,965 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional, Tuple
-import json
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from itertools import chain, islice, repeat
+from typing import AbstractSet, Any, Callable, Dict, Iterator, List, Optional, Tuple
 import os
 
-from app.models.schemas import ColumnInput, ColumnMapping, ParsedCell, ParseResponse, UnmappedColumn
-from .excel_reader import read_first_sheet
-from .header_detector import detect_header_row
+from app.models.schemas import (
+    BatchFileResult,
+    BatchParseResponse,
+    CellException,
+    ColumnarColumn,
+    ColumnarParseResponse,
+    ColumnInput,
+    ColumnMapping,
+    OutputFormat,
+    ParsedCell,
+    ParseResponse,
+    SheetResponse,
+    UnmappedColumn,
+    WorkbookParseResponse,
+)
+from .excel_reader import WorkbookSource, iter_sheet_rows, list_sheet_names, source_size
+from .executor import ParseExecutor, get_executor
+from .header_detector import DEFAULT_STOP_RATIO, detect_header_row
 from .utils import normalize_text, extract_unit_hint
-from .asset_matcher import build_asset_aliases, extract_asset_from_header
-from .llm_mapper import map_columns_with_gemini
-from .value_parser import parse_value
+from .asset_matcher import AssetMatcher
+from .registry import RegistrySnapshot, get_registry
+from .llm_mapper import MAPPING_FAILED_WARNING, NO_API_KEY_WARNING, map_columns_with_gemini, map_columns_with_gemini_async
+from .cells import CellTable, cell_confidence, compact_response
+from .incremental import LogState, RowChecksums, get_incremental_store, rows_digest
+from .metrics import StageTimings
+from .templates import SheetTemplate, TemplateFingerprint, get_template_store, template_fingerprint
+from .value_parser import ValueMemo, parse_values
 
 
-def _load_registry(path: str) -> List[Dict]:
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+HEADER_SCAN_ROWS = 30
+HEADER_STOP_RATIO = float(os.getenv("HEADER_STOP_RATIO", str(DEFAULT_STOP_RATIO)))
+DATA_BLOCK_ROWS = 512
 
 
-def parse_excel(file_bytes: bytes) -> ParseResponse:
-    try:
-        sheet_name, rows = read_first_sheet(file_bytes)
-        if not rows:
-            return ParseResponse(status="error", warnings=["Workbook appears to be empty."])
-
-        assets = _load_registry(os.path.join(os.path.dirname(__file__), "..", "registries", "assets.json"))
-        params = _load_registry(os.path.join(os.path.dirname(__file__), "..", "registries", "parameters.json"))
-
-        alias_map = build_asset_aliases(assets)
-
-        header_idx, headers, warnings = detect_header_row(rows)
-        header_row_excel = header_idx + 1
-
-        columns: List[ColumnInput] = []
-        for col_idx, header in enumerate(headers):
-            header_str = "" if header is None else str(header)
-            norm = normalize_text(header_str)
-            unit_hint = extract_unit_hint(norm)
-            asset_hint, _ = extract_asset_from_header(header_str, alias_map)
-            columns.append(ColumnInput(
-                column_index=col_idx,
-                original_header=header_str,
-                normalized_header=norm,
-                unit_hint=unit_hint,
-                asset_hint=asset_hint
+def _is_blank_row(row: List[Any]) -> bool:
+    return all(v is None or (isinstance(v, str) and v.strip() == "") for v in row)
+
+
+def _build_columns(headers: List[str], matcher: AssetMatcher) -> List[ColumnInput]:
+    columns: List[ColumnInput] = []
+    for col_idx, header in enumerate(headers):
+        header_str = "" if header is None else str(header)
+        norm = normalize_text(header_str)
+        unit_hint = extract_unit_hint(norm)
+        asset_hint = matcher.match_tokens(norm.split())
+        columns.append(ColumnInput(
+            column_index=col_idx,
+            original_header=header_str,
+            normalized_header=norm,
+            unit_hint=unit_hint,
+            asset_hint=asset_hint
+        ))
+    return columns
+
+
+def _resolve_mappings(
+    mappings: List[ColumnMapping],
+    columns: List[ColumnInput],
+    param_set: AbstractSet[str],
+    asset_set: AbstractSet[str],
+    warnings: List[str],
+) -> Dict[int, ColumnMapping]:
+
+    mapping_by_col: Dict[int, ColumnMapping] = {}
+    for m in mappings:
+        if m.param_name is not None and m.param_name not in param_set:
+            warnings.append(f"Column {m.column_index}: invalid param_name '{m.param_name}' not in registry; treating as unmapped.")
+            m.param_name = None
+            m.confidence = "low"
+        if m.asset_name is not None and m.asset_name not in asset_set:
+            cleaned = m.asset_name.replace(" ", "")
+            if cleaned in asset_set:
+                m.asset_name = cleaned
+            else:
+                warnings.append(f"Column {m.column_index}: invalid asset_name '{m.asset_name}' not in registry; set to null.")
+                m.asset_name = None
+        if m.asset_name is None:
+            hint = next((c.asset_hint for c in columns if c.column_index == m.column_index), None)
+            if hint in asset_set:
+                m.asset_name = hint
+
+        mapping_by_col[m.column_index] = m
+    return mapping_by_col
+
+
+def _unmapped_columns(columns: List[ColumnInput], mapping_by_col: Dict[int, ColumnMapping]) -> List[UnmappedColumn]:
+    unmapped: List[UnmappedColumn] = []
+    for c in columns:
+        m = mapping_by_col.get(c.column_index)
+        if not m or not m.param_name:
+            unmapped.append(UnmappedColumn(
+                col=c.column_index,
+                header=c.original_header,
+                reason=(m.reason if m else "No mapping returned")
             ))
+    return unmapped
 
-        mappings, llm_warnings = map_columns_with_gemini(columns, params, assets)
-        warnings.extend(llm_warnings)
-
-        param_set = {p["name"] for p in params}
-        asset_set = {a["name"] for a in assets}
-
-        mapping_by_col: Dict[int, ColumnMapping] = {}
-        for m in mappings:
-            if m.param_name is not None and m.param_name not in param_set:
-                warnings.append(f"Column {m.column_index}: invalid param_name '{m.param_name}' not in registry; treating as unmapped.")
-                m.param_name = None
-                m.confidence = "low"
-            if m.asset_name is not None and m.asset_name not in asset_set:
-                cleaned = m.asset_name.replace(" ", "")
-                if cleaned in asset_set:
-                    m.asset_name = cleaned
-                else:
-                    warnings.append(f"Column {m.column_index}: invalid asset_name '{m.asset_name}' not in registry; set to null.")
-                    m.asset_name = None
-            if m.asset_name is None:
-                hint = next((c.asset_hint for c in columns if c.column_index == m.column_index), None)
-                if hint in asset_set:
-                    m.asset_name = hint
-
-            mapping_by_col[m.column_index] = m
-
-        unmapped: List[UnmappedColumn] = []
-        for c in columns:
-            m = mapping_by_col.get(c.column_index)
-            if not m or not m.param_name:
-                unmapped.append(UnmappedColumn(
-                    col=c.column_index,
-                    header=c.original_header,
-                    reason=(m.reason if m else "No mapping returned")
-                ))
-
-        parsed_cells: List[ParsedCell] = []
-        for r_idx in range(header_idx + 1, len(rows)):
-            row = rows[r_idx]
-            if all(v is None or (isinstance(v, str) and v.strip() == "") for v in row):
+
+def _column_values(block: List[Tuple[int, List[Any]]], col: int) -> List[Any]:
+    return [row[col] if col < len(row) else None for _, row in block]
+
+
+def _parse_columns(
+    block: List[Tuple[int, List[Any]]], active: List[ColumnMapping], memo: ValueMemo
+) -> Tuple[List[List[Any]], List[List[Optional[float]]]]:
+    """Parse a block of data rows column by column; return (raw_columns, parsed_columns)."""
+    raw_cols = [_column_values(block, m.column_index) for m in active]
+    return raw_cols, [parse_values(raw, memo) for raw in raw_cols]
+
+
+@dataclass
+class SheetPlan:
+    """Detected header position and column inputs of one sheet (picklable, holds no rows).
+
+    With the template store enabled, `fingerprint` identifies the layout and `template` is
+    the stored template it matched, if any.
+    """
+    sheet_index: int
+    sheet_name: str
+    header_idx: int
+    columns: List[ColumnInput]
+    warnings: List[str] = field(default_factory=list)
+    registry_version: Optional[str] = None
+    fingerprint: Optional[TemplateFingerprint] = None
+    template: Optional[SheetTemplate] = None
+
+
+class ParseStream:
+    """Header, mapping and unmapped-column preamble of a sheet plus a lazy iterator over its data rows.
+
+    Only the header scan window is held in memory; data rows are read, parsed and
+    handed out one at a time by `iter_rows`. `meta` is final once the iterator is exhausted.
+    `progress`, when set, is called with `rows_seen` after each block is read.
+    `skipped_rows` rows below the header were already read past (and are not parsed):
+    `buffered` then ends at the header and `remaining` continues after them.
+    """
+
+    progress: Optional[Callable[[int], None]] = None
+    template_id: Optional[str] = None
+    _learn: Optional[Callable[["ParseStream"], str]] = None
+
+    def __init__(
+        self,
+        sheet_name: str,
+        header_idx: int,
+        columns: List[ColumnInput],
+        mapping_by_col: Dict[int, ColumnMapping],
+        warnings: List[str],
+        buffered: List[List[Any]],
+        remaining: Iterator[List[Any]],
+        mapping_cache_stats: Optional[Dict[str, int]] = None,
+        timings: Optional[StageTimings] = None,
+        skipped_rows: int = 0,
+    ):
+        self.sheet_name = sheet_name
+        self.header_row = header_idx + 1
+        self.columns = columns
+        self.mappings = mapping_by_col
+        self.unmapped_columns = _unmapped_columns(columns, mapping_by_col)
+        self.warnings = warnings
+        self.rows_seen = len(buffered) + skipped_rows
+        self._header_idx = header_idx
+        self._skipped_rows = skipped_rows
+        self._buffered = buffered
+        self._remaining = remaining
+        self.mapping_cache_stats = mapping_cache_stats or {"hits": 0, "misses": 0}
+        self.value_memo = ValueMemo()
+        self.timings = timings or StageTimings()
+
+    @property
+    def meta(self) -> Dict[str, Any]:
+        meta = {
+            "sheet": self.sheet_name,
+            "rows": self.rows_seen,
+            "cols": len(self.columns),
+            "mapping_cache": dict(self.mapping_cache_stats),
+            "value_cache": self.value_memo.stats(),
+        }
+        if self.template_id is not None:
+            meta["template_id"] = self.template_id
+        if self.timings.report:
+            meta["timings"] = self.timings.as_dict()
+        return meta
+
+    def finish(self) -> None:
+        """Publish the stage timings and, after a successful parse, record the sheet's template."""
+        self.timings.publish()
+        learn, self._learn = self._learn, None
+        if learn is not None:
+            self.template_id = learn(self)
+
+    def active_mappings(self) -> List[ColumnMapping]:
+        """Mappings of the columns that produce cells, in column order."""
+        return [self.mappings[c.column_index] for c in self.columns
+                if c.column_index in self.mappings and self.mappings[c.column_index].param_name]
+
+    def iter_data_rows(self) -> Iterator[Tuple[int, List[Any]]]:
+        """Yield (excel_row, raw_row) for each non-blank row below the header."""
+        buffered, self._buffered = self._buffered[self._header_idx + 1:], []
+
+        def counted(it: Iterator[List[Any]]) -> Iterator[List[Any]]:
+            for row in it:
+                self.rows_seen += 1
+                yield row
+
+        r_idx = self._header_idx + self._skipped_rows
+        for row in chain(buffered, counted(self._remaining)):
+            r_idx += 1
+            if _is_blank_row(row):
                 continue
+            yield r_idx + 1, row
+
+    def iter_blocks(self, block_rows: int = DATA_BLOCK_ROWS) -> Iterator[List[Tuple[int, List[Any]]]]:
+        """Group `iter_data_rows` into blocks of up to `block_rows` rows for column-wise parsing."""
+        rows = self.iter_data_rows()
+        while True:
+            with self.timings.stage("read_rows"):
+                block = list(islice(rows, block_rows))
+            if not block:
+                return
+            self.timings.count("read_rows", rows=len(block))
+            if self.progress is not None:
+                self.progress(self.rows_seen)
+            yield block
+
+    def iter_tables(self) -> Iterator[CellTable]:
+        """Yield the parsed cells of each block of data rows as a compact CellTable."""
+        active = self.active_mappings()
+        timings = self.timings
+        for block in self.iter_blocks():
+            with timings.stage("parse_values", rows=len(block), cells=len(block) * len(active)):
+                raw_cols, parsed_cols = _parse_columns(block, active, self.value_memo)
+            with timings.stage("build_cells", rows=len(block), cells=len(block) * len(active)):
+                table = CellTable(active)
+                table.append([excel_row for excel_row, _ in block], raw_cols, parsed_cols)
+            yield table
+
+    def iter_rows(self) -> Iterator[List[ParsedCell]]:
+        """Yield the parsed cells of each non-blank data row, in sheet order."""
+        for table in self.iter_tables():
+            yield from table.iter_rows()
+
+
+def _pad(rows: List[List[Any]], width: int) -> None:
+    for r in rows:
+        if len(r) < width:
+            r.extend([None] * (width - len(r)))
+
+
+def _template_plan(template: SheetTemplate, header: List[Any], matcher: AssetMatcher) -> Tuple[List[ColumnInput], List[str]]:
+    """Column inputs of a sheet matching `template`: its stored inputs under this sheet's header text."""
+    headers = ["" if v is None else str(v).strip() for v in header]
+    columns = [c.model_copy(update={"original_header": h}) for c, h in zip(template.columns, headers)]
+    offset = len(columns)
+    for c in _build_columns(headers[offset:], matcher):
+        columns.append(c.model_copy(update={"column_index": c.column_index + offset}))
+    return columns, list(template.warnings)
+
+
+def _plan_rows(
+    file_bytes: WorkbookSource,
+    sheet_index: int,
+    matcher: AssetMatcher,
+    max_scan: int,
+    timings: Optional[StageTimings] = None,
+    registry_version: Optional[str] = None,
+) -> Optional[Tuple[SheetPlan, List[List[Any]], Iterator[List[Any]]]]:
+    """Detect the header of one sheet from its streamed rows.
+
+    Returns (plan, rows read so far, remaining rows), or None if the sheet has no rows.
+    Header detection stops reading as soon as it settles, so usually only the rows down to
+    just below the header are buffered; they are padded to one width. Given a
+    `registry_version`, a sheet matching a stored template skips detection and asset
+    extraction and is read only down to its header.
+    """
+    timings = timings or StageTimings()
+    with timings.stage("open_sheet"):
+        sheet_name, row_iter = iter_sheet_rows(file_bytes, sheet_index)
+        first = next(row_iter, None)
+    if first is None:
+        return None
+
+    buffered: List[List[Any]] = [first]
+
+    def rows() -> Iterator[List[Any]]:
+        """The sheet's rows from the top: buffered ones first, further ones buffered as they are read."""
+        i = 0
+        while True:
+            if i == len(buffered):
+                row = next(row_iter, None)
+                if row is None:
+                    return
+                buffered.append(row)
+            yield buffered[i]
+            i += 1
+
+    store = get_template_store() if registry_version is not None else None
+    template = None
+    if store is not None:
+        with timings.stage("template"):
+            template = store.match(sheet_name, rows(), registry_version)
+
+    if template is not None:
+        header_idx = template.fingerprint.header_idx
+        width = max(len(r) for r in buffered)
+        _pad(buffered, width)
+        columns, warnings = _template_plan(template, buffered[header_idx], matcher)
+    else:
+        with timings.stage("detect_header"):
+            header_idx, headers, warnings = detect_header_row(rows(), max_scan=max_scan, stop_ratio=HEADER_STOP_RATIO)
+        timings.count("detect_header", rows=len(buffered))
+        width = max(len(r) for r in buffered)
+        _pad(buffered, width)
+        headers.extend([""] * (width - len(headers)))
+
+        with timings.stage("assets"):
+            columns = _build_columns(headers, matcher)
+
+    fingerprint = None
+    if store is not None:
+        fingerprint = template_fingerprint(sheet_name, buffered[:header_idx], buffered[header_idx])
+    plan = SheetPlan(sheet_index, sheet_name, header_idx, columns, warnings, registry_version, fingerprint, template)
+    return plan, buffered, row_iter
+
+
+def plan_sheet(
+    file_bytes: WorkbookSource,
+    sheet_index: int,
+    matcher: AssetMatcher,
+    max_scan: int = HEADER_SCAN_ROWS,
+    registry_version: Optional[str] = None,
+) -> Optional[SheetPlan]:
+    """Detect the header and build column inputs for one sheet; None if the sheet is empty.
+
+    Stored templates are consulted only when `registry_version` is given.
+    """
+    planned = _plan_rows(file_bytes, sheet_index, matcher, max_scan, registry_version=registry_version)
+    return planned[0] if planned is not None else None
+
+
+def _reuses_template(plan: SheetPlan) -> bool:
+    """Whether the plan's template mappings stand in for a mapping call.
+
+    Mappings a template learned from the fallback mapper are redone once an API key is set.
+    """
+    template = plan.template
+    return template is not None and (template.corrected or not template.fallback or not os.getenv("GEMINI_API_KEY"))
+
+
+def _template_mappings(plan: SheetPlan) -> Optional[Tuple[List[ColumnMapping], List[str]]]:
+    """(mappings, warnings) stored with the plan's template, or None if the columns must be mapped."""
+    if not _reuses_template(plan):
+        return None
+    width = len(plan.columns)
+    return [m.model_copy() for m in plan.template.mappings if m.column_index < width], list(plan.template.mapping_warnings)
+
+
+def _template_learner(plan: SheetPlan, mapping_warnings: List[str]) -> Optional[Callable[[ParseStream], str]]:
+    """Callback storing the plan's layout and the stream's mappings once the sheet parsed successfully."""
+    if plan.fingerprint is None or any(w.startswith(MAPPING_FAILED_WARNING) for w in mapping_warnings):
+        return None
+
+    def learn(stream: ParseStream) -> str:
+        return get_template_store().learn(
+            plan.sheet_name, plan.fingerprint, plan.columns, list(stream.mappings.values()), plan.registry_version,
+            plan.warnings, mapping_warnings, fallback=any(w.startswith(NO_API_KEY_WARNING) for w in mapping_warnings),
+        )
+    return learn
+
+
+def _start_stream(
+    plan: SheetPlan,
+    mappings: List[ColumnMapping],
+    llm_warnings: List[str],
+    param_set: AbstractSet[str],
+    asset_set: AbstractSet[str],
+    buffered: List[List[Any]],
+    remaining: Iterator[List[Any]],
+    mapping_cache_stats: Optional[Dict[str, int]] = None,
+    timings: Optional[StageTimings] = None,
+) -> ParseStream:
+    warnings = list(plan.warnings) + list(llm_warnings)
+    mapping_by_col = _resolve_mappings(mappings, plan.columns, param_set, asset_set, warnings)
+    stream = ParseStream(
+        plan.sheet_name, plan.header_idx, plan.columns, mapping_by_col, warnings, buffered, remaining,
+        mapping_cache_stats, timings
+    )
+    if _reuses_template(plan):
+        stream.template_id = plan.template.id
+    else:
+        stream._learn = _template_learner(plan, warnings[len(plan.warnings):])
+    return stream
+
+
+def _prepare_stream(
+    file_bytes: WorkbookSource, sheet_index: int, max_scan: int, timings: Optional[StageTimings] = None
+) -> Optional[Tuple[SheetPlan, List[List[Any]], Iterator[List[Any]], RegistrySnapshot]]:
+    registry = get_registry()
+    planned = _plan_rows(file_bytes, sheet_index, registry.asset_matcher, max_scan, timings, registry.version)
+    if planned is None:
+        return None
+    plan, buffered, row_iter = planned
+    return plan, buffered, row_iter, registry
+
+
+def stream_parse_excel(
+    file_bytes: WorkbookSource,
+    sheet_index: int = 0,
+    max_scan: int = HEADER_SCAN_ROWS,
+    timings: Optional[StageTimings] = None,
+) -> Optional[ParseStream]:
+    """Detect the header and map columns of one sheet; return None for an empty sheet.
+
+    Stage timings are collected into `timings` (a fresh, unreported StageTimings by default).
+    """
+    timings = timings or StageTimings()
+    prepared = _prepare_stream(file_bytes, sheet_index, max_scan, timings)
+    if prepared is None:
+        return None
+    plan, buffered, row_iter, registry = prepared
+
+    cache_stats = {"hits": 0, "misses": 0}
+    reused = _template_mappings(plan)
+    if reused is not None:
+        mappings, llm_warnings = reused
+    else:
+        with timings.stage("mapping"):
+            mappings, llm_warnings = map_columns_with_gemini(
+                plan.columns, registry.parameters, registry.assets, registry=registry, stats=cache_stats, timings=timings
+            )
+    return _start_stream(
+        plan, mappings, llm_warnings, registry.param_names, registry.asset_names, buffered, row_iter, cache_stats, timings
+    )
+
+
+async def stream_parse_excel_async(
+    file_bytes: WorkbookSource,
+    sheet_index: int = 0,
+    max_scan: int = HEADER_SCAN_ROWS,
+    executor: Optional[ParseExecutor] = None,
+    timings: Optional[StageTimings] = None,
+) -> Optional[ParseStream]:
+    """`stream_parse_excel` for the event loop: sheet work runs on the executor, the LLM call is awaited."""
+    executor = executor or get_executor()
+    timings = timings or StageTimings()
+    prepared = await executor.run(_prepare_stream, file_bytes, sheet_index, max_scan, timings)
+    if prepared is None:
+        return None
+    plan, buffered, row_iter, registry = prepared
+
+    cache_stats = {"hits": 0, "misses": 0}
+    reused = _template_mappings(plan)
+    if reused is not None:
+        mappings, llm_warnings = reused
+    else:
+        with timings.stage("mapping"):
+            mappings, llm_warnings = await map_columns_with_gemini_async(
+                plan.columns, registry.parameters, registry.assets, registry=registry, stats=cache_stats, timings=timings
+            )
+    return _start_stream(
+        plan, mappings, llm_warnings, registry.param_names, registry.asset_names, buffered, row_iter, cache_stats, timings
+    )
+
+
+def _collect(stream: ParseStream, compact: bool = False) -> ParseResponse:
+    active = stream.active_mappings()
+    table = CellTable(active)
+    timings = stream.timings
+    for block in stream.iter_blocks():
+        with timings.stage("parse_values", rows=len(block), cells=len(block) * len(active)):
+            raw_cols, parsed_cols = _parse_columns(block, active, stream.value_memo)
+        with timings.stage("build_cells", rows=len(block), cells=len(block) * len(active)):
+            table.append([excel_row for excel_row, _ in block], raw_cols, parsed_cols)
+
+    fields = dict(
+        status="success", header_row=stream.header_row, unmapped_columns=stream.unmapped_columns, warnings=stream.warnings
+    )
+    with timings.stage("build_cells"):
+        response = compact_response(table, **fields) if compact else ParseResponse(parsed_data=list(table), **fields)
+    stream.finish()
+    response.meta = stream.meta
+    return response
+
+
+def _collect_columnar(stream: ParseStream) -> ColumnarParseResponse:
+    active = stream.active_mappings()
+    headers = {c.column_index: c.original_header for c in stream.columns}
+    rows: List[List[int]] = [[] for _ in active]
+    raw_values: List[List[Any]] = [[] for _ in active]
+    parsed_values: List[List[Optional[float]]] = [[] for _ in active]
+    exceptions: List[CellException] = []
+
+    timings = stream.timings
+    for block in stream.iter_blocks():
+        excel_rows = [excel_row for excel_row, _ in block]
+        with timings.stage("parse_values", rows=len(block), cells=len(block) * len(active)):
+            raw_cols, parsed_cols = _parse_columns(block, active, stream.value_memo)
+        with timings.stage("build_columns", rows=len(block), cells=len(block) * len(active)):
+            block_exceptions: List[CellException] = []
+            for i, (m, raw, parsed) in enumerate(zip(active, raw_cols, parsed_cols)):
+                rows[i].extend(excel_rows)
+                raw_values[i].extend(raw)
+                parsed_values[i].extend(parsed)
+                for excel_row, raw_val, parsed_val in zip(excel_rows, raw, parsed):
+                    conf = cell_confidence(m.confidence, raw_val, parsed_val)
+                    if conf != m.confidence:
+                        block_exceptions.append(CellException(row=excel_row, col=m.column_index, raw_value=raw_val, confidence=conf))
+            block_exceptions.sort(key=lambda e: (e.row, e.col))
+            exceptions.extend(block_exceptions)
+    stream.finish()
+
+    columns = [
+        ColumnarColumn(
+            col=m.column_index,
+            header=headers.get(m.column_index, ""),
+            param_name=m.param_name,
+            asset_name=m.asset_name,
+            confidence=m.confidence,
+            rows=rows[i],
+            raw_values=raw_values[i],
+            parsed_values=parsed_values[i],
+        )
+        for i, m in enumerate(active)
+    ]
+    return ColumnarParseResponse(
+        status="success",
+        header_row=stream.header_row,
+        columns=columns,
+        exceptions=exceptions,
+        unmapped_columns=stream.unmapped_columns,
+        warnings=stream.warnings,
+        meta=stream.meta
+    )
+
+
+def _collect_compact(stream: ParseStream) -> ParseResponse:
+    return _collect(stream, compact=True)
+
+
+_COLLECTORS = {"cells": _collect, "columnar": _collect_columnar}
 
-            for c in columns:
-                m = mapping_by_col.get(c.column_index)
-                if not m or not m.param_name:
+
+def _collector(output: OutputFormat, compact: bool = False) -> Callable[[ParseStream], SheetResponse]:
+    """The collector for `output`; with `compact`, large cell results keep their cells only in a
+    CellTable (`parsed_data` stays empty, see `cells.compact_response`) for `dump_json` to encode."""
+    return _collect_compact if compact and output == "cells" else _COLLECTORS[output]
+
+
+def _error_response(output: OutputFormat, warnings: List[str], meta: Optional[Dict[str, Any]] = None) -> SheetResponse:
+    model = ColumnarParseResponse if output == "columnar" else ParseResponse
+    return model(status="error", warnings=warnings, meta=meta or {})
+
+
+def parse_excel(
+    file_bytes: WorkbookSource,
+    output: OutputFormat = "cells",
+    report_timings: bool = False,
+    progress: Optional[Callable[[int], None]] = None,
+    compact: bool = False,
+) -> SheetResponse:
+    """Parse the first sheet into one ParsedCell per mapped cell, or per-column arrays with output="columnar".
+
+    With `report_timings`, per-stage timings are added as meta["timings"]. `progress` is
+    called with the number of sheet rows read so far; an exception it raises aborts the parse.
+    `compact=True` is for callers that only serialize the result with `cells.dump_json`
+    (see `_collector`); otherwise `parsed_data` always holds every cell.
+    """
+    try:
+        stream = stream_parse_excel(file_bytes, timings=StageTimings(report=report_timings))
+        if stream is None:
+            return _error_response(output, ["Workbook appears to be empty."])
+        stream.progress = progress
+        return _collector(output, compact)(stream)
+
+    except Exception as e:
+        return _error_response(output, [str(e)])
+
+
+def _resume_stream(
+    file_bytes: WorkbookSource, state: LogState, timings: StageTimings
+) -> Tuple[Optional[ParseStream], Optional[RowChecksums], Optional[str]]:
+    """Stream the rows appended since `state`, after checking the earlier rows against its checksums.
+
+    Returns (stream, checksums, None), or (None, None, reason) when the sheet changed otherwise.
+    """
+    with timings.stage("open_sheet"):
+        sheet_name, row_iter = iter_sheet_rows(file_bytes, 0)
+        head = list(islice(row_iter, state.header_idx + 1))
+    if sheet_name != state.sheet_name or len(head) <= state.header_idx or rows_digest(head) != state.prefix:
+        return None, None, "The rows down to the header changed since the last parse"
+    with timings.stage("verify_rows", rows=state.rows):
+        checks, changed = state.verify(row_iter)
+    if checks is None:
+        return None, None, changed
+
+    mapping_by_col = {m.column_index: m for m in state.mappings}
+    stream = ParseStream(
+        sheet_name, state.header_idx, state.columns, mapping_by_col, list(state.warnings), head,
+        checks.wrap(row_iter), None, timings, skipped_rows=state.rows
+    )
+    return stream, checks, None
+
+
+def parse_excel_incremental(
+    file_bytes: WorkbookSource,
+    key: str,
+    output: OutputFormat = "cells",
+    report_timings: bool = False,
+    compact: bool = False,
+) -> SheetResponse:
+    """Parse only the rows of the first sheet appended since the last parse under `key`.
+
+    The header, column mappings, row count and per-block row checksums of each successful
+    parse are kept per key. The next upload under that key has its earlier rows read and
+    checked against the checksums but not parsed, so the response holds the new rows only.
+    If earlier rows changed (or the registry did), the whole sheet is parsed again and that
+    parse becomes the new baseline. meta["incremental"] reports what was done.
+    """
+    store = get_incremental_store()
+    timings = StageTimings(report=report_timings)
+    try:
+        registry = get_registry()
+        state = store.get(key)
+        stream = checks = changed = None
+        if state is not None and state.registry_version == registry.version:
+            stream, checks, changed = _resume_stream(file_bytes, state, timings)
+        skipped_rows = state.rows if stream is not None else None
+
+        if stream is not None:
+            header_rows = stream._buffered[:]
+        else:
+            stream = stream_parse_excel(file_bytes, timings=timings)
+            if stream is None:
+                return _error_response(output, ["Workbook appears to be empty."])
+            checks = RowChecksums()
+            header_rows = stream._buffered[:stream._header_idx + 1]
+            for row in stream._buffered[stream._header_idx + 1:]:
+                checks.add(row)
+            stream._remaining = checks.wrap(stream._remaining)
+        baseline_warnings = list(stream.warnings)
+
+        result = _collector(output, compact)(stream)
+        if not any(w.startswith(MAPPING_FAILED_WARNING) for w in baseline_warnings):
+            store.put(LogState(
+                key=key, registry_version=registry.version, sheet_name=stream.sheet_name,
+                header_idx=stream._header_idx, prefix=rows_digest(header_rows), columns=stream.columns,
+                mappings=list(stream.mappings.values()), warnings=baseline_warnings,
+                rows=checks.rows, block_rows=checks.block_rows, blocks=checks.blocks, tail=checks.tail,
+            ))
+        if changed is not None:
+            result.warnings.append(f"{changed}; parsed the whole sheet again.")
+        result.meta["incremental"] = {
+            "key": key,
+            "resumed": skipped_rows is not None,
+            "skipped_rows": skipped_rows or 0,
+            "since_row": stream.header_row + (skipped_rows or 0),
+        }
+        return result
+
+    except Exception as e:
+        return _error_response(output, [str(e)])
+
+
+async def _parse_excel_in_processes(
+    file_bytes: WorkbookSource, executor: ParseExecutor, output: OutputFormat, timings: StageTimings, compact: bool
+) -> SheetResponse:
+    registry = get_registry()
+    with timings.stage("plan_sheet"):
+        plan = await executor.run(plan_sheet, file_bytes, 0, registry.asset_matcher, HEADER_SCAN_ROWS, registry.version, processes=True)
+    if plan is None:
+        return _error_response(output, ["Workbook appears to be empty."])
+
+    cache_stats = {"hits": 0, "misses": 0}
+    reused = _template_mappings(plan)
+    if reused is not None:
+        mappings, llm_warnings = reused
+    else:
+        with timings.stage("mapping"):
+            mappings, llm_warnings = await map_columns_with_gemini_async(
+                plan.columns, registry.parameters, registry.assets, registry=registry, stats=cache_stats, timings=timings
+            )
+    # The worker parses with a copy of `timings` and reports it in the response meta.
+    return await executor.run(
+        _parse_planned_sheet, file_bytes, plan, mappings, llm_warnings,
+        registry.param_names, registry.asset_names, cache_stats, output, timings, compact, processes=True
+    )
+
+
+async def parse_excel_async(
+    file_bytes: WorkbookSource,
+    executor: Optional[ParseExecutor] = None,
+    output: OutputFormat = "cells",
+    report_timings: bool = False,
+    compact: bool = False,
+) -> SheetResponse:
+    """Parse the first sheet without blocking the event loop.
+
+    Decoding and value parsing run on the executor's threads, or in its worker processes
+    when the executor routes uploads of this size there; the LLM mapping call is awaited.
+    """
+    executor = executor or get_executor()
+    timings = StageTimings(report=report_timings)
+    try:
+        if executor.use_processes(source_size(file_bytes)):
+            return await _parse_excel_in_processes(file_bytes, executor, output, timings, compact)
+
+        stream = await stream_parse_excel_async(file_bytes, executor=executor, timings=timings)
+        if stream is None:
+            return _error_response(output, ["Workbook appears to be empty."])
+        return await executor.run(_collector(output, compact), stream)
+
+    except Exception as e:
+        return _error_response(output, [str(e)])
+
+
+def _plan_sheet_safe(
+    file_bytes: WorkbookSource, sheet_index: int, matcher: AssetMatcher, registry_version: Optional[str] = None
+) -> Tuple[Optional[SheetPlan], Optional[str]]:
+    try:
+        return plan_sheet(file_bytes, sheet_index, matcher, registry_version=registry_version), None
+    except Exception as e:
+        return None, str(e)
+
+
+def _parse_planned_sheet(
+    file_bytes: WorkbookSource,
+    plan: SheetPlan,
+    mappings: List[ColumnMapping],
+    llm_warnings: List[str],
+    param_set: AbstractSet[str],
+    asset_set: AbstractSet[str],
+    mapping_cache_stats: Optional[Dict[str, int]] = None,
+    output: OutputFormat = "cells",
+    timings: Optional[StageTimings] = None,
+    compact: bool = False,
+) -> SheetResponse:
+    timings = timings or StageTimings()
+    try:
+        with timings.stage("open_sheet"):
+            _, row_iter = iter_sheet_rows(file_bytes, plan.sheet_index)
+            skipped = list(islice(row_iter, plan.header_idx + 1))
+        mappings = [m.model_copy() for m in mappings]
+        stream = _start_stream(
+            plan, mappings, llm_warnings, param_set, asset_set, skipped, row_iter, mapping_cache_stats, timings
+        )
+        return _collector(output, compact)(stream)
+    except Exception as e:
+        return _error_response(output, [str(e)], {"sheet": plan.sheet_name})
+
+
+def _header_signature(plan: SheetPlan) -> Tuple[str, ...]:
+    return tuple(c.original_header for c in plan.columns)
+
+
+def parse_workbook(
+    file_bytes: WorkbookSource,
+    max_workers: Optional[int] = None,
+    use_processes: bool = False,
+    pool: Optional[Executor] = None,
+    output: OutputFormat = "cells",
+    progress: Optional[Callable[[int], None]] = None,
+    compact: bool = False,
+) -> WorkbookParseResponse:
+    """Parse every sheet of a workbook in parallel and return one ParseResponse per sheet.
+
+    Header detection and value parsing run per sheet on a thread (or process) pool, or on
+    `pool` when one is given; sheets with identical header rows share a single column-mapping call.
+    `progress` is called with the total rows of the sheets finished so far.
+    """
+    try:
+        sheet_names = list_sheet_names(file_bytes)
+        if not sheet_names:
+            return WorkbookParseResponse(status="error", warnings=["Workbook appears to be empty."])
+
+        registry = get_registry()
+        matcher = registry.asset_matcher
+
+        workers = max_workers or min(len(sheet_names), os.cpu_count() or 1)
+        pool_cls = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        with (nullcontext(pool) if pool is not None else pool_cls(max_workers=workers)) as pool:
+            planned = list(pool.map(
+                _plan_sheet_safe, repeat(file_bytes), range(len(sheet_names)), repeat(matcher), repeat(registry.version)
+            ))
+
+            groups: Dict[Tuple[str, ...], List[SheetPlan]] = {}
+            mapping_by_sheet: Dict[int, Tuple[List[ColumnMapping], List[str], Dict[str, int]]] = {}
+            for plan, _ in planned:
+                if plan is None:
                     continue
+                reused = _template_mappings(plan)
+                if reused is not None:
+                    mapping_by_sheet[plan.sheet_index] = (*reused, {"hits": 0, "misses": 0})
+                else:
+                    groups.setdefault(_header_signature(plan), []).append(plan)
+
+            def map_group(plans: List[SheetPlan]) -> Tuple[List[ColumnMapping], List[str], Dict[str, int]]:
+                stats = {"hits": 0, "misses": 0}
+                mappings, llm_warnings = map_columns_with_gemini(
+                    plans[0].columns, registry.parameters, registry.assets, registry=registry, stats=stats
+                )
+                return mappings, llm_warnings, stats
+
+            group_plans = list(groups.values())
+            with ThreadPoolExecutor(max_workers=max(1, min(len(groups), workers))) as mapper_pool:
+                mapped = list(mapper_pool.map(map_group, group_plans))
+            for plans, result in zip(group_plans, mapped):
+                for plan in plans:
+                    mapping_by_sheet[plan.sheet_index] = result
 
-                raw_val = row[c.column_index] if c.column_index < len(row) else None
-                parsed_val = parse_value(raw_val)
-
-                conf = m.confidence
-                if parsed_val is None and raw_val not in (None, "", " ", "N/A", "NA"):
-                    if conf == "high":
-                        conf = "medium"
-
-                parsed_cells.append(ParsedCell(
-                    row=r_idx + 1,  
-                    col=c.column_index,
-                    param_name=m.param_name,
-                    asset_name=m.asset_name,
-                    raw_value=raw_val,
-                    parsed_value=parsed_val,
-                    confidence=conf
-                ))
-
-        return ParseResponse(
-            status="success",
-            header_row=header_row_excel,
-            parsed_data=parsed_cells,
-            unmapped_columns=unmapped,
-            warnings=warnings,
-            meta={"sheet": sheet_name, "rows": len(rows), "cols": len(headers)}
+            futures = {}
+            for idx, (plan, _) in enumerate(planned):
+                if plan is not None:
+                    mappings, llm_warnings, stats = mapping_by_sheet[idx]
+                    futures[idx] = pool.submit(
+                        _parse_planned_sheet, file_bytes, plan, mappings, llm_warnings,
+                        registry.param_names, registry.asset_names, stats, output, None, compact
+                    )
+
+            sheets: List[SheetResponse] = []
+            rows_done = 0
+            for idx, (plan, error) in enumerate(planned):
+                if idx in futures:
+                    sheets.append(futures[idx].result())
+                    rows_done += sheets[-1].meta.get("rows", 0)
+                    if progress is not None:
+                        progress(rows_done)
+                else:
+                    sheets.append(_error_response(output, [error or "Sheet appears to be empty."], {"sheet": sheet_names[idx]}))
+
+        ok = any(s.status == "success" for s in sheets)
+        return WorkbookParseResponse(
+            status="success" if ok else "error",
+            sheets=sheets,
+            meta={
+                "sheets": len(sheet_names),
+                "mapping_calls": len(groups),
+                "mapping_cache": {
+                    "hits": sum(stats["hits"] for _, _, stats in mapped),
+                    "misses": sum(stats["misses"] for _, _, stats in mapped),
+                },
+            }
         )
 
     except Exception as e:
-        return ParseResponse(status="error", warnings=[str(e)])
+        return WorkbookParseResponse(status="error", warnings=[str(e)])
+
+
+ColumnKey = Tuple[str, Optional[str], Optional[str]]
+
+
+def _column_key(c: ColumnInput) -> ColumnKey:
+    return (c.normalized_header, c.unit_hint, c.asset_hint)
+
+
+def _map_merged_columns(
+    plans: List[SheetPlan], registry: RegistrySnapshot, stats: Dict[str, int]
+) -> Tuple[Dict[ColumnKey, ColumnMapping], List[str], int]:
+    """Map the distinct columns of many sheets with a single mapper call, keyed by `_column_key`.
+
+    Sheets that reuse their template's mappings are left out.
+    """
+    unique: Dict[ColumnKey, ColumnInput] = {}
+    for plan in plans:
+        if _reuses_template(plan):
+            continue
+        for c in plan.columns:
+            key = _column_key(c)
+            if key not in unique:
+                unique[key] = c.model_copy(update={"column_index": len(unique)})
+    if not unique:
+        return {}, [], 0
+
+    mappings, llm_warnings = map_columns_with_gemini(
+        list(unique.values()), registry.parameters, registry.assets, registry=registry, stats=stats
+    )
+    by_index = {m.column_index: m for m in mappings}
+    merged = {key: by_index[c.column_index] for key, c in unique.items() if c.column_index in by_index}
+    return merged, llm_warnings, len(unique)
+
+
+def _plan_mappings(plan: SheetPlan, merged: Dict[ColumnKey, ColumnMapping]) -> List[ColumnMapping]:
+    out: List[ColumnMapping] = []
+    for c in plan.columns:
+        m = merged.get(_column_key(c))
+        if m is not None:
+            out.append(m.model_copy(update={"column_index": c.column_index}))
+    return out
+
+
+def iter_parse_batch(
+    files: List[Tuple[str, WorkbookSource]],
+    max_workers: Optional[int] = None,
+    pool: Optional[Executor] = None,
+    output: OutputFormat = "cells",
+    meta: Optional[Dict[str, Any]] = None,
+    compact: bool = False,
+) -> Iterator[Tuple[int, BatchFileResult]]:
+    """Parse the first sheet of many workbooks, yielding (position, result) as each file finishes.
+
+    Files are planned and parsed on a bounded thread (or the given) pool; the distinct
+    columns of all files go to the column mapper in one call. `meta`, if given, is filled
+    with batch counters once the mapping call has been made.
+    """
+    registry = get_registry()
+    stats = {"hits": 0, "misses": 0}
+    workers = max(1, min(len(files), max_workers or os.cpu_count() or 1))
+    with (nullcontext(pool) if pool is not None else ThreadPoolExecutor(max_workers=workers)) as pool:
+        planned = list(pool.map(
+            _plan_sheet_safe, (b for _, b in files), repeat(0), repeat(registry.asset_matcher), repeat(registry.version)
+        ))
+        plans = [plan for plan, _ in planned if plan is not None]
+        merged, llm_warnings, unique = _map_merged_columns(plans, registry, stats)
+        if meta is not None:
+            meta.update({
+                "files": len(files),
+                "unique_columns": unique,
+                "mapping_calls": 1 if unique else 0,
+                "mapping_cache": stats,
+            })
+
+        futures = {}
+        for idx, ((_, file_bytes), (plan, error)) in enumerate(zip(files, planned)):
+            if plan is None:
+                result = _error_response(output, [error or "Workbook appears to be empty."])
+                yield idx, BatchFileResult(filename=files[idx][0], result=result)
+                continue
+            mappings, warnings = _template_mappings(plan) or (_plan_mappings(plan, merged), llm_warnings)
+            future = pool.submit(
+                _parse_planned_sheet, file_bytes, plan, mappings, warnings,
+                registry.param_names, registry.asset_names, stats, output, None, compact
+            )
+            futures[future] = idx
+
+        for future in as_completed(futures):
+            idx = futures[future]
+            yield idx, BatchFileResult(filename=files[idx][0], result=future.result())
+
+
+def parse_batch(
+    files: List[Tuple[str, WorkbookSource]],
+    max_workers: Optional[int] = None,
+    pool: Optional[Executor] = None,
+    output: OutputFormat = "cells",
+    compact: bool = False,
+) -> BatchParseResponse:
+    """Parse many workbooks with one shared column-mapping call; results keep upload order."""
+    meta: Dict[str, Any] = {}
+    try:
+        results: List[Optional[BatchFileResult]] = [None] * len(files)
+        for idx, result in iter_parse_batch(files, max_workers, pool, output, meta, compact):
+            results[idx] = result
+    except Exception as e:
+        return BatchParseResponse(status="error", warnings=[str(e)], meta=meta)
 
+    ok = any(r.result.status == "success" for r in results)
+    return BatchParseResponse(status="success" if ok else "error", files=results, meta=meta)
@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, List, Optional, Tuple
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from .asset_matcher import AssetMatcher, build_asset_aliases
+from .param_index import ParameterIndex
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REGISTRY_DIR = os.path.join(os.path.dirname(__file__), "..", "registries")
+
+
+def registry_fingerprint(parameters: List[Dict], assets: List[Dict]) -> str:
+    blob = json.dumps({"parameters": parameters, "assets": assets}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+@dataclass(frozen=True)
+class RegistrySnapshot:
+    """Immutable view of the parameter and asset registries with everything derived from them."""
+    parameters: List[Dict]
+    assets: List[Dict]
+    version: str
+    param_names: FrozenSet[str]
+    asset_names: FrozenSet[str]
+    asset_matcher: AssetMatcher = field(repr=False)
+    param_index: ParameterIndex = field(repr=False)
+    loaded_at: float = 0.0
+
+
+def build_snapshot(parameters: List[Dict], assets: List[Dict]) -> RegistrySnapshot:
+    return RegistrySnapshot(
+        parameters=parameters,
+        assets=assets,
+        version=registry_fingerprint(parameters, assets),
+        param_names=frozenset(p["name"] for p in parameters),
+        asset_names=frozenset(a["name"] for a in assets),
+        asset_matcher=AssetMatcher(build_asset_aliases(assets)),
+        param_index=ParameterIndex(parameters),
+        loaded_at=time.time(),
+    )
+
+
+def _load_json(path: str) -> List[Dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class RegistryService:
+    """Loads `parameters.json` / `assets.json` once and hot-swaps a new snapshot when they change.
+
+    `get()` is cheap: it returns the current snapshot and, at most every `check_interval`
+    seconds, compares the files' mtimes and sizes. A changed registry is loaded and
+    precomputed in full before it replaces the old snapshot; a file that fails to load
+    leaves the previous snapshot in place.
+    """
+
+    def __init__(self, directory: str = DEFAULT_REGISTRY_DIR, check_interval: float = 2.0):
+        self.parameters_path = os.path.join(directory, "parameters.json")
+        self.assets_path = os.path.join(directory, "assets.json")
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._snapshot: Optional[RegistrySnapshot] = None
+        self._stamp: Optional[Tuple] = None
+        self._next_check = 0.0
+
+    def _file_stamp(self) -> Tuple:
+        stamp = []
+        for path in (self.parameters_path, self.assets_path):
+            st = os.stat(path)
+            stamp.append((st.st_mtime_ns, st.st_size))
+        return tuple(stamp)
+
+    def reload(self) -> RegistrySnapshot:
+        """Load the registry files now and swap in the new snapshot."""
+        with self._lock:
+            stamp = self._file_stamp()
+            snapshot = build_snapshot(_load_json(self.parameters_path), _load_json(self.assets_path))
+            self._snapshot, self._stamp = snapshot, stamp
+            self._next_check = time.monotonic() + self.check_interval
+            return snapshot
+
+    def get(self) -> RegistrySnapshot:
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() < self._next_check:
+            return snapshot
+        if snapshot is None:
+            return self.reload()
+
+        try:
+            changed = self._file_stamp() != self._stamp
+        except OSError:
+            changed = False
+        if not changed:
+            self._next_check = time.monotonic() + self.check_interval
+            return snapshot
+        try:
+            return self.reload()
+        except Exception as e:
+            logger.warning("Registry reload failed; keeping version %s: %s", snapshot.version[:12], e)
+            self._next_check = time.monotonic() + self.check_interval
+            return snapshot
+
+
+_default_service: Optional[RegistryService] = None
+_default_lock = threading.Lock()
+
+
+def get_registry_service() -> RegistryService:
+    """Process-wide registry service for REGISTRY_DIR, polled every REGISTRY_CHECK_INTERVAL_S seconds."""
+    global _default_service
+    with _default_lock:
+        if _default_service is None:
+            _default_service = RegistryService(
+                directory=os.getenv("REGISTRY_DIR", DEFAULT_REGISTRY_DIR),
+                check_interval=float(os.getenv("REGISTRY_CHECK_INTERVAL_S", "2")),
+            )
+        return _default_service
+
+
+def get_registry() -> RegistrySnapshot:
+    return get_registry_service().get()
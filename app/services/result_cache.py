@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+from .utils import cache_path
+
+
+DEFAULT_CACHE_DIR = cache_path("results")
+
+# Bump whenever parse output changes for the same input, so stale cached results are not served.
+PARSER_VERSION = "2"
+
+
+def result_cache_key(content_sha256: str, registry_version: str, options: Dict[str, Any]) -> str:
+    """Key on the upload's hash, the registries, the parser version and the request options."""
+    blob = json.dumps(
+        {"content": content_sha256, "registry": registry_version, "parser": PARSER_VERSION, "options": options},
+        sort_keys=True,
+    )
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """Content-addressed store of serialized parse responses on local disk.
+
+    Each entry is one file named after its key. Reads refresh the entry's position in an
+    in-process LRU order, and writes evict least-recently-used entries until the total size
+    is at most `max_bytes`. Entries are written to a temp file and renamed into place, so a
+    concurrent reader never sees a partial result.
+    """
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, max_bytes: int = 256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._sizes: "OrderedDict[str, int]" = OrderedDict()
+        self._total = 0
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _scan(self) -> None:
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                st = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((st.st_atime, name[: -len(".json")], st.st_size))
+        for _, key, size in sorted(entries):
+            self._sizes[key] = size
+            self._total += size
+
+    def _evict(self) -> None:
+        while self._total > self.max_bytes and self._sizes:
+            key, size = self._sizes.popitem(last=False)
+            self._total -= size
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            if key not in self._sizes:
+                return None
+            self._sizes.move_to_end(key)
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except OSError:
+            with self._lock:
+                self._total -= self._sizes.pop(key, 0)
+            return None
+
+    def put(self, key: str, payload: bytes) -> None:
+        if len(payload) > self.max_bytes:
+            return
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(payload)
+        os.replace(tmp, self._path(key))
+        with self._lock:
+            self._total += len(payload) - self._sizes.pop(key, 0)
+            self._sizes[key] = len(payload)
+            self._evict()
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in self._sizes:
+                try:
+                    os.remove(self._path(key))
+                except OSError:
+                    pass
+            self._sizes.clear()
+            self._total = 0
+
+
+_default_cache: Optional[ResultCache] = None
+_default_lock = threading.Lock()
+
+
+def get_result_cache() -> Optional[ResultCache]:
+    """Process-wide cache in RESULT_CACHE_DIR holding up to RESULT_CACHE_MAX_BYTES (empty dir = disabled)."""
+    global _default_cache
+    directory = os.getenv("RESULT_CACHE_DIR", DEFAULT_CACHE_DIR)
+    if not directory:
+        return None
+    with _default_lock:
+        if _default_cache is None or _default_cache.directory != directory:
+            _default_cache = ResultCache(
+                directory=directory,
+                max_bytes=int(os.getenv("RESULT_CACHE_MAX_BYTES", str(256 * 1024 * 1024))),
+            )
+        return _default_cache
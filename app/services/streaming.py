@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import json
+
+from app.models.schemas import BatchFileResult
+from .cells import CellTable, dump_json, rechunk
+from .pipeline import ParseStream
+
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+DEFAULT_CHUNK_CELLS = 2000
+
+
+def _line(obj: Dict[str, Any]) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, default=str).encode("utf-8") + b"\n"
+
+
+def _rows_line(table: CellTable) -> bytes:
+    return b'{"type":"rows","cells":' + table.to_json() + b"}\n"
+
+
+def error_lines(warnings: List[str]) -> Iterator[bytes]:
+    yield _line({"type": "trailer", "status": "error", "warnings": warnings, "meta": {}})
+
+
+def iter_ndjson(stream: ParseStream, chunk_cells: int = DEFAULT_CHUNK_CELLS) -> Iterator[bytes]:
+    """Encode a parse as NDJSON: a header line, "rows" lines of up to `chunk_cells` cells, then a trailer.
+
+    Rows are parsed lazily as the response is consumed, so only one block of rows is held
+    in memory; cells are encoded straight from their parsed columns. A failure mid-sheet
+    ends the stream with an error trailer.
+    """
+    yield _line({
+        "type": "header",
+        "status": "success",
+        "header_row": stream.header_row,
+        "unmapped_columns": [u.model_dump() for u in stream.unmapped_columns],
+        "warnings": list(stream.warnings),
+        "meta": {"sheet": stream.sheet_name, "cols": len(stream.columns)},
+    })
+
+    # A chunk ends with the first row that brings it to `chunk_cells` cells.
+    rows_per_chunk = -(-chunk_cells // max(1, len(stream.active_mappings())))
+    try:
+        for table in rechunk(stream.iter_tables(), rows_per_chunk):
+            yield _rows_line(table)
+    except Exception as e:
+        yield _line({"type": "trailer", "status": "error", "warnings": stream.warnings + [str(e)], "meta": stream.meta})
+        return
+
+    stream.finish()
+    yield _line({"type": "trailer", "status": "success", "warnings": stream.warnings, "meta": stream.meta})
+
+
+def iter_batch_ndjson(
+    results: Iterator[Tuple[int, BatchFileResult]], meta: Dict[str, Any], warnings: Optional[List[str]] = None
+) -> Iterator[bytes]:
+    """Encode a batch parse as NDJSON: one "file" line per workbook as it finishes, then a trailer."""
+    warnings = list(warnings or [])
+    ok = False
+    try:
+        for idx, item in results:
+            ok = ok or item.result.status == "success"
+            prefix = _line({"type": "file", "index": idx, "filename": item.filename})[:-2]
+            yield prefix + b',"result":' + dump_json(item.result) + b"}\n"
+    except Exception as e:
+        yield _line({"type": "trailer", "status": "error", "warnings": warnings + [str(e)], "meta": meta})
+        return
+
+    yield _line({"type": "trailer", "status": "success" if ok else "error", "warnings": warnings, "meta": meta})
@@ -0,0 +1,388 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from difflib import SequenceMatcher
+from itertools import islice
+from typing import Any, AbstractSet, Dict, Iterable, List, Optional
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from app.models.schemas import ColumnInput, ColumnMapping, MappingCorrection, TemplateColumn, TemplateInfo
+from .utils import cache_path, normalize_text
+
+
+DEFAULT_STORE_PATH = cache_path("templates.sqlite3")
+# A sheet whose header row hashes like a template's must also have a sheet name and rows
+# above the header at least this similar (difflib ratio, 0-1) to the template's.
+DEFAULT_MATCH_THRESHOLD = 0.8
+# The rows above the header contribute at most this many characters to a fingerprint.
+CONTEXT_CHARS = 1000
+# Hit counts and last-use times of matched templates are written back at most this often.
+TOUCH_SECONDS = 60.0
+CORRECTED_REASON = "Corrected by user."
+
+
+def _is_empty(v: Any) -> bool:
+    return v is None or (isinstance(v, str) and v.strip() == "")
+
+
+def _header_key(row: List[Any]) -> List[str]:
+    key = [normalize_text(v) for v in row]
+    while key and not key[-1]:
+        key.pop()
+    return key
+
+
+def _context(sheet_name: str, above: List[List[Any]]) -> str:
+    lines = [normalize_text(sheet_name)]
+    lines += [" ".join(normalize_text(v) for v in row if not _is_empty(v)) for row in above]
+    return "\n".join(lines)[:CONTEXT_CHARS]
+
+
+@dataclass
+class TemplateFingerprint:
+    """Sheet name and rows above the header (as normalized text) plus a hash of the normalized header row."""
+    header_idx: int
+    header_hash: str
+    header_cells: int
+    context: str
+
+
+def template_fingerprint(sheet_name: str, above: List[List[Any]], header: List[Any]) -> TemplateFingerprint:
+    key = json.dumps(_header_key(header), ensure_ascii=False)
+    return TemplateFingerprint(
+        header_idx=len(above),
+        header_hash=hashlib.sha256(key.encode("utf-8")).hexdigest(),
+        header_cells=sum(1 for v in header if not _is_empty(v)),
+        context=_context(sheet_name, above),
+    )
+
+
+def _similarity(a: str, b: str) -> float:
+    return 1.0 if a == b else SequenceMatcher(None, a, b).ratio()
+
+
+@dataclass
+class SheetTemplate:
+    """A known sheet layout: header position, column inputs (with asset hints) and resolved mappings.
+
+    `warnings` are the header-detection warnings and `mapping_warnings` those of the mapping
+    the template was learned from. `fallback` marks mappings made by the deterministic
+    fallback mapper because no API key was set.
+    """
+    id: str
+    sheet_name: str
+    fingerprint: TemplateFingerprint
+    columns: List[ColumnInput]
+    mappings: List[ColumnMapping]
+    registry_version: str
+    warnings: List[str] = field(default_factory=list)
+    mapping_warnings: List[str] = field(default_factory=list)
+    fallback: bool = False
+    corrected: bool = False
+    hits: int = 0
+    created_at: float = 0.0
+    updated_at: float = 0.0
+    used_at: float = 0.0
+
+    def info(self) -> TemplateInfo:
+        by_col = {m.column_index: m for m in self.mappings}
+        columns = [
+            TemplateColumn(
+                col=c.column_index,
+                header=c.original_header,
+                param_name=by_col[c.column_index].param_name,
+                asset_name=by_col[c.column_index].asset_name,
+                confidence=by_col[c.column_index].confidence,
+                reason=by_col[c.column_index].reason,
+            )
+            for c in self.columns if c.column_index in by_col
+        ]
+        return TemplateInfo(
+            id=self.id,
+            sheet_name=self.sheet_name,
+            header_row=self.fingerprint.header_idx + 1,
+            columns=columns,
+            registry_version=self.registry_version,
+            corrected=self.corrected,
+            hits=self.hits,
+            created_at=self.created_at,
+            updated_at=self.updated_at,
+        )
+
+    def _payload(self) -> str:
+        return json.dumps({
+            "sheet_name": self.sheet_name,
+            "header_cells": self.fingerprint.header_cells,
+            "context": self.fingerprint.context,
+            "columns": [c.model_dump() for c in self.columns],
+            "mappings": [m.model_dump() for m in self.mappings],
+            "registry_version": self.registry_version,
+            "warnings": self.warnings,
+            "mapping_warnings": self.mapping_warnings,
+            "fallback": self.fallback,
+        }, ensure_ascii=False)
+
+
+def _from_row(row: tuple) -> SheetTemplate:
+    template_id, header_idx, header_hash, payload, corrected, hits, created_at, updated_at, used_at = row
+    data = json.loads(payload)
+    return SheetTemplate(
+        id=template_id,
+        sheet_name=data["sheet_name"],
+        fingerprint=TemplateFingerprint(header_idx, header_hash, data["header_cells"], data["context"]),
+        columns=[ColumnInput.model_validate(c) for c in data["columns"]],
+        mappings=[ColumnMapping.model_validate(m) for m in data["mappings"]],
+        registry_version=data["registry_version"],
+        warnings=data["warnings"],
+        mapping_warnings=data["mapping_warnings"],
+        fallback=data["fallback"],
+        corrected=bool(corrected),
+        hits=hits,
+        created_at=created_at,
+        updated_at=updated_at,
+        used_at=used_at,
+    )
+
+
+_COLUMNS = "id, header_idx, header_hash, payload, corrected, hits, created_at, updated_at, used_at"
+
+
+class TemplateStore:
+    """Layouts of successfully parsed sheets, kept in SQLite and indexed in memory by header row.
+
+    A sheet matches a template when its row at the template's header index normalizes to
+    the same header (compared by hash) and its sheet name plus the rows above the header are
+    at least `threshold` similar to the template's. Templates learned under another registry
+    version are ignored unless they were corrected. `path=None` keeps the store in memory;
+    beyond `max_templates`, the least recently used uncorrected templates are dropped.
+    """
+
+    def __init__(self, path: Optional[str] = None, threshold: float = DEFAULT_MATCH_THRESHOLD, max_templates: int = 5000):
+        self.path = path
+        self.threshold = threshold
+        self.max_templates = max_templates
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path or ":memory:", check_same_thread=False, timeout=30)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS templates ("
+            "id TEXT PRIMARY KEY, header_idx INTEGER NOT NULL, header_hash TEXT NOT NULL, payload TEXT NOT NULL, "
+            "corrected INTEGER NOT NULL DEFAULT 0, hits INTEGER NOT NULL DEFAULT 0, "
+            "created_at REAL NOT NULL, updated_at REAL NOT NULL, used_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS templates_used ON templates (corrected, used_at)")
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self._by_id: Dict[str, SheetTemplate] = {}
+        self._by_index: Dict[int, List[SheetTemplate]] = {}
+        self._pending_hits: Dict[str, int] = {}
+        self._data_version: Optional[int] = None
+
+    def _refresh(self) -> None:
+        """Reload the index when another connection (e.g. another worker process) changed the table."""
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._data_version:
+            return
+        rows = self._conn.execute(f"SELECT {_COLUMNS} FROM templates").fetchall()
+        self._index([_from_row(r) for r in rows])
+        self._data_version = version
+
+    def _index(self, templates: Iterable[SheetTemplate]) -> None:
+        by_id = {t.id: t for t in templates}
+        by_index: Dict[int, List[SheetTemplate]] = {}
+        for t in by_id.values():
+            by_index.setdefault(t.fingerprint.header_idx, []).append(t)
+        self._by_id, self._by_index = by_id, by_index
+
+    def _find(self, fp: TemplateFingerprint, sheet_templates: Iterable[SheetTemplate]) -> Optional[SheetTemplate]:
+        best, best_ratio = None, self.threshold
+        for t in sheet_templates:
+            if t.fingerprint.header_hash != fp.header_hash or t.fingerprint.header_cells != fp.header_cells:
+                continue
+            ratio = _similarity(fp.context, t.fingerprint.context)
+            if ratio > best_ratio or (ratio == best_ratio and (best is None or t.corrected > best.corrected)):
+                best, best_ratio = t, ratio
+        return best
+
+    @property
+    def revision(self) -> float:
+        """Time of the latest correction; it changes whenever corrected mappings do."""
+        with self._lock:
+            self._refresh()
+            return max((t.updated_at for t in self._by_id.values() if t.corrected), default=0.0)
+
+    def match(self, sheet_name: str, rows: Iterable[List[Any]], registry_version: str) -> Optional[SheetTemplate]:
+        """Return the template `rows` (a sheet's rows from the top, read lazily) match, if any.
+
+        Reading stops at the match or below the deepest stored header row.
+        """
+        with self._lock:
+            self._refresh()
+            by_index = self._by_index
+        above: List[List[Any]] = []
+        for i, row in enumerate(islice(rows, max(by_index, default=-1) + 1)):
+            candidates = [t for t in by_index.get(i, ()) if t.corrected or t.registry_version == registry_version]
+            if candidates:
+                cells = sum(1 for v in row if not _is_empty(v))
+                candidates = [t for t in candidates if t.fingerprint.header_cells == cells]
+            if candidates:
+                found = self._find(template_fingerprint(sheet_name, above, row), candidates)
+                if found is not None:
+                    self._touch(found)
+                    return found
+            above.append(row)
+        return None
+
+    def _touch(self, template: SheetTemplate) -> None:
+        now = time.time()
+        with self._lock:
+            template.hits += 1
+            self._pending_hits[template.id] = self._pending_hits.get(template.id, 0) + 1
+            if now - template.used_at < TOUCH_SECONDS:
+                return
+            template.used_at = now
+            self._conn.execute(
+                "UPDATE templates SET hits = hits + ?, used_at = ? WHERE id = ?",
+                (self._pending_hits.pop(template.id), now, template.id),
+            )
+            self._conn.commit()
+
+    def _write(self, template: SheetTemplate) -> None:
+        self._conn.execute(
+            f"INSERT OR REPLACE INTO templates ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (template.id, template.fingerprint.header_idx, template.fingerprint.header_hash, template._payload(),
+             int(template.corrected), template.hits, template.created_at, template.updated_at, template.used_at),
+        )
+
+    def learn(
+        self,
+        sheet_name: str,
+        fp: TemplateFingerprint,
+        columns: List[ColumnInput],
+        mappings: List[ColumnMapping],
+        registry_version: str,
+        warnings: List[str],
+        mapping_warnings: List[str],
+        fallback: bool = False,
+    ) -> str:
+        """Store (or refresh) the template of a successfully parsed sheet and return its id.
+
+        A similar template that was corrected is kept as it is.
+        """
+        now = time.time()
+        with self._lock:
+            self._refresh()
+            existing = self._find(fp, self._by_index.get(fp.header_idx, ()))
+            if existing is not None and existing.corrected:
+                return existing.id
+            if existing is not None:
+                template_id, created_at, hits = existing.id, existing.created_at, existing.hits
+            else:
+                blob = f"{fp.header_idx}\n{fp.header_hash}\n{fp.context}".encode("utf-8")
+                template_id, created_at, hits = hashlib.sha256(blob).hexdigest()[:32], now, 0
+            template = SheetTemplate(
+                id=template_id, sheet_name=sheet_name, fingerprint=fp, columns=columns, mappings=mappings,
+                registry_version=registry_version, warnings=list(warnings), mapping_warnings=list(mapping_warnings),
+                fallback=fallback, hits=hits, created_at=created_at, updated_at=now, used_at=now,
+            )
+            self._write(template)
+            evicted = self._conn.execute(
+                "DELETE FROM templates WHERE id IN (SELECT id FROM templates WHERE corrected = 0 "
+                "ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_templates,),
+            ).rowcount
+            self._conn.commit()
+            if evicted:
+                self._data_version = None
+            else:
+                self._index([t for t in self._by_id.values() if t.id != template_id] + [template])
+            return template_id
+
+    def correct(
+        self,
+        template_id: str,
+        corrections: List[MappingCorrection],
+        param_set: AbstractSet[str],
+        asset_set: AbstractSet[str],
+    ) -> Optional[SheetTemplate]:
+        """Replace the mappings of the given columns and pin the template; None if it is unknown.
+
+        Raises ValueError for a column outside the template or a name missing from the registry.
+        """
+        with self._lock:
+            self._refresh()
+            template = self._by_id.get(template_id)
+            if template is None:
+                return None
+            for c in corrections:
+                if c.col >= len(template.columns):
+                    raise ValueError(f"Column {c.col} is outside the template's {len(template.columns)} columns.")
+                if c.param_name is not None and c.param_name not in param_set:
+                    raise ValueError(f"Column {c.col}: param_name '{c.param_name}' not in registry.")
+                if c.asset_name is not None and c.asset_name not in asset_set:
+                    raise ValueError(f"Column {c.col}: asset_name '{c.asset_name}' not in registry.")
+
+            by_col = {m.column_index: m for m in template.mappings}
+            for c in corrections:
+                by_col[c.col] = ColumnMapping(
+                    column_index=c.col, param_name=c.param_name, asset_name=c.asset_name,
+                    confidence="high", reason=CORRECTED_REASON,
+                )
+            template.mappings = [by_col[k] for k in sorted(by_col)]
+            template.corrected = True
+            template.fallback = False
+            template.updated_at = time.time()
+            self._write(template)
+            self._conn.commit()
+            return template
+
+    def get(self, template_id: str) -> Optional[SheetTemplate]:
+        with self._lock:
+            self._refresh()
+            return self._by_id.get(template_id)
+
+    def list(self, limit: int = 100) -> List[SheetTemplate]:
+        """Stored templates, most recently used first."""
+        with self._lock:
+            self._refresh()
+            return sorted(self._by_id.values(), key=lambda t: t.used_at, reverse=True)[:limit]
+
+    def delete(self, template_id: str) -> bool:
+        with self._lock:
+            deleted = self._conn.execute("DELETE FROM templates WHERE id = ?", (template_id,)).rowcount
+            self._conn.commit()
+            self._pending_hits.pop(template_id, None)
+            self._index([t for t in self._by_id.values() if t.id != template_id])
+            return bool(deleted)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM templates")
+            self._conn.commit()
+            self._pending_hits.clear()
+            self._index([])
+
+
+_default_store: Optional[TemplateStore] = None
+_default_lock = threading.Lock()
+
+
+def get_template_store() -> Optional[TemplateStore]:
+    """Process-wide store, or None unless TEMPLATE_STORE_ENABLED is set; configured from
+    TEMPLATE_STORE_PATH (empty = memory only), TEMPLATE_MATCH_THRESHOLD and TEMPLATE_STORE_SIZE."""
+    global _default_store
+    if os.getenv("TEMPLATE_STORE_ENABLED", "0") in ("0", "false", ""):
+        return None
+    with _default_lock:
+        if _default_store is None:
+            _default_store = TemplateStore(
+                path=os.getenv("TEMPLATE_STORE_PATH", DEFAULT_STORE_PATH) or None,
+                threshold=float(os.getenv("TEMPLATE_MATCH_THRESHOLD", str(DEFAULT_MATCH_THRESHOLD))),
+                max_templates=int(os.getenv("TEMPLATE_STORE_SIZE", "5000")),
+            )
+        return _default_store
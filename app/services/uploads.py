@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+from typing import Any, BinaryIO, Optional
+import hashlib
+import os
+import tempfile
+
+
+DEFAULT_MAX_UPLOAD_BYTES = 200 * 1024 * 1024
+SPOOL_CHUNK_BYTES = 1 << 20
+
+
+def max_upload_bytes() -> int:
+    """UPLOAD_MAX_BYTES: largest accepted upload (and extracted archive member) in bytes."""
+    return int(os.getenv("UPLOAD_MAX_BYTES", str(DEFAULT_MAX_UPLOAD_BYTES)))
+
+
+class UploadTooLarge(Exception):
+    def __init__(self, max_bytes: int):
+        super().__init__(f"Upload exceeds the {max_bytes} byte limit.")
+        self.max_bytes = max_bytes
+
+
+class SpooledUpload:
+    """An upload copied to a temp file on disk, with its size and SHA-256.
+
+    Parsers open it by `path`, so the workbook never has to be held in memory as one
+    bytes object. The file is removed by `close` (or on leaving a `with` block).
+    """
+
+    def __init__(self, path: str, size: int, sha256: str, filename: str = ""):
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+        self.filename = filename
+
+    def close(self) -> None:
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self) -> "SpooledUpload":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+def _spool_dir() -> Optional[str]:
+    return os.getenv("UPLOAD_SPOOL_DIR") or None
+
+
+class _SpoolWriter:
+    """Temp file that hashes and size-checks each chunk as it is written."""
+
+    def __init__(self, filename: str, max_bytes: Optional[int]):
+        self.filename = filename
+        self.max_bytes = max_upload_bytes() if max_bytes is None else max_bytes
+        self.digest = hashlib.sha256()
+        self.size = 0
+        fd, self.path = tempfile.mkstemp(prefix="upload-", suffix=".xlsx", dir=_spool_dir())
+        self.out = os.fdopen(fd, "wb")
+
+    def write(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise UploadTooLarge(self.max_bytes)
+        self.digest.update(chunk)
+        self.out.write(chunk)
+
+    def finish(self) -> SpooledUpload:
+        self.out.close()
+        return SpooledUpload(self.path, self.size, self.digest.hexdigest(), self.filename)
+
+    def abort(self) -> None:
+        self.out.close()
+        os.remove(self.path)
+
+
+def spool_stream(src: BinaryIO, filename: str = "", max_bytes: Optional[int] = None) -> SpooledUpload:
+    """Copy `src` to a temp file in chunks, hashing as it goes; raise UploadTooLarge past `max_bytes`."""
+    writer = _SpoolWriter(filename, max_bytes)
+    try:
+        for chunk in iter(lambda: src.read(SPOOL_CHUNK_BYTES), b""):
+            writer.write(chunk)
+    except BaseException:
+        writer.abort()
+        raise
+    return writer.finish()
+
+
+async def spool_upload(file: Any, max_bytes: Optional[int] = None) -> SpooledUpload:
+    """Spool a FastAPI/Starlette UploadFile to disk the same way, awaiting each chunk."""
+    writer = _SpoolWriter(file.filename or "", max_bytes)
+    try:
+        while True:
+            chunk = await file.read(SPOOL_CHUNK_BYTES)
+            if not chunk:
+                break
+            writer.write(chunk)
+    except BaseException:
+        writer.abort()
+        raise
+    return writer.finish()
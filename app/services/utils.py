@@ -1,9 +1,19 @@
 from __future__ import annotations
 
+import os
 import re
 from typing import Optional
 
 
+def cache_path(*parts: str) -> str:
+    """Default location of on-disk caches and stores: CACHE_DIR, else the user's cache directory
+    (XDG_CACHE_HOME or ~/.cache) under "excel-parser" -- never inside the source tree."""
+    root = os.getenv("CACHE_DIR") or os.path.join(
+        os.getenv("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "excel-parser"
+    )
+    return os.path.join(root, *parts)
+
+
 _whitespace_re = re.compile(r"\s+")
 _non_alnum_re = re.compile(r"[^a-z0-9%/]+")
 
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import Any, Optional
+from typing import Any, Dict, List, Optional, Tuple
 import re
 
 
@@ -69,3 +69,78 @@ def parse_value(value: Any) -> Optional[float]:
     except Exception:
         return None
 
+
+def _parse_string(s: str) -> Optional[float]:
+    # Plain numerals are by far the most common string cells; when float() accepts the
+    # string, parse_value would reach the same number through its regex or last-resort branch.
+    try:
+        return float(s)
+    except ValueError:
+        return parse_value(s)
+
+
+class ValueMemo:
+    """Bounded per-parse memo of `parse_value` results keyed on (type, raw value).
+
+    It also interns raw strings so repeated tokens in the output share one object.
+    Once `max_entries` distinct values are held, new values are parsed without being stored.
+    """
+
+    def __init__(self, max_entries: int = 65536):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._parsed: Dict[Tuple[type, Any], Tuple[Any, Optional[float]]] = {}
+
+    def lookup(self, value: Any) -> Tuple[Any, Optional[float]]:
+        """Return (interned_raw_value, parsed_value)."""
+        key = (type(value), value)
+        entry = self._parsed.get(key)
+        if entry is not None:
+            self.hits += 1
+            return entry
+        self.misses += 1
+        entry = (value, _parse_string(value) if type(value) is str else parse_value(value))
+        if len(self._parsed) < self.max_entries:
+            self._parsed[key] = entry
+        return entry
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "entries": len(self._parsed),
+        }
+
+
+def parse_values(values: List[Any], memo: Optional[ValueMemo] = None) -> List[Optional[float]]:
+    """Parse a whole column of raw cells; equivalent to [parse_value(v) for v in values].
+
+    Columns that are already numeric take a single float() pass. Otherwise each distinct
+    non-numeric value is parsed once, either per call or across calls via `memo`; with a
+    memo, repeated strings in `values` are also replaced in place by one shared instance.
+    """
+    try:
+        if all(type(v) is float or type(v) is int for v in values):
+            return [float(v) for v in values]
+    except OverflowError:
+        pass
+
+    memo = memo or ValueMemo()
+    lookup = memo.lookup
+    out: List[Optional[float]] = []
+    append = out.append
+    for i, v in enumerate(values):
+        t = type(v)
+        if v is None:
+            append(None)
+        elif t is float or t is int:
+            append(parse_value(v))
+        else:
+            raw, parsed = lookup(v)
+            if raw is not v:
+                values[i] = raw
+            append(parsed)
+    return out
@@ -0,0 +1,465 @@
+from __future__ import annotations
+
+from functools import cached_property
+from io import BytesIO
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple, Union
+from warnings import warn
+from xml.etree.ElementTree import fromstring
+import os
+import posixpath
+import xml.parsers.expat as expat
+import zipfile
+
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format, is_timedelta_format
+from openpyxl.utils.cell import column_index_from_string, range_boundaries
+from openpyxl.utils.datetime import CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900, from_excel, from_ISO8601
+from openpyxl.xml.constants import ARC_CONTENT_TYPES, ARC_STYLE, SHARED_STRINGS, SHEET_MAIN_NS, XLSM, XLSX, XLTM, XLTX
+
+
+CHUNK_BYTES = 1 << 16
+
+_CT_NS = "{http://schemas.openxmlformats.org/package/2006/content-types}"
+_PKG_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+_DOC_REL_ID = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+_MAIN = "{%s}" % SHEET_MAIN_NS
+
+# Element names as reported by expat with namespace_separator="}".
+_N = SHEET_MAIN_NS + "}"
+_ROW, _C, _V, _IS, _T, _R, _RPH, _SI = (_N + t for t in ("row", "c", "v", "is", "t", "r", "rPh", "si"))
+_DIMENSION, _SHEET_DATA, _WORKSHEET = _N + "dimension", _N + "sheetData", _N + "worksheet"
+
+
+# Raw workbook bytes, or the path of a workbook on disk (e.g. a spooled upload).
+WorkbookSource = Union[bytes, str, "os.PathLike[str]"]
+
+
+def as_file(source: WorkbookSource) -> Any:
+    """Something zipfile and openpyxl can open: a BytesIO over bytes, or the path itself."""
+    return BytesIO(source) if isinstance(source, (bytes, bytearray, memoryview)) else source
+
+
+class UnsupportedWorkbook(Exception):
+    """The archive uses a layout or feature this reader does not handle; use openpyxl instead."""
+
+
+def _cast_number(value: str) -> Any:
+    if "." in value or "E" in value or "e" in value:
+        return float(value)
+    return int(value)
+
+
+def _expat_parser() -> Any:
+    parser = expat.ParserCreate(namespace_separator="}")
+    parser.buffer_text = True
+    parser.buffer_size = CHUNK_BYTES
+    return parser
+
+
+def _feed(parser: Any, src: Any) -> Iterator[None]:
+    """Feed `src` to `parser` one chunk at a time, yielding after each chunk."""
+    while True:
+        chunk = src.read(CHUNK_BYTES)
+        if not chunk:
+            parser.Parse(b"", True)
+            yield
+            return
+        parser.Parse(chunk, False)
+        yield
+
+
+class _Workbook:
+    """Sheet list, shared strings and date styles of an archive, read the way openpyxl reads them.
+
+    Shared strings and styles are read on first use, so listing sheets stays cheap.
+    """
+
+    def __init__(self, zf: zipfile.ZipFile):
+        self.zf = zf
+        names = set(zf.namelist())
+        content_types = fromstring(zf.read(ARC_CONTENT_TYPES))
+        overrides = {o.get("ContentType"): o.get("PartName", "")[1:] for o in content_types.iter(f"{_CT_NS}Override")}
+
+        workbook_path = next((overrides[ct] for ct in (XLTM, XLTX, XLSM, XLSX) if ct in overrides), None)
+        if workbook_path is None or workbook_path not in names:
+            raise UnsupportedWorkbook("No workbook part in content types.")
+        workbook = fromstring(zf.read(workbook_path))
+        if not workbook.tag.startswith(_MAIN):
+            raise UnsupportedWorkbook(f"Unsupported workbook namespace: {workbook.tag}")
+
+        pr = workbook.find(f"{_MAIN}workbookPr")
+        date1904 = pr is not None and pr.get("date1904") not in (None, "false", "f", "0")
+        self.epoch = CALENDAR_MAC_1904 if date1904 else CALENDAR_WINDOWS_1900
+
+        rels = self._relationships(workbook_path)
+        # (title, worksheet path or None for chartsheets), for every sheet openpyxl would load.
+        self.sheets: List[Tuple[str, Optional[str]]] = []
+        for sheet in workbook.iter(f"{_MAIN}sheet"):
+            rel = rels.get(sheet.get(_DOC_REL_ID) or "")
+            if rel is None or rel[1] not in names:
+                continue
+            self.sheets.append((sheet.get("name", ""), None if "chartsheet" in rel[0] else rel[1]))
+
+        self._names = names
+        self._strings_path = overrides.get(SHARED_STRINGS)
+
+    @cached_property
+    def shared_strings(self) -> List[str]:
+        return self._read_shared_strings(self._strings_path) if self._strings_path in self._names else []
+
+    @cached_property
+    def _styles(self) -> Tuple[Set[int], Set[int]]:
+        return self._read_date_styles() if ARC_STYLE in self._names else (set(), set())
+
+    @property
+    def date_styles(self) -> Set[int]:
+        return self._styles[0]
+
+    @property
+    def timedelta_styles(self) -> Set[int]:
+        return self._styles[1]
+
+    def _relationships(self, part: str) -> Dict[str, Tuple[str, str]]:
+        folder, name = posixpath.split(part)
+        rels_path = posixpath.join(folder, "_rels", f"{name}.rels")
+        out: Dict[str, Tuple[str, str]] = {}
+        if rels_path not in self.zf.namelist():
+            return out
+        parent = posixpath.split(posixpath.dirname(rels_path))[0]
+        for rel in fromstring(self.zf.read(rels_path)).iter(f"{_PKG_REL_NS}Relationship"):
+            if rel.get("TargetMode") == "External":
+                continue
+            target = rel.get("Target", "")
+            target = target[1:] if target.startswith("/") else posixpath.normpath(posixpath.join(parent, target))
+            out[rel.get("Id", "")] = (rel.get("Type", ""), target)
+        return out
+
+    def _read_shared_strings(self, path: str) -> List[str]:
+        strings: List[str] = []
+        parts: List[str] = []
+        state = {"collect": False, "phonetic": 0}
+
+        def start(name: str, attrs: Dict[str, str]) -> None:
+            if name == _T:
+                state["collect"] = not state["phonetic"]
+            elif name == _SI:
+                parts.clear()
+            elif name == _RPH:
+                state["phonetic"] += 1
+
+        def end(name: str) -> None:
+            if name == _T:
+                state["collect"] = False
+            elif name == _SI:
+                strings.append("".join(parts).replace("x005F_", ""))
+            elif name == _RPH:
+                state["phonetic"] -= 1
+
+        def chars(data: str) -> None:
+            if state["collect"]:
+                parts.append(data)
+
+        parser = _expat_parser()
+        parser.StartElementHandler, parser.EndElementHandler, parser.CharacterDataHandler = start, end, chars
+        with self.zf.open(path) as src:
+            for _ in _feed(parser, src):
+                pass
+        return strings
+
+    def _read_date_styles(self) -> Tuple[Set[int], Set[int]]:
+        styles = fromstring(self.zf.read(ARC_STYLE))
+        custom = {int(f.get("numFmtId", 0)): f.get("formatCode") for f in styles.iter(f"{_MAIN}numFmt")}
+        date_styles: Set[int] = set()
+        timedelta_styles: Set[int] = set()
+        xfs = styles.find(f"{_MAIN}cellXfs")
+        for idx, xf in enumerate(xfs.findall(f"{_MAIN}xf") if xfs is not None else []):
+            fmt_id = int(xf.get("numFmtId", 0))
+            fmt = custom[fmt_id] if fmt_id in custom else BUILTIN_FORMATS.get(fmt_id)
+            if is_date_format(fmt):
+                date_styles.add(idx)
+            if is_timedelta_format(fmt):
+                timedelta_styles.add(idx)
+        return date_styles, timedelta_styles
+
+    def worksheet(self, index: int) -> Tuple[str, str]:
+        worksheets = [(title, path) for title, path in self.sheets if path is not None]
+        return worksheets[index]
+
+
+class _SheetReader:
+    """Streaming expat pass over one worksheet producing openpyxl-equivalent value rows.
+
+    Cells are converted like openpyxl's `WorkSheetParser.parse_cell` with data_only=True and
+    rows are laid out like `ReadOnlyWorksheet.iter_rows(values_only=True)`: the sheet's
+    declared dimension fixes the width and last row, and missing rows are filled with None.
+    Element names are matched unprefixed, so sheets whose root does not declare the main
+    namespace as the default namespace are rejected as unsupported.
+    """
+
+    def __init__(self, book: _Workbook, path: str):
+        self.src = book.zf.open(path)
+        self.dimension: Optional[Tuple[int, int, int, int]] = None
+        self.in_data = False
+        self.rows: List[Tuple[int, List[Tuple[int, Any]]]] = []
+        parser = expat.ParserCreate()
+        parser.buffer_text = True
+        parser.buffer_size = CHUNK_BYTES
+        self._install_handlers(parser, book)
+        self._chunks = _feed(parser, self.src)
+
+        # Read up to the first row so the dimension (which precedes sheetData) is known.
+        while not self.in_data:
+            if next(self._chunks, StopIteration) is StopIteration:
+                break
+
+    def _install_handlers(self, parser: Any, book: _Workbook) -> None:
+        shared_strings = book.shared_strings
+        date_styles, timedelta_styles, epoch = book.date_styles, book.timedelta_styles, book.epoch
+        rows = self.rows
+        interned: Dict[str, str] = {}
+        columns: Dict[str, int] = {}
+        text: List[str] = []
+        append_text = text.append
+        digits = "0123456789"
+
+        # Per-row / per-cell state, rebound by the handlers below.
+        row_counter = col_counter = column = style = 0
+        cells: List[Tuple[int, Any]] = []
+        data_type = "n"
+        coordinate: Optional[str] = None
+        collect = has_value = root_seen = False
+        inline: Optional[List[str]] = None
+        phonetic = 0
+
+        def value() -> Any:
+            if data_type == "inlineStr":
+                if inline is None:
+                    return None
+                joined = "".join(inline)
+                return interned.setdefault(joined, joined)
+            raw = "".join(text) if has_value else ""
+            if not raw:
+                return None
+            if data_type == "n":
+                number = _cast_number(raw)
+                if style in date_styles:
+                    try:
+                        return from_excel(number, epoch, timedelta=style in timedelta_styles)
+                    except (OverflowError, ValueError):
+                        warn(f"Cell {coordinate} is marked as a date but the serial value {number} is outside the limits for dates. The cell will be treated as an error.")
+                        return "#VALUE!"
+                return number
+            if data_type == "s":
+                return shared_strings[int(raw)]
+            if data_type == "b":
+                return bool(int(raw))
+            if data_type == "d":
+                return from_ISO8601(raw)
+            return interned.setdefault(raw, raw)
+
+        def start(name: str, attrs: Dict[str, str]) -> None:
+            nonlocal row_counter, col_counter, column, style, cells, data_type, coordinate
+            nonlocal collect, has_value, root_seen, inline, phonetic
+            if name == "c":
+                coordinate = attrs.get("r")
+                if coordinate:
+                    letters = coordinate.rstrip(digits)
+                    column = columns.get(letters) or columns.setdefault(letters, column_index_from_string(letters))
+                    col_counter = column
+                else:
+                    col_counter += 1
+                    column = col_counter
+                s = attrs.get("s")
+                style = int(s) if s else 0
+                data_type = attrs.get("t", "n")
+                has_value = False
+                inline = None
+                text.clear()
+            elif name == "v":
+                collect = has_value = True
+            elif name == "row":
+                r = attrs.get("r")
+                if r is not None:
+                    try:
+                        row_counter = int(r)
+                    except ValueError:
+                        val = float(r)
+                        if not val.is_integer():
+                            raise ValueError(f"{r} is not a valid row number")
+                        row_counter = int(val)
+                else:
+                    row_counter += 1
+                col_counter = 0
+                cells = []
+            elif name == "is":
+                inline = []
+            elif name == "t":
+                collect = inline is not None and not phonetic
+            elif name == "rPh":
+                phonetic += 1
+            elif name == "sheetData":
+                self.in_data = True
+            elif name == "dimension":
+                ref = attrs.get("ref")
+                if ref:
+                    self.dimension = range_boundaries(ref)
+            elif not root_seen:
+                if name != "worksheet" or attrs.get("xmlns") != SHEET_MAIN_NS:
+                    raise UnsupportedWorkbook(f"Unsupported worksheet root element: {name}")
+                root_seen = True
+
+        def end(name: str) -> None:
+            nonlocal collect, phonetic
+            if name == "c":
+                cells.append((column, value()))
+            elif name == "v":
+                collect = False
+            elif name == "row":
+                rows.append((row_counter, cells))
+            elif name == "t":
+                if inline is not None and collect:
+                    inline.extend(text)
+                    text.clear()
+                collect = False
+            elif name == "rPh":
+                phonetic -= 1
+
+        def chars(data: str) -> None:
+            if collect:
+                append_text(data)
+
+        parser.StartElementHandler, parser.EndElementHandler, parser.CharacterDataHandler = start, end, chars
+
+    def parsed_rows(self) -> Iterator[Tuple[int, List[Tuple[int, Any]]]]:
+        """Yield (row_number, [(column, value), ...]) for each <row> element, in file order."""
+        while True:
+            if self.rows:
+                batch = self.rows[:]
+                self.rows.clear()
+                yield from batch
+            if next(self._chunks, StopIteration) is StopIteration:
+                batch = self.rows[:]
+                self.rows.clear()
+                yield from batch
+                return
+
+    def iter_values(self) -> Iterator[List[Any]]:
+        max_col = self.dimension[2] if self.dimension else None
+        max_row = self.dimension[3] if self.dimension else None
+        counter = 1
+        idx = 1
+        try:
+            for idx, cells in self.parsed_rows():
+                if max_row is not None and idx > max_row:
+                    break
+                for _ in range(counter, idx):
+                    counter += 1
+                    yield [None] * max_col if max_col is not None else []
+                if counter <= idx:
+                    counter += 1
+                    if not cells and not max_col:
+                        yield []
+                        continue
+                    width = max_col or cells[-1][0]
+                    row: List[Any] = [None] * width
+                    for column, value in cells:
+                        if 1 <= column <= width:
+                            row[column - 1] = value
+                    yield row
+            if max_row is not None and max_row < idx:
+                for _ in range(counter, max_row + 1):
+                    yield [None] * max_col if max_col is not None else []
+        finally:
+            self.src.close()
+
+
+def _open(source: WorkbookSource) -> _Workbook:
+    try:
+        zf = zipfile.ZipFile(as_file(source))
+    except zipfile.BadZipFile as e:
+        raise UnsupportedWorkbook(str(e)) from e
+    try:
+        return _Workbook(zf)
+    except UnsupportedWorkbook:
+        zf.close()
+        raise
+    except Exception as e:
+        zf.close()
+        raise UnsupportedWorkbook(f"{type(e).__name__}: {e}") from e
+
+
+def iter_sheet_rows(source: WorkbookSource, sheet_index: int = 0) -> Tuple[str, Iterator[List[Any]]]:
+    """Same contract as `excel_reader.iter_sheet_rows`, decoding the sheet XML directly.
+
+    Raises UnsupportedWorkbook before any row is produced if the archive cannot be read
+    this way, so callers can fall back to openpyxl.
+    """
+    book = _open(source)
+    try:
+        title, path = book.worksheet(sheet_index)
+        reader = _SheetReader(book, path)
+    except UnsupportedWorkbook:
+        book.zf.close()
+        raise
+    except IndexError:
+        book.zf.close()
+        raise
+    except Exception as e:
+        book.zf.close()
+        raise UnsupportedWorkbook(f"{type(e).__name__}: {e}") from e
+    width = reader.dimension[2] if reader.dimension else 0
+
+    def rows() -> Iterator[List[Any]]:
+        try:
+            for row in reader.iter_values():
+                if len(row) < width:
+                    row.extend([None] * (width - len(row)))
+                yield row
+        finally:
+            book.zf.close()
+
+    return title, rows()
+
+
+class _Stop(Exception):
+    pass
+
+
+def _declared_rows(zf: zipfile.ZipFile, path: str) -> Optional[int]:
+    """Last row of a worksheet's <dimension>, reading only the XML that precedes sheetData."""
+    found: List[int] = []
+
+    def start(name: str, attrs: Dict[str, str]) -> None:
+        if name == "dimension" and attrs.get("ref"):
+            found.append(range_boundaries(attrs["ref"])[3])
+            raise _Stop
+        if name == "sheetData":
+            raise _Stop
+
+    parser = expat.ParserCreate()
+    parser.StartElementHandler = start
+    with zf.open(path) as src:
+        try:
+            for _ in _feed(parser, src):
+                pass
+        except _Stop:
+            pass
+    return found[0] if found and found[0] is not None else None
+
+
+def sheet_row_counts(source: WorkbookSource) -> List[Optional[int]]:
+    """Declared row count of each worksheet (None where the sheet records no dimension)."""
+    book = _open(source)
+    try:
+        return [_declared_rows(book.zf, path) for _, path in book.sheets if path is not None]
+    except Exception as e:
+        raise UnsupportedWorkbook(f"{type(e).__name__}: {e}") from e
+    finally:
+        book.zf.close()
+
+
+def list_sheet_names(source: WorkbookSource) -> List[str]:
+    book = _open(source)
+    try:
+        return [title for title, path in book.sheets if path is not None]
+    finally:
+        book.zf.close()
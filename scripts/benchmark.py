@@ -0,0 +1,251 @@
+"""Throughput benchmark for the parsing pipeline on synthetic workbooks.
+
+Examples:
+    python scripts/benchmark.py --rows 20000 --cols 12 --messiness 0.3
+    python scripts/benchmark.py --rows 20000 --save bench/baseline.json
+    python scripts/benchmark.py --rows 20000 --compare bench/baseline.json --tolerance 0.15
+
+Mapping uses the deterministic fallback mapper in place of Gemini (GEMINI_API_KEY is
+unset) and a memory-only mapping cache that is cleared before every run, so results
+do not depend on the network or on earlier runs.
+"""
+from __future__ import annotations
+
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+import argparse
+import json
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+from openpyxl import Workbook
+
+ROOT = Path(__file__).resolve().parents[1]
+REGISTRY_DIR = ROOT / "app" / "registries"
+
+
+def _messy_number(rng: random.Random, value: float, messiness: float) -> Any:
+    if rng.random() >= messiness:
+        return round(value, 2)
+    return rng.choice([
+        f"{value:,.2f}",
+        f"{value:.1f}",
+        f"{value / 10:.1f}%",
+        "N/A",
+        "-",
+        "",
+        None,
+        "YES",
+    ])
+
+
+def make_registry(size: int) -> Tuple[List[Dict], List[Dict]]:
+    """Real registries padded with synthetic parameters up to `size` entries."""
+    parameters = json.loads((REGISTRY_DIR / "parameters.json").read_text(encoding="utf-8"))
+    assets = json.loads((REGISTRY_DIR / "assets.json").read_text(encoding="utf-8"))
+    words = ["feed", "flow", "temp", "pressure", "level", "speed", "load", "loss", "rate", "ratio"]
+    units = ["MT", "kWh", "T/hr", "%", "degC", "bar", "KL", "m3/hr"]
+    i = 0
+    while len(parameters) < size:
+        a, b = words[i % len(words)], words[(i // len(words)) % len(words)]
+        parameters.append({
+            "name": f"synthetic_{a}_{b}_{i}",
+            "display_name": f"Synthetic {a.title()} {b.title()} {i}",
+            "unit": units[i % len(units)],
+        })
+        i += 1
+    return parameters[:size], assets
+
+
+def make_workbook(
+    rows: int,
+    cols: int,
+    sheets: int = 1,
+    messiness: float = 0.2,
+    asset_density: float = 0.5,
+    parameters: List[Dict] = (),
+    assets: List[Dict] = (),
+    seed: int = 0,
+) -> bytes:
+    """Workbook with a title row, a header row and `rows` data rows per sheet.
+
+    `messiness` is the share of values written as formatted strings, blanks or sentinels
+    and of headers written in a non-canonical spelling; `asset_density` is the share of
+    headers that carry an asset name.
+    """
+    rng = random.Random(seed)
+    wb = Workbook(write_only=True)
+    for s in range(sheets):
+        ws = wb.create_sheet(f"Sheet{s + 1}")
+        ws.append([f"Daily Report - Sheet {s + 1}"])
+        ws.append([None])
+
+        headers = ["Date"]
+        for c in range(cols - 1):
+            p = parameters[rng.randrange(len(parameters))] if parameters else {"display_name": f"Metric {c}", "unit": ""}
+            label = p.get("display_name") or p["name"]
+            if rng.random() < messiness:
+                label = label.upper().replace("CONSUMPTION", "CONSUMP").replace("GENERATION", "GEN")
+            if assets and rng.random() < asset_density:
+                label = f"{label} {rng.choice(assets)['name']}"
+            if p.get("unit"):
+                label = f"{label} ({p['unit']})"
+            headers.append(label)
+        ws.append(headers)
+
+        for r in range(rows):
+            ws.append([f"2026-{1 + r % 12:02d}-{1 + r % 28:02d}"] + [
+                _messy_number(rng, rng.uniform(0, 5000), messiness) for _ in range(cols - 1)
+            ])
+
+    buf = BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def _percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    pos = (len(ordered) - 1) * q
+    lo = int(pos)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (pos - lo)
+
+
+def _summary(samples: List[float]) -> Dict[str, float]:
+    return {
+        "p50_ms": _percentile(samples, 0.5) * 1000,
+        "p95_ms": _percentile(samples, 0.95) * 1000,
+        "mean_ms": statistics.fmean(samples) * 1000,
+    }
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    parameters, assets = make_registry(args.registry_size)
+    registry_dir = tempfile.mkdtemp(prefix="bench-registry-")
+    for name, data in (("parameters.json", parameters), ("assets.json", assets)):
+        Path(registry_dir, name).write_text(json.dumps(data), encoding="utf-8")
+    os.environ["REGISTRY_DIR"] = registry_dir
+    os.environ["MAPPING_CACHE_PATH"] = ""
+    os.environ["RESULT_CACHE_DIR"] = ""
+    os.environ.pop("GEMINI_API_KEY", None)
+
+    sys.path.insert(0, str(ROOT))
+    from app.services.cells import dump_json
+    from app.services.excel_reader import read_first_sheet
+    from app.services.header_detector import detect_header_row
+    from app.services.llm_mapper import map_columns_with_gemini
+    from app.services.mapping_cache import MappingCache
+    from app.services.pipeline import HEADER_SCAN_ROWS, _build_columns, parse_excel
+    from app.services.registry import get_registry
+    from app.services.value_parser import parse_values
+
+    file_bytes = make_workbook(
+        args.rows, args.cols, args.sheets, args.messiness, args.asset_density, parameters, assets, args.seed
+    )
+    registry = get_registry()
+
+    timings: Dict[str, List[float]] = {}
+
+    def timed(stage: str, fn: Callable[[], Any]) -> Any:
+        start = time.perf_counter()
+        out = fn()
+        timings.setdefault(stage, []).append(time.perf_counter() - start)
+        return out
+
+    for i in range(args.warmup + args.repeat):
+        if i == args.warmup:
+            timings.clear()
+        _, rows = timed("read", lambda: read_first_sheet(file_bytes))
+        header_idx, headers, _ = timed("detect_header", lambda: detect_header_row(rows[:HEADER_SCAN_ROWS]))
+        columns = timed("assets", lambda: _build_columns(headers, registry.asset_matcher))
+        timed("mapping", lambda: map_columns_with_gemini(
+            columns, registry.parameters, registry.assets, registry=registry, cache=MappingCache(path=None)
+        ))
+        data = rows[header_idx + 1 :]
+        timed("parse_values", lambda: [parse_values([r[c] if c < len(r) else None for r in data]) for c in range(len(headers))])
+        result = timed("end_to_end", lambda: parse_excel(file_bytes, compact=True))
+        timed("serialize", lambda: dump_json(result))
+
+    e2e = timings["end_to_end"]
+    return {
+        "config": {k: getattr(args, k) for k in ("rows", "cols", "sheets", "messiness", "asset_density", "registry_size", "seed")},
+        "workbook_bytes": len(file_bytes),
+        "stages": {stage: _summary(samples) for stage, samples in timings.items()},
+        "rows_per_sec": args.rows / statistics.median(e2e),
+        "cells_per_sec": args.rows * args.cols / statistics.median(e2e),
+        "peak_rss_mb": _peak_rss_mb(),
+        "python": sys.version.split()[0],
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Return one message per stage whose p50 is more than `tolerance` slower than the baseline."""
+    if current["config"] != baseline["config"]:
+        return [f"Baseline config {baseline['config']} differs from this run's {current['config']}."]
+    regressions = []
+    for stage, stats in current["stages"].items():
+        base = baseline["stages"].get(stage)
+        if base is None or base["p50_ms"] <= 0:
+            continue
+        change = stats["p50_ms"] / base["p50_ms"] - 1.0
+        if change > tolerance:
+            regressions.append(f"{stage}: p50 {base['p50_ms']:.1f} ms -> {stats['p50_ms']:.1f} ms (+{change:.0%})")
+    return regressions
+
+
+def _print_report(report: Dict[str, Any]) -> None:
+    cfg = report["config"]
+    print(f"{cfg['rows']} rows x {cfg['cols']} cols x {cfg['sheets']} sheet(s), {report['workbook_bytes'] / 1024:.0f} KiB")
+    print(f"{'stage':<15}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}")
+    for stage, s in report["stages"].items():
+        print(f"{stage:<15}{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}{s['mean_ms']:>10.1f}")
+    print(f"rows/sec: {report['rows_per_sec']:,.0f}  cells/sec: {report['cells_per_sec']:,.0f}  peak RSS: {report['peak_rss_mb']:.0f} MiB")
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, default=5000)
+    ap.add_argument("--cols", type=int, default=10)
+    ap.add_argument("--sheets", type=int, default=1)
+    ap.add_argument("--messiness", type=float, default=0.2)
+    ap.add_argument("--asset-density", type=float, default=0.5)
+    ap.add_argument("--registry-size", type=int, default=100)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--warmup", type=int, default=1)
+    ap.add_argument("--save", type=Path, help="write the report as a baseline JSON file")
+    ap.add_argument("--compare", type=Path, help="baseline JSON to check this run against")
+    ap.add_argument("--tolerance", type=float, default=0.15, help="allowed p50 slowdown per stage (0.15 = 15%%)")
+    args = ap.parse_args()
+
+    report = run(args)
+    _print_report(report)
+
+    if args.save:
+        args.save.parent.mkdir(parents=True, exist_ok=True)
+        args.save.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"Saved baseline: {args.save}")
+
+    if args.compare:
+        regressions = compare(report, json.loads(args.compare.read_text(encoding="utf-8")), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+        print(f"No stage slower than baseline by more than {args.tolerance:.0%}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,19 @@
+import pytest
+
+from app.services import incremental, mapping_cache, result_cache, templates
+
+
+@pytest.fixture(autouse=True)
+def _isolated_stores(tmp_path, monkeypatch):
+    """Every test gets fresh caches and stores under its own tmp_path, so nothing is read from or
+    written to a shared location and no test sees what another one learned."""
+    monkeypatch.setenv("CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("MAPPING_CACHE_PATH", "")
+    monkeypatch.setenv("RESULT_CACHE_DIR", str(tmp_path / "results"))
+    monkeypatch.setenv("JOBS_DIR", str(tmp_path / "jobs"))
+    monkeypatch.setenv("INCREMENTAL_STORE_PATH", str(tmp_path / "incremental.sqlite3"))
+    monkeypatch.setenv("TEMPLATE_STORE_PATH", str(tmp_path / "templates.sqlite3"))
+    monkeypatch.setattr(mapping_cache, "_default_cache", None)
+    monkeypatch.setattr(result_cache, "_default_cache", None)
+    monkeypatch.setattr(incremental, "_default_store", None)
+    monkeypatch.setattr(templates, "_default_store", None)
@@ -0,0 +1,36 @@
+import json
+from pathlib import Path
+
+from app.services.asset_matcher import AssetMatcher, build_asset_aliases, extract_asset_from_header
+
+
+ASSETS = json.loads((Path(__file__).resolve().parents[1] / "app" / "registries" / "assets.json").read_text())
+
+
+def test_matches_registry_aliases():
+    matcher = AssetMatcher(build_asset_aliases(ASSETS))
+    assert matcher.match_many([
+        "Coal Consump (AFBC Boiler 1)",
+        "Pwr Gen (TG1)",
+        "Steam Gen T/hr (AFBC-1)",
+        "Production Output VSF",
+        "Date",
+    ]) == ["AFBC-1", "TG-1", "AFBC-1", "VSF", None]
+
+
+def test_respects_word_boundaries():
+    matcher = AssetMatcher(build_asset_aliases([{"name": "TG-1"}, {"name": "TG-10"}]))
+    assert matcher.match("Power TG10") == "TG-10"
+    assert matcher.match("Power TG1") == "TG-1"
+    assert matcher.match("Power XTG1") is None
+
+
+def test_longest_alias_wins():
+    matcher = AssetMatcher({"afbc": "AFBC", "afbc boiler 1": "AFBC-1"})
+    assert matcher.match("Steam AFBC Boiler 1") == "AFBC-1"
+
+
+def test_extract_asset_from_header_uses_the_given_matcher():
+    matcher = AssetMatcher(build_asset_aliases(ASSETS))
+    assert extract_asset_from_header("Kiln 1 temp", matcher) == ("KILN-1", "Kiln 1 temp")
+    assert extract_asset_from_header("Ambient temp", matcher) == (None, "Ambient temp")
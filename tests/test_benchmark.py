@@ -0,0 +1,21 @@
+from scripts.benchmark import compare, make_registry, make_workbook
+
+from app.services.pipeline import parse_excel
+
+
+def test_generated_workbook_parses():
+    parameters, assets = make_registry(50)
+    file_bytes = make_workbook(40, 6, messiness=0.5, parameters=parameters, assets=assets, seed=1)
+    result = parse_excel(file_bytes)
+
+    assert len(parameters) == 50
+    assert result.status == "success" and result.header_row == 3
+    assert result.meta["rows"] == 43 and result.meta["cols"] == 6
+
+
+def test_compare_flags_slower_stages():
+    config = {"rows": 1}
+    baseline = {"config": config, "stages": {"read": {"p50_ms": 10.0}, "serialize": {"p50_ms": 2.0}}}
+    current = {"config": config, "stages": {"read": {"p50_ms": 10.5}, "serialize": {"p50_ms": 3.0}}}
+
+    assert [r.split(":")[0] for r in compare(current, baseline, 0.15)] == ["serialize"]
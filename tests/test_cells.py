@@ -0,0 +1,61 @@
+import json
+import pickle
+from io import BytesIO
+
+from openpyxl import Workbook
+
+from app.services import cells
+from app.services.cells import dump_json, iter_cells
+from app.services.pipeline import parse_excel, parse_workbook
+
+
+def _workbook_bytes(sheets=("Log",)):
+    wb = Workbook()
+    wb.active.title = sheets[0]
+    for name in sheets[1:]:
+        wb.create_sheet(name)
+    for name in sheets:
+        ws = wb[name]
+        ws.append(["Date", "Coal Consumption (MT)", "Power Generation (MWh)"])
+        for i in range(60):
+            ws.append([f"2026-02-{i % 28 + 1:02d}", "N/A" if i % 9 == 0 else f"{i},000", i * 1.5])
+    buf = BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def test_large_results_are_encoded_from_the_compact_table(monkeypatch):
+    file_bytes = _workbook_bytes()
+    full = parse_excel(file_bytes)
+    monkeypatch.setattr(cells, "COMPACT_MIN_CELLS", 50)
+    compact = parse_excel(file_bytes, compact=True)
+
+    assert len(full.parsed_data) == 120 and compact.parsed_data == []
+    assert list(iter_cells(compact)) == full.parsed_data
+    assert dump_json(compact) == dump_json(full) == full.model_dump_json().encode("utf-8")
+    assert dump_json(pickle.loads(pickle.dumps(compact))) == dump_json(full)
+
+
+def test_nested_sheets_splice_their_own_cells(monkeypatch):
+    file_bytes = _workbook_bytes(("Unit1", "Unit2"))
+    expected = json.loads(parse_workbook(file_bytes).model_dump_json())
+    monkeypatch.setattr(cells, "COMPACT_MIN_CELLS", 1)
+    result = parse_workbook(file_bytes, compact=True)
+
+    assert all(s._cells is not None for s in result.sheets)
+    assert json.loads(dump_json(result))["sheets"] == expected["sheets"]
+
+
+def test_parsed_data_is_complete_above_the_compact_threshold():
+    wb = Workbook()
+    wb.active.append(["Date", "Coal Consumption (MT)", "Power Generation (MWh)"])
+    rows = -(-cells.COMPACT_MIN_CELLS // 2)
+    for i in range(rows):
+        wb.active.append([f"day {i}", i, i * 1.5])
+    buf = BytesIO()
+    wb.save(buf)
+    result = parse_excel(buf.getvalue())
+
+    assert result._cells is None and len(result.parsed_data) == 2 * rows >= cells.COMPACT_MIN_CELLS
+    assert result.parsed_data[-1].row == rows + 1 and result.parsed_data[-1].parsed_value == (rows - 1) * 1.5
+    assert result.model_dump_json().encode("utf-8") == dump_json(parse_excel(buf.getvalue(), compact=True))
@@ -0,0 +1,35 @@
+import asyncio
+
+import pytest
+
+from app.services.executor import ExecutorBusy, ParseExecutor
+from app.services.pipeline import parse_excel, parse_excel_async
+
+
+def test_admit_rejects_beyond_capacity():
+    executor = ParseExecutor(max_workers=1, max_queue=1)
+    with executor.admit(), executor.admit():
+        with pytest.raises(ExecutorBusy):
+            with executor.admit():
+                pass
+    assert executor.active == 0
+    executor.shutdown()
+
+
+def test_auto_mode_routes_large_uploads_to_processes():
+    executor = ParseExecutor(mode="auto", process_threshold_bytes=1000)
+    assert not executor.use_processes(999)
+    assert executor.use_processes(1000)
+    executor.shutdown()
+
+
+@pytest.mark.parametrize("mode", ["thread", "process"])
+def test_async_parse_matches_sync(mode):
+    file_bytes = open("sample_files/multi_asset.xlsx", "rb").read()
+    executor = ParseExecutor(mode=mode, max_workers=2)
+    try:
+        result = asyncio.run(parse_excel_async(file_bytes, executor))
+    finally:
+        executor.shutdown()
+    assert result.status == "success"
+    assert result.parsed_data == parse_excel(file_bytes).parsed_data
@@ -0,0 +1,87 @@
+import csv
+import io
+import json
+import zipfile
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+from app.services import export
+from app.services.export import ExportUnavailable, export_archive, export_excel
+from app.services.pipeline import parse_excel
+
+
+SAMPLE = "sample_files/multi_asset.xlsx"
+
+
+def _read_csv(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.reader(f))
+
+
+def _num(text):
+    return float(text) if text else None
+
+
+def test_long_csv_matches_parsed_cells(tmp_path, monkeypatch):
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    expected = parse_excel(SAMPLE)
+    sidecar = export_excel(SAMPLE, str(tmp_path / "out.csv"))
+    rows = _read_csv(tmp_path / "out.csv")
+
+    assert sidecar.status == "success" and sidecar.rows_written == len(expected.parsed_data)
+    assert rows[0] == [c.name for c in sidecar.columns] == list(expected.parsed_data[0].model_dump())
+    assert [(int(r[0]), int(r[1]), r[2], _num(r[5]), r[6]) for r in rows[1:]] == [
+        (c.row, c.col, c.param_name, c.parsed_value, c.confidence) for c in expected.parsed_data
+    ]
+    assert sidecar.unmapped_columns == expected.unmapped_columns and sidecar.warnings == expected.warnings
+
+
+def test_wide_csv_has_a_float_column_per_mapping(tmp_path, monkeypatch):
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    expected = parse_excel(SAMPLE)
+    sidecar = export_excel(SAMPLE, str(tmp_path / "out.csv"), layout="wide")
+    header, *rows = _read_csv(tmp_path / "out.csv")
+
+    mapped = [c for c in sidecar.columns if c.col is not None]
+    assert header[0] == "row" and header[1:] == [c.name for c in mapped]
+    assert all(c.type == "float" and c.name.startswith(c.param_name) for c in mapped)
+    by_cell = {(c.row, c.col): c.parsed_value for c in expected.parsed_data}
+    assert sidecar.rows_written == len(rows) == len({c.row for c in expected.parsed_data})
+    assert all(_num(v) == by_cell[(int(r[0]), c.col)] for r in rows for c, v in zip(mapped, r[1:]))
+
+
+def test_archive_and_api_return_the_table_with_its_sidecar(tmp_path, monkeypatch):
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    archive, sidecar = export_archive(SAMPLE, str(tmp_path), "messy", "csv", "wide")
+    with zipfile.ZipFile(archive) as z:
+        assert sorted(z.namelist()) == ["messy.csv", "messy.sidecar.json"]
+        assert json.loads(z.read("messy.sidecar.json")) == sidecar.model_dump(mode="json")
+        table = z.read("messy.csv")
+
+    upload = {"file": ("multi_asset.xlsx", open(SAMPLE, "rb").read())}
+    with TestClient(main.app) as client:
+        response = client.post("/parse?export=csv&layout=wide", files=upload)
+        rejected = client.post("/parse?export=csv&all_sheets=true", files=upload)
+    assert response.status_code == 200 and response.headers["content-type"] == "application/zip"
+    with zipfile.ZipFile(io.BytesIO(response.content)) as z:
+        assert z.read("multi_asset.csv") == table
+        assert json.loads(z.read("multi_asset.sidecar.json"))["columns"] == sidecar.model_dump(mode="json")["columns"]
+    assert rejected.status_code == 400
+
+
+def test_arrow_formats_need_pyarrow(tmp_path, monkeypatch):
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        with pytest.raises(ExportUnavailable):
+            export_excel(SAMPLE, str(tmp_path / "out.parquet"), "parquet")
+        return
+    pq = pytest.importorskip("pyarrow.parquet")
+    monkeypatch.setattr(export, "EXPORT_ROW_GROUP_ROWS", 4)
+    sidecar = export_excel(SAMPLE, str(tmp_path / "out.parquet"), "parquet", "wide")
+    table = pq.read_table(tmp_path / "out.parquet")
+    assert table.num_rows == sidecar.rows_written and table.column_names == [c.name for c in sidecar.columns]
+    assert pq.ParquetFile(tmp_path / "out.parquet").num_row_groups == -(-sidecar.rows_written // 4)
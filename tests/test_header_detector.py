@@ -13,3 +13,27 @@ def test_detect_header_row_skips_title():
     assert headers[0] == "Date"
     assert any("title row" in w.lower() for w in warnings)
 
+
+
+def _wide_sheet(width=2000, data_rows=40):
+    rows = [["Daily Report"] + [None] * (width - 1), [None] * width]
+    rows.append(["Date"] + [f"Param {i} (MT)" for i in range(width - 1)])
+    rows += [[f"2026-01-{d % 28 + 1:02d}"] + [float(d * i) for i in range(width - 1)] for d in range(data_rows)]
+    return rows
+
+
+def test_detect_header_row_stops_reading_once_header_dominates():
+    consumed = []
+
+    def source():
+        for row in _wide_sheet():
+            consumed.append(row)
+            yield row
+
+    idx, headers, warnings = detect_header_row(source())
+    assert idx == 2 and headers[1] == "Param 0 (MT)" and len(headers) == 2000
+    assert warnings == ["Row 1 appears to be a title row, skipped"]
+    # Title rows are checked through row 10; nothing past that is read.
+    assert len(consumed) == 10
+    assert detect_header_row(_wide_sheet(), stop_ratio=1.1) == (idx, headers, warnings)
+
@@ -0,0 +1,50 @@
+from io import BytesIO
+
+from openpyxl import Workbook
+
+from app.services import incremental
+from app.services.pipeline import parse_excel, parse_excel_incremental
+
+
+def _log_bytes(days, changed=None):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Log"
+    ws.append(["Plant Daily Log"])
+    ws.append(["Date", "Coal Consumption (MT)", "Power Generation (MWh)"])
+    for d in range(days):
+        ws.append([f"day {d}", 1 if d == changed else 1000 + d, f"{d * 1.5}"])
+    buf = BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def _use_store(monkeypatch):
+    store = incremental.IncrementalStore()
+    monkeypatch.setattr(incremental, "_default_store", store)
+    return store
+
+
+def test_growing_log_parses_only_new_rows(monkeypatch):
+    _use_store(monkeypatch)
+    first = parse_excel_incremental(_log_bytes(30), "plant-a")
+    second = parse_excel_incremental(_log_bytes(33), "plant-a")
+    third = parse_excel_incremental(_log_bytes(33), "plant-a")
+
+    assert first.meta["incremental"] == {"key": "plant-a", "resumed": False, "skipped_rows": 0, "since_row": 2}
+    assert len(first.parsed_data) == 60
+    assert second.meta["incremental"] == {"key": "plant-a", "resumed": True, "skipped_rows": 30, "since_row": 32}
+    assert second.parsed_data == [c for c in parse_excel(_log_bytes(33)).parsed_data if c.row > 32]
+    assert second.header_row == 2 and second.meta["rows"] == 35 and second.warnings == first.warnings
+    assert third.parsed_data == [] and third.meta["incremental"]["skipped_rows"] == 33
+
+
+def test_changed_rows_fall_back_to_a_full_parse(monkeypatch):
+    store = _use_store(monkeypatch)
+    parse_excel_incremental(_log_bytes(30), "plant-a")
+    result = parse_excel_incremental(_log_bytes(31, changed=4), "plant-a")
+
+    assert result.meta["incremental"]["resumed"] is False
+    assert result.warnings[-1] == "Rows 3-32 changed since the last parse; parsed the whole sheet again."
+    assert len(result.parsed_data) == 62 and store.get("plant-a").rows == 31
+    assert parse_excel_incremental(_log_bytes(30), "plant-a").warnings[-1].startswith("The sheet has fewer rows")
@@ -0,0 +1,131 @@
+import json
+import sqlite3
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+from app import main
+from app.services import jobs
+from app.services.jobs import JobQueue
+from app.services.uploads import spool_stream
+
+
+def _spool(path="sample_files/clean_data.xlsx"):
+    return spool_stream(open(path, "rb"), path.rsplit("/", 1)[-1])
+
+
+def test_queue_runs_by_priority_and_cancels_queued_jobs(tmp_path, monkeypatch):
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    queue = JobQueue(str(tmp_path), workers=1)
+    low = queue.submit(_spool(), priority=0)
+    high = queue.submit(_spool("sample_files/messy_data.xlsx"), priority=5)
+    dropped = queue.submit(_spool(), priority=9)
+    assert queue.cancel(dropped.id).status == "cancelled"
+
+    order = []
+    original = jobs.parse_excel
+    monkeypatch.setattr(jobs, "parse_excel", lambda path, *a, **kw: order.append(path) or original(path, *a, **kw))
+    queue.start()
+    done = [queue.wait(high.id), queue.wait(low.id)]
+    queue.stop()
+
+    assert [j.status for j in done] == ["succeeded", "succeeded"]
+    assert [p.rsplit("/", 1)[-1] for p in order] == [f"{high.id}.xlsx", f"{low.id}.xlsx"]
+    assert done[1].progress.rows_processed == done[1].progress.rows_total == 3
+    result = json.loads(JobQueue(str(tmp_path)).result(low.id))
+    assert result["status"] == "success" and result["parsed_data"]
+    assert sorted(p.name for p in (tmp_path / "uploads").iterdir()) == []
+
+
+def test_running_job_stops_at_next_block_when_cancelled(tmp_path, monkeypatch):
+    started, release = threading.Event(), threading.Event()
+
+    def slow_parse(path, output="cells", report_timings=False, progress=None, compact=False):
+        started.set()
+        release.wait(5)
+        progress(100)
+        raise AssertionError("progress should have raised")
+
+    monkeypatch.setattr(jobs, "parse_excel", slow_parse)
+    queue = JobQueue(str(tmp_path), workers=1).start()
+    job = queue.submit(_spool())
+    assert started.wait(5)
+    assert queue.cancel(job.id).status == "running"
+    release.set()
+    assert queue.wait(job.id).status == "cancelled"
+    queue.stop()
+
+
+def test_only_jobs_with_a_stale_heartbeat_are_requeued(tmp_path):
+    first = JobQueue(str(tmp_path))
+    alive = first.submit(_spool())
+    dead = first.submit(_spool())
+    conn = sqlite3.connect(str(tmp_path / "jobs.sqlite3"))
+    conn.execute("UPDATE jobs SET status = 'running', owner = 'other', heartbeat_at = ? WHERE id = ?", (time.time(), alive.id))
+    conn.execute("UPDATE jobs SET status = 'running', owner = 'gone', heartbeat_at = ? WHERE id = ?", (time.time() - 3600, dead.id))
+    conn.commit()
+
+    second = JobQueue(str(tmp_path))
+    assert second.get(alive.id).status == "running"
+    assert second.get(dead.id).status == "queued"
+    first.stop()
+    second.stop()
+
+
+def test_concurrent_submits_respect_the_queue_limit(tmp_path):
+    queue = JobQueue(str(tmp_path), max_queued=3)
+    outcomes = []
+
+    def submit():
+        try:
+            outcomes.append(queue.submit(_spool()).status)
+        except jobs.QueueFull:
+            outcomes.append("full")
+
+    threads = [threading.Thread(target=submit) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(outcomes) == ["full"] * 5 + ["queued"] * 3
+    assert len(list((tmp_path / "uploads").iterdir())) == 3
+    queue.stop()
+
+
+def test_finished_jobs_expire_with_their_results(tmp_path, monkeypatch):
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    queue = JobQueue(str(tmp_path), workers=1, retention=60).start()
+    old, recent = queue.submit(_spool()), queue.submit(_spool())
+    queue.wait(old.id)
+    queue.wait(recent.id)
+    with queue._lock:
+        queue._conn.execute("UPDATE jobs SET finished_at = finished_at - 120 WHERE id = ?", (old.id,))
+        queue._conn.commit()
+
+    assert queue.purge_expired() == 1
+    assert queue.get(old.id) is None and queue.result(old.id) is None
+    assert queue.get(recent.id).status == "succeeded" and queue.result(recent.id) is not None
+    queue.stop()
+
+
+def test_jobs_api(tmp_path, monkeypatch):
+    monkeypatch.setenv("JOBS_DIR", str(tmp_path))
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    upload = {"file": ("clean_data.xlsx", open("sample_files/clean_data.xlsx", "rb").read())}
+
+    with TestClient(main.app) as client:
+        submitted = client.post("/jobs?format=columnar&priority=3", files=upload)
+        job_id = submitted.json()["id"]
+        jobs.get_job_queue().wait(job_id)
+        info = client.get(f"/jobs/{job_id}").json()
+        result = client.get(f"/jobs/{job_id}/result")
+        listed = client.get("/jobs?status=succeeded").json()
+        deleted = client.delete(f"/jobs/{job_id}")
+        missing = client.get(f"/jobs/{job_id}")
+
+    assert submitted.status_code == 202 and submitted.json()["status"] in ("queued", "running", "succeeded")
+    assert info["status"] == "succeeded" and info["priority"] == 3 and info["result"]["columns"]
+    assert result.json() == info["result"]
+    assert [j["id"] for j in listed] == [job_id]
+    assert deleted.status_code == 200 and missing.status_code == 404
@@ -0,0 +1,177 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.models.schemas import ColumnInput
+from app.services import llm_mapper
+from app.services.mapping_cache import MappingCache
+from app.services.registry import get_registry
+
+
+PARAMS = [{"name": "coal_consumption", "display_name": "Coal Consumption", "unit": "MT"}]
+ASSETS = [{"name": "AFBC-1", "display_name": "AFBC Boiler 1"}]
+COLUMNS = [ColumnInput(column_index=0, original_header="Coal (MT)", normalized_header="coal mt", unit_hint="mt")]
+LLM_ANSWER = {"mappings": [{"column_index": 0, "param_name": "coal_consumption", "asset_name": None, "confidence": "high", "reason": "stub"}]}
+
+
+class StubLLM:
+    """Local stand-in for the Gemini generateContent endpoint."""
+
+    def __init__(self):
+        self.behaviour = ["ok"]
+        self.answer = None  # optional callable(payload) -> answer dict, or None to fail the request
+        self.payloads = []
+        self.calls = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                prompt = request["contents"][0]["parts"][0]["text"]
+                payload = json.loads(prompt.split("USER_PAYLOAD_JSON:\n", 1)[1])
+                stub.payloads.append(payload)
+                step = stub.behaviour[min(stub.calls, len(stub.behaviour) - 1)]
+                stub.calls += 1
+                answer = stub.answer(payload) if stub.answer else LLM_ANSWER
+                if step == "slow":
+                    time.sleep(0.5)
+                if step == "error" or answer is None:
+                    self.send_response(500)
+                    self.end_headers()
+                    return
+                body = {"candidates": [{"content": {"role": "model", "parts": [{"text": json.dumps(answer)}]}}]}
+                data = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                try:
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    server = StubLLM()
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    monkeypatch.setenv("GEMINI_BASE_URL", server.url)
+    monkeypatch.setattr(llm_mapper, "GEMINI_TIMEOUT_S", 0.2)
+    monkeypatch.setattr(llm_mapper, "GEMINI_RETRY_BACKOFF_S", 0.0)
+    llm_mapper.reset_clients()
+    yield server
+    server.server.shutdown()
+    llm_mapper.reset_clients()
+
+
+def test_sync_mapping_uses_stub(stub):
+    mappings, warnings = llm_mapper.map_columns_with_gemini(COLUMNS, PARAMS, ASSETS, cache=MappingCache())
+    assert mappings[0].param_name == "coal_consumption" and mappings[0].reason == "stub"
+    assert warnings == [] and stub.calls == 1
+
+
+def test_async_retries_then_succeeds(stub):
+    stub.behaviour = ["error", "ok"]
+    mappings, warnings = asyncio.run(llm_mapper.map_columns_with_gemini_async(COLUMNS, PARAMS, ASSETS, cache=MappingCache()))
+    assert mappings[0].reason == "stub" and warnings == []
+    assert stub.calls == 2
+
+
+def test_async_timeout_falls_back(stub):
+    stub.behaviour = ["slow"]
+    mappings, warnings = asyncio.run(llm_mapper.map_columns_with_gemini_async(COLUMNS, PARAMS, ASSETS, cache=MappingCache()))
+    assert mappings[0].reason.startswith("fallback")
+    assert any("fallback" in w for w in warnings)
+    assert stub.calls == llm_mapper.GEMINI_MAX_RETRIES + 1
+
+
+def test_async_calls_run_concurrently(stub, monkeypatch):
+    stub.behaviour = ["slow"]
+
+    async def run_many():
+        return await asyncio.gather(*[
+            llm_mapper.map_columns_with_gemini_async(COLUMNS, PARAMS, ASSETS, cache=MappingCache()) for _ in range(4)
+        ])
+
+    monkeypatch.setattr(llm_mapper, "GEMINI_TIMEOUT_S", 2.0)
+    started = time.perf_counter()
+    results = asyncio.run(run_many())
+    assert all(m[0].reason == "stub" for m, _ in results)
+    assert time.perf_counter() - started < 1.5
+
+
+def test_async_fallback_runs_off_the_event_loop(monkeypatch):
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    threads = []
+    original = llm_mapper._fallback_map
+    monkeypatch.setattr(llm_mapper, "_fallback_map", lambda *a: threads.append(threading.get_ident()) or original(*a))
+
+    async def run():
+        return threading.get_ident(), await llm_mapper.map_columns_with_gemini_async(COLUMNS, PARAMS, ASSETS, cache=MappingCache())
+
+    loop_thread, (mappings, warnings) = asyncio.run(run())
+    assert mappings[0].reason.startswith("fallback") and warnings[0].startswith(llm_mapper.NO_API_KEY_WARNING)
+    assert threads and loop_thread not in threads
+
+
+def test_wide_sheets_are_mapped_in_filtered_batches_with_per_batch_fallback(stub, monkeypatch):
+    monkeypatch.setattr(llm_mapper, "MAPPING_FULL_REGISTRY_MAX", 50)
+    monkeypatch.setattr(llm_mapper, "GEMINI_MAX_RETRIES", 0)
+    units = ["MT", "kWh", "%", "T/hr"]
+    params = [{"name": f"param_{i}", "display_name": f"Param {i} Reading", "unit": units[i % 4]} for i in range(300)]
+    columns = [
+        ColumnInput(column_index=i, original_header=f"Param {i} Reading", normalized_header=f"param {i} reading")
+        for i in range(100)
+    ]
+
+    def answer(payload):
+        indexes = [c["column_index"] for c in payload["columns"]]
+        if 50 in indexes:
+            return None
+        offered = {p["name"] for p in payload["parameter_registry"]}
+        return {"mappings": [
+            {"column_index": i, "param_name": f"param_{i}" if f"param_{i}" in offered else None,
+             "asset_name": None, "confidence": "high", "reason": "stub"}
+            for i in indexes + [999]
+        ]}
+
+    stub.answer = answer
+    mappings, warnings = llm_mapper.map_columns_with_gemini(columns, params, ASSETS, cache=MappingCache())
+
+    assert stub.calls == 3
+    assert all(len(p["parameter_registry"]) < 300 for p in stub.payloads)
+    assert [m.column_index for m in mappings] == list(range(100))
+    by_col = {m.column_index: m for m in mappings}
+    assert all(by_col[i].reason == "stub" and by_col[i].param_name == f"param_{i}" for i in list(range(40)) + list(range(80, 100)))
+    assert all(by_col[i].reason.startswith("fallback") for i in range(40, 80))
+    assert len(warnings) == 1 and warnings[0].startswith(f"{llm_mapper.MAPPING_FAILED_WARNING} for columns 40-79")
+
+    async_mappings, async_warnings = asyncio.run(
+        llm_mapper.map_columns_with_gemini_async(columns, params, ASSETS, cache=MappingCache())
+    )
+    assert async_mappings == mappings and async_warnings == warnings
+
+
+def test_mapping_uses_the_current_registry_snapshot(monkeypatch):
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    current = get_registry()
+    assert llm_mapper._snapshot_for(list(current.parameters), list(current.assets)) is current
+
+    indexes = []
+    original = llm_mapper._fallback_map
+    monkeypatch.setattr(llm_mapper, "_fallback_map", lambda columns, index: indexes.append(index) or original(columns, index))
+    llm_mapper.map_columns_with_gemini(COLUMNS, current.parameters, current.assets, cache=MappingCache())
+    llm_mapper.map_columns_with_gemini(COLUMNS, PARAMS, ASSETS, cache=MappingCache())
+    assert indexes[0] is current.param_index and indexes[1] is not current.param_index
+    assert indexes[1].best_match("coal consumption")[0] == "coal_consumption"
@@ -0,0 +1,59 @@
+import time
+
+from app.models.schemas import ColumnInput, ColumnMapping
+from app.services import llm_mapper
+from app.services.mapping_cache import MappingCache, mapping_cache_key
+from app.services.registry import registry_fingerprint
+
+
+PARAMS = [{"name": "coal_consumption", "display_name": "Coal Consumption", "unit": "MT"}]
+ASSETS = [{"name": "AFBC-1", "display_name": "AFBC Boiler 1"}]
+
+
+def _columns(asset_hint=None):
+    return [ColumnInput(column_index=0, original_header="Coal (MT)", normalized_header="coal mt", unit_hint="mt", asset_hint=asset_hint)]
+
+
+def _mapping():
+    return [ColumnMapping(column_index=0, param_name="coal_consumption", asset_name="AFBC-1", confidence="high", reason="llm")]
+
+
+def test_key_depends_on_hints_and_registry():
+    version = registry_fingerprint(PARAMS, ASSETS)
+    key = mapping_cache_key(_columns(), version, "m")
+    assert key == mapping_cache_key(_columns(), version, "m")
+    assert key != mapping_cache_key(_columns("AFBC-1"), version, "m")
+    assert key != mapping_cache_key(_columns(), registry_fingerprint(PARAMS, []), "m")
+
+
+def test_disk_tier_survives_new_instance(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    MappingCache(path).put("k", _mapping())
+    assert MappingCache(path).get("k") == _mapping()
+
+
+def test_ttl_expires_entries():
+    cache = MappingCache(ttl_seconds=0.01)
+    cache.put("k", _mapping())
+    time.sleep(0.02)
+    assert cache.get("k") is None
+
+
+def test_lru_evicts_oldest():
+    cache = MappingCache(max_entries=2)
+    for key in ("a", "b", "a", "c"):
+        if cache.get(key) is None:
+            cache.put(key, _mapping())
+    assert cache.get("b") is None and cache.get("a") is not None
+
+
+def test_repeated_template_skips_llm(monkeypatch):
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    cache = MappingCache()
+    key = mapping_cache_key(_columns(), registry_fingerprint(PARAMS, ASSETS), "gemini-2.5-flash-lite")
+    cache.put(key, _mapping())
+
+    stats = {}
+    mappings, warnings = llm_mapper.map_columns_with_gemini(_columns(), PARAMS, ASSETS, cache=cache, stats=stats)
+    assert mappings == _mapping() and warnings == []
+    assert stats == {"hits": 1}
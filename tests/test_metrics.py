@@ -0,0 +1,78 @@
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+from app import main
+from app.main import app
+from app.services.metrics import MetricsRegistry, SamplingProfiler, StageTimings
+from app.services.pipeline import parse_excel
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry()
+    hist = registry.histogram("demo_seconds", "Demo.", ["stage"], buckets=(0.1, 1.0))
+    for v in (0.05, 0.5, 0.7, 3.0):
+        hist.observe(v, stage="read")
+    text = registry.render()
+
+    assert 'demo_seconds_bucket{stage="read",le="0.1"} 1' in text
+    assert 'demo_seconds_bucket{stage="read",le="1"} 3' in text
+    assert 'demo_seconds_bucket{stage="read",le="+Inf"} 4' in text
+    assert 'demo_seconds_count{stage="read"} 4' in text
+
+
+def test_parse_excel_reports_stage_timings():
+    file_bytes = open("sample_files/messy_data.xlsx", "rb").read()
+    result = parse_excel(file_bytes, report_timings=True)
+    timings = result.meta["timings"]
+
+    assert {"open_sheet", "detect_header", "assets", "mapping", "read_rows", "parse_values", "build_cells"} <= set(timings)
+    assert timings["build_cells"]["cells"] == len(result.parsed_data)
+    assert timings["read_rows"]["rows"] == 3
+    assert "timings" not in parse_excel(file_bytes).meta
+
+
+def test_stage_accumulates_across_calls():
+    timings = StageTimings()
+    for _ in range(3):
+        with timings.stage("work", rows=2):
+            time.sleep(0.001)
+    assert timings.stages["work"]["calls"] == 3 and timings.stages["work"]["rows"] == 6
+    assert timings.stages["work"]["wall_ms"] >= 3
+
+
+def _spin(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        sum(range(1000))
+
+
+def test_sampling_profiler_sees_only_attached_threads():
+    profiler = SamplingProfiler(interval=0.001).start()
+    other = threading.Thread(target=_spin, args=(0.1,))
+    other.start()
+    with profiler.attach():
+        _spin(0.05)
+    profiler.stop()
+    other.join()
+    report = profiler.report()
+    assert report["samples"] > 0
+    assert all("test_sampling_profiler_sees_only_attached_threads" in s["stack"] for s in report["top"])
+
+
+def test_metrics_endpoint_and_request_options(tmp_path, monkeypatch):
+    monkeypatch.setenv("RESULT_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(main, "PROFILING_ENABLED", True)
+    upload = {"file": ("clean_data.xlsx", open("sample_files/clean_data.xlsx", "rb").read())}
+    with TestClient(app) as client:
+        timed = client.post("/parse?timings=true", files=upload)
+        profiled = client.post("/parse", files=upload, headers={"X-Profile": "1"})
+        monkeypatch.setattr(main, "PROFILING_ENABLED", False)
+        unprofiled = client.post("/parse", files=upload, headers={"X-Profile": "1"})
+        text = client.get("/metrics").text
+
+    assert "parse_values" in timed.json()["meta"]["timings"] and "etag" not in timed.headers
+    assert "profile" in profiled.json()["meta"] and "profile" not in unprofiled.json()["meta"]
+    assert 'parse_stage_seconds_count{stage="parse_values"}' in text
+    assert 'http_requests_total{method="POST",route="/parse",status="200"}' in text
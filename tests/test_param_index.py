@@ -0,0 +1,37 @@
+from difflib import SequenceMatcher
+
+from app.services.param_index import ParameterIndex
+from app.services.utils import normalize_text
+
+
+def _brute_force(header, parameters):
+    best_name, best_score = None, 0.0
+    for p in parameters:
+        blob = normalize_text(f"{p['name']} {p.get('display_name', '')} {p.get('unit', '')}")
+        score = SequenceMatcher(None, header, blob).ratio()
+        if score > best_score:
+            best_name, best_score = p["name"], score
+    return best_name, best_score
+
+
+def _registry(n):
+    words = ["coal", "steam", "power", "water", "boiler", "turbine", "kiln", "feed", "pump", "ash", "heat", "fan"]
+    out = []
+    for i in range(n):
+        a, b = words[i % len(words)], words[(i * 7 + 3) % len(words)]
+        out.append({"name": f"{a}_{b}_{i}", "display_name": f"{a.title()} {b.title()} {i}", "unit": "MT"})
+    return out
+
+
+def test_small_registry_matches_full_scan():
+    params = _registry(30)
+    index = ParameterIndex(params)
+    headers = [normalize_text(h) for h in ["Coal Steam 0 (MT)", "Pump Fan", "", "zzz"]]
+    assert index.best_matches(headers) == [_brute_force(h, params) for h in headers]
+
+
+def test_shortlist_finds_best_score_in_large_registry():
+    params = _registry(1500)
+    index = ParameterIndex(params, shortlist=20)
+    headers = [normalize_text(f"{p['display_name']} ({p['unit']})") for p in params[::149]]
+    assert [s for _, s in index.best_matches(headers)] == [s for _, s in (_brute_force(h, params) for h in headers)]
@@ -0,0 +1,141 @@
+from io import BytesIO
+
+import pytest
+from openpyxl import Workbook
+from openpyxl.chart import BarChart, Reference
+
+from app.services.pipeline import parse_excel, stream_parse_excel
+
+
+def _workbook_bytes(rows):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Log"
+    for r in rows:
+        ws.append(r)
+    buf = BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def test_stream_parse_yields_rows_lazily():
+    data = [["Daily Log"], [None], ["Date", "Coal Consumption (MT)", "Power Generation (MWh)"]]
+    data += [[f"2026-02-{d:02d}", 1000 + d, "85.2"] for d in range(1, 29)]
+    stream = stream_parse_excel(_workbook_bytes(data))
+
+    assert stream.header_row == 3
+    first = next(stream.iter_rows())
+    assert [c.param_name for c in first] == ["coal_consumption", "power_generation"]
+    assert first[0].row == 4 and first[0].parsed_value == 1001.0
+
+
+def test_stream_matches_parse_excel():
+    data = [["Date", "Coal Consumption (MT)", "Power Generation (MWh)"]]
+    data += [[f"row{i}", str(i), "N/A" if i % 7 == 0 else i * 1.5] for i in range(100)]
+    data += [[None, None, None], ["tail", "1,234", "45%"]]
+    file_bytes = _workbook_bytes(data)
+
+    stream = stream_parse_excel(file_bytes)
+    streamed = [c for cells in stream.iter_rows() for c in cells]
+    result = parse_excel(file_bytes)
+
+    assert result.status == "success"
+    assert streamed == result.parsed_data
+    assert stream.meta == result.meta
+    assert result.meta["rows"] == 103 and result.meta["cols"] == 3
+
+
+def test_parse_workbook_returns_one_result_per_sheet(monkeypatch):
+    wb = Workbook()
+    wb.active.title = "Unit1"
+    for name in ("Unit2", "Notes"):
+        wb.create_sheet(name)
+    for name in ("Unit1", "Unit2"):
+        ws = wb[name]
+        ws.append(["Date", "Coal Consumption (MT)"])
+        ws.append(["2026-02-20", "1,200"])
+    buf = BytesIO()
+    wb.save(buf)
+
+    calls = []
+    from app.services import pipeline
+    real = pipeline.map_columns_with_gemini
+    monkeypatch.setattr(pipeline, "map_columns_with_gemini", lambda *a, **k: calls.append(1) or real(*a, **k))
+
+    result = pipeline.parse_workbook(buf.getvalue())
+    assert result.status == "success"
+    assert [s.meta.get("sheet") for s in result.sheets] == ["Unit1", "Unit2", "Notes"]
+    assert [s.status for s in result.sheets] == ["success", "success", "error"]
+    assert result.sheets[1].parsed_data[0].parsed_value == 1200.0
+    assert len(calls) == 1
+
+
+def test_columnar_output_matches_cells(monkeypatch):
+    from app.models.schemas import ColumnMapping
+    from app.services import pipeline
+
+    def high_confidence(columns, *args, **kwargs):
+        params = {1: "coal_consumption", 2: "power_generation"}
+        return [ColumnMapping(column_index=c.column_index, param_name=params.get(c.column_index),
+                              confidence="high", reason="test") for c in columns], []
+
+    monkeypatch.setattr(pipeline, "map_columns_with_gemini", high_confidence)
+    data = [["Date", "Coal Consumption (MT)", "Power Generation (MWh)"]]
+    data += [["d1", "1,200", "85"], ["d2", "bad", "86"], ["d3", None, "87"]]
+    file_bytes = _workbook_bytes(data)
+
+    cells = parse_excel(file_bytes)
+    columnar = parse_excel(file_bytes, output="columnar")
+
+    assert columnar.status == "success"
+    coal = columnar.columns[0]
+    assert (coal.param_name, coal.header, coal.rows) == ("coal_consumption", "Coal Consumption (MT)", [2, 3, 4])
+    assert coal.parsed_values == [1200.0, None, None]
+    rebuilt = sorted((r, col.col, v) for col in columnar.columns for r, v in zip(col.rows, col.parsed_values))
+    assert rebuilt == sorted((c.row, c.col, c.parsed_value) for c in cells.parsed_data)
+    downgraded = [(c.row, c.col, c.confidence) for c in cells.parsed_data if c.confidence != "high"]
+    assert [(e.row, e.col, e.confidence) for e in columnar.exceptions] == downgraded == [(3, 1, "medium")]
+
+
+def test_parse_batch_maps_distinct_columns_once(monkeypatch):
+    from app.services import pipeline
+    real = pipeline.map_columns_with_gemini
+    calls = []
+
+    def counting(columns, *args, **kwargs):
+        calls.append([c.original_header for c in columns])
+        return real(columns, *args, **kwargs)
+
+    monkeypatch.setattr(pipeline, "map_columns_with_gemini", counting)
+
+    a = _workbook_bytes([["Date", "Coal Consumption (MT)"], ["d1", "1,200"]])
+    b = _workbook_bytes([["Notes"], ["Date", "Power Generation (MWh)", "Coal Consumption (MT)"], ["d1", 85, 900]])
+    files = [("a.xlsx", a), ("broken.xlsx", b"not a workbook"), ("b.xlsx", b)]
+    result = pipeline.parse_batch(files, max_workers=2)
+
+    assert calls == [["Date", "Coal Consumption (MT)", "Power Generation (MWh)"]]
+    assert [f.filename for f in result.files] == ["a.xlsx", "broken.xlsx", "b.xlsx"]
+    assert [f.result.status for f in result.files] == ["success", "error", "success"]
+    assert result.meta["unique_columns"] == 3 and result.meta["mapping_calls"] == 1
+    for f, single in ((result.files[0], a), (result.files[2], b)):
+        assert f.result.parsed_data == parse_excel(single).parsed_data
+
+
+@pytest.mark.parametrize("backend", ["fast", "openpyxl"])
+def test_parse_workbook_skips_chartsheets(backend, monkeypatch):
+    monkeypatch.setenv("EXCEL_READER_BACKEND", backend)
+    wb = Workbook()
+    wb.remove(wb.active)
+    chart_sheet = wb.create_chartsheet("Chart")
+    ws = wb.create_sheet("Data")
+    ws.append(["Date", "Coal Consumption (MT)"])
+    ws.append(["2026-02-20", "1,200"])
+    chart = BarChart()
+    chart.add_data(Reference(ws, min_col=2, min_row=1, max_row=2), titles_from_data=True)
+    chart_sheet.add_chart(chart)
+    buf = BytesIO()
+    wb.save(buf)
+
+    from app.services import pipeline
+    result = pipeline.parse_workbook(buf.getvalue())
+    assert [(s.status, s.meta.get("sheet")) for s in result.sheets] == [("success", "Data")]
@@ -0,0 +1,45 @@
+import json
+import os
+
+from app.services.registry import RegistryService
+
+
+def _write(directory, params, assets):
+    (directory / "parameters.json").write_text(json.dumps(params))
+    (directory / "assets.json").write_text(json.dumps(assets))
+
+
+def _bump_mtime(path):
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+
+def test_snapshot_is_precomputed_and_reused(tmp_path):
+    _write(tmp_path, [{"name": "coal_consumption", "display_name": "Coal Consumption", "unit": "MT"}], [{"name": "TG-1"}])
+    service = RegistryService(str(tmp_path), check_interval=60)
+    snapshot = service.get()
+    assert snapshot.param_names == {"coal_consumption"}
+    assert snapshot.asset_matcher.match("Power TG1") == "TG-1"
+    assert snapshot.param_index.best_match("coal consumption mt")[0] == "coal_consumption"
+    assert service.get() is snapshot
+
+
+def test_changed_files_swap_in_new_snapshot(tmp_path):
+    _write(tmp_path, [{"name": "a"}], [])
+    service = RegistryService(str(tmp_path), check_interval=0)
+    first = service.get()
+
+    _write(tmp_path, [{"name": "a"}, {"name": "b"}], [])
+    _bump_mtime(tmp_path / "parameters.json")
+    second = service.get()
+    assert second.param_names == {"a", "b"} and second.version != first.version
+
+
+def test_broken_file_keeps_previous_snapshot(tmp_path):
+    _write(tmp_path, [{"name": "a"}], [])
+    service = RegistryService(str(tmp_path), check_interval=0)
+    first = service.get()
+
+    (tmp_path / "parameters.json").write_text("[{")
+    _bump_mtime(tmp_path / "parameters.json")
+    assert service.get() is first
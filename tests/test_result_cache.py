@@ -0,0 +1,46 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+from app.services.result_cache import ResultCache
+
+
+def test_result_cache_evicts_least_recently_used(tmp_path):
+    cache = ResultCache(str(tmp_path), max_bytes=25)
+    cache.put("a", b"x" * 10)
+    cache.put("b", b"y" * 10)
+    assert cache.get("a") == b"x" * 10
+    cache.put("c", b"z" * 10)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert ResultCache(str(tmp_path), max_bytes=25).get("c") == b"z" * 10
+
+
+def test_parse_serves_repeats_from_cache_and_honours_etag(tmp_path, monkeypatch):
+    monkeypatch.setenv("RESULT_CACHE_DIR", str(tmp_path))
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    file_bytes = open("sample_files/clean_data.xlsx", "rb").read()
+    upload = {"file": ("clean_data.xlsx", file_bytes)}
+
+    with TestClient(main.app) as client:
+        first = client.post("/parse", files=upload)
+        etag = first.headers["etag"]
+        other_format = client.post("/parse?format=columnar", files=upload, headers={"If-None-Match": etag})
+
+        async def fail(*args, **kwargs):
+            raise AssertionError("cached upload was parsed again")
+
+        monkeypatch.setattr(main, "parse_excel_async", fail)
+        second = client.post("/parse", files=upload)
+        conditional = client.post("/parse", files=upload, headers={"If-None-Match": etag})
+
+        # Results mapped by the no-key fallback are not served once a key is configured.
+        monkeypatch.setenv("GEMINI_API_KEY", "configured")
+        with pytest.raises(AssertionError, match="parsed again"):
+            client.post("/parse", files=upload, headers={"If-None-Match": etag})
+
+    assert first.status_code == 200 and first.json()["status"] == "success"
+    assert second.content == first.content and second.headers["etag"] == etag
+    assert conditional.status_code == 304
+    assert other_format.status_code == 200 and other_format.headers["etag"] != etag
@@ -0,0 +1,48 @@
+import json
+from io import BytesIO
+import zipfile
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.pipeline import parse_excel
+
+
+def test_parse_stream_emits_header_rows_and_trailer():
+    file_bytes = open("sample_files/multi_asset.xlsx", "rb").read()
+    with TestClient(app) as client:
+        resp = client.post("/parse/stream?chunk_cells=3", files={"file": ("multi_asset.xlsx", file_bytes)})
+
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in resp.text.splitlines()]
+    assert lines[0]["type"] == "header" and lines[0]["header_row"] == 1
+    assert lines[-1]["type"] == "trailer" and lines[-1]["status"] == "success"
+
+    chunks = [line["cells"] for line in lines[1:-1]]
+    assert all(line["type"] == "rows" for line in lines[1:-1])
+    assert len(chunks) == 2
+    expected = parse_excel(file_bytes)
+    assert [cell for c in chunks for cell in c] == [cell.model_dump() for cell in expected.parsed_data]
+    assert lines[-1]["meta"] == expected.meta
+
+
+def test_parse_batch_accepts_zip_and_streams_files():
+    names = ["clean_data.xlsx", "multi_asset.xlsx"]
+    archive = BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        for name in names:
+            zf.write(f"sample_files/{name}", f"batch/{name}")
+        zf.writestr("batch/readme.txt", "ignored")
+
+    with TestClient(app) as client:
+        manifest = client.post("/parse/batch", files=[("files", ("batch.zip", archive.getvalue()))]).json()
+        streamed = client.post("/parse/batch?stream=true", files=[("files", ("batch.zip", archive.getvalue()))])
+
+    assert [f["filename"] for f in manifest["files"]] == [f"batch/{n}" for n in names]
+    assert manifest["meta"]["files"] == 2 and manifest["meta"]["mapping_calls"] == 1
+
+    lines = [json.loads(line) for line in streamed.text.splitlines()]
+    assert lines[-1]["type"] == "trailer" and lines[-1]["status"] == "success"
+    by_index = {line["index"]: line["result"] for line in lines[:-1]}
+    assert [by_index[i] for i in range(2)] == [f["result"] for f in manifest["files"]]
@@ -0,0 +1,94 @@
+from io import BytesIO
+
+from fastapi.testclient import TestClient
+from openpyxl import Workbook
+
+from app import main
+from app.services import pipeline, templates
+from app.services.pipeline import parse_excel
+
+
+def _workbook_bytes(title, header, sheet="Log"):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = sheet
+    ws.append([title])
+    ws.append([None])
+    ws.append(header)
+    ws.append(["2026-02-20", "1,200", "85.2"])
+    ws.append(["2026-02-21", "N/A", "86"])
+    buf = BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def _use_store(tmp_path, monkeypatch):
+    monkeypatch.setenv("TEMPLATE_STORE_ENABLED", "1")
+    monkeypatch.setenv("TEMPLATE_STORE_PATH", str(tmp_path / "templates.sqlite3"))
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    return templates.get_template_store()
+
+
+def _count_mapper_calls(monkeypatch):
+    calls = []
+    real = pipeline.map_columns_with_gemini
+
+    def counting(columns, *args, **kwargs):
+        calls.append([c.original_header for c in columns])
+        return real(columns, *args, **kwargs)
+
+    monkeypatch.setattr(pipeline, "map_columns_with_gemini", counting)
+    return calls
+
+
+def test_known_layout_skips_detection_and_mapping(tmp_path, monkeypatch):
+    _use_store(tmp_path, monkeypatch)
+    calls = _count_mapper_calls(monkeypatch)
+    header = ["Date", "Coal Consumption (MT)", "Power Generation (MWh)"]
+
+    first = parse_excel(_workbook_bytes("Daily Report 2026-02-20", header), report_timings=True)
+    second = parse_excel(_workbook_bytes("Daily Report 2026-02-21", header), report_timings=True)
+
+    assert len(calls) == 1
+    assert first.meta["template_id"] == second.meta["template_id"]
+    assert "detect_header" in first.meta["timings"] and "detect_header" not in second.meta["timings"]
+    assert second.header_row == first.header_row == 3
+    assert second.parsed_data == first.parsed_data
+    assert second.warnings == first.warnings and second.unmapped_columns == first.unmapped_columns
+
+    parse_excel(_workbook_bytes("Daily Report 2026-02-22", ["Date", "Power Generation (MWh)", "Coal Consumption (MT)"]))
+    parse_excel(_workbook_bytes("Shift handover notes for Unit 7", header, sheet="Handover"))
+    assert len(calls) == 3
+
+
+def test_corrected_mappings_are_persisted_and_applied(tmp_path, monkeypatch):
+    store = _use_store(tmp_path, monkeypatch)
+    header = ["Date", "Coal Consumption (MT)", "Power Generation (MWh)"]
+    template_id = parse_excel(_workbook_bytes("Daily Report 2026-02-20", header)).meta["template_id"]
+
+    with TestClient(main.app) as client:
+        bad = client.put(f"/templates/{template_id}/mappings", json=[{"col": 1, "param_name": "no_such_param"}])
+        missing = client.put("/templates/nope/mappings", json=[])
+        fixed = client.put(f"/templates/{template_id}/mappings", json=[{"col": 2, "param_name": None}])
+        listed = client.get("/templates").json()
+
+    assert bad.status_code == 400 and missing.status_code == 404
+    assert fixed.status_code == 200 and fixed.json()["corrected"]
+    assert [t["id"] for t in listed] == [template_id]
+
+    reopened = templates.TemplateStore(store.path)
+    assert reopened.get(template_id).corrected
+    monkeypatch.setattr(templates, "_default_store", reopened)
+    result = parse_excel(_workbook_bytes("Daily Report 2026-02-23", header))
+    assert result.meta["template_id"] == template_id
+    assert {c.param_name for c in result.parsed_data} == {"coal_consumption"}
+    assert [u.col for u in result.unmapped_columns] == [0, 2]
+
+
+def test_store_is_off_unless_enabled(tmp_path, monkeypatch):
+    monkeypatch.delenv("TEMPLATE_STORE_ENABLED", raising=False)
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    result = parse_excel(_workbook_bytes("Daily Report", ["Date", "Coal Consumption (MT)", "Power Generation (MWh)"]))
+
+    assert templates.get_template_store() is None
+    assert "template_id" not in result.meta and not (tmp_path / "templates.sqlite3").exists()
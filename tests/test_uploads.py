@@ -0,0 +1,53 @@
+from io import BytesIO
+import hashlib
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+from app.services.uploads import UploadTooLarge, spool_stream
+
+
+def test_spool_stream_hashes_and_enforces_limit(tmp_path, monkeypatch):
+    monkeypatch.setenv("UPLOAD_SPOOL_DIR", str(tmp_path))
+    data = os.urandom(3 * 1024 * 1024 + 7)
+
+    with spool_stream(BytesIO(data), "a.xlsx") as upload:
+        assert upload.size == len(data)
+        assert upload.sha256 == hashlib.sha256(data).hexdigest()
+        assert open(upload.path, "rb").read() == data
+    assert not os.listdir(tmp_path)
+
+    with pytest.raises(UploadTooLarge):
+        spool_stream(BytesIO(data), "a.xlsx", max_bytes=1024 * 1024)
+    assert not os.listdir(tmp_path)
+
+
+def test_parse_reads_spooled_upload_and_rejects_oversized(tmp_path, monkeypatch):
+    spool = tmp_path / "spool"
+    spool.mkdir()
+    monkeypatch.setenv("UPLOAD_SPOOL_DIR", str(spool))
+    monkeypatch.setenv("RESULT_CACHE_DIR", "")
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    file_bytes = open("sample_files/clean_data.xlsx", "rb").read()
+    rejected_before = main.HTTP_REQUESTS.value(method="POST", route="/parse", status="413")
+    jobs_rejected_before = main.HTTP_REQUESTS.value(method="POST", route="/jobs", status="413")
+
+    with TestClient(main.app) as client:
+        ok = client.post("/parse", files={"file": ("clean_data.xlsx", file_bytes)})
+        streamed = client.post("/parse/stream", files={"file": ("clean_data.xlsx", file_bytes)})
+        monkeypatch.setenv("UPLOAD_MAX_BYTES", str(len(file_bytes) - 1))
+        too_large = client.post("/parse", files={"file": ("clean_data.xlsx", file_bytes)})
+        monkeypatch.setenv("UPLOAD_MAX_BYTES", "100")
+        refused_early = client.post("/parse", files={"file": ("clean_data.xlsx", file_bytes)})
+        # A declared Content-Length over the limit is refused by middleware before routing.
+        by_length = client.post("/parse", content=b"x" * (200 * 1024), headers={"content-type": "multipart/form-data; boundary=x"})
+        job_by_length = client.post("/jobs", content=b"x" * (200 * 1024), headers={"content-type": "multipart/form-data; boundary=x"})
+
+    assert ok.status_code == 200 and ok.json()["status"] == "success"
+    assert streamed.text.splitlines()[-1].startswith('{"type": "trailer", "status": "success"')
+    assert too_large.status_code == 413 and refused_early.status_code == 413 and by_length.status_code == 413
+    assert main.HTTP_REQUESTS.value(method="POST", route="/parse", status="413") == rejected_before + 3
+    assert job_by_length.status_code == 413 and main.HTTP_REQUESTS.value(method="POST", route="/jobs", status="413") == jobs_rejected_before + 1
+    assert not os.listdir(spool)
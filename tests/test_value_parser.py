@@ -1,4 +1,8 @@
-from app.services.value_parser import parse_value
+import math
+
+from hypothesis import given, strategies as st
+
+from app.services.value_parser import ValueMemo, parse_value, parse_values
 
 
 def test_parse_none_and_na():
@@ -26,3 +30,47 @@ def test_parse_yes_no():
 def test_parse_parentheses_negative():
     assert parse_value("(123.4)") == -123.4
 
+
+
+_tokens = st.sampled_from(["N/A", "na", "-", "--", "YES", "no", "t", "F", " ", "", "%", "(", ")", ",", ".", "+", "-", "e", "nan", "inf"])
+_numeric_text = st.one_of(
+    st.integers(-10**7, 10**7).map(str),
+    st.floats(allow_nan=False, allow_infinity=False, width=32).map(repr),
+    st.integers(0, 10**9).map(lambda n: f"{n:,}"),
+)
+_raw_strings = st.lists(st.one_of(_tokens, _numeric_text, st.text("0123456789,.%()+- ", max_size=8)), max_size=4).map("".join)
+_cells = st.one_of(st.none(), st.booleans(), st.integers(-10**12, 10**12), st.floats(), _raw_strings, st.text(max_size=6))
+
+
+def _same(a, b):
+    if a is None or b is None:
+        return a is b
+    return (math.isnan(a) and math.isnan(b)) or (a == b and math.copysign(1, a) == math.copysign(1, b))
+
+
+@given(st.lists(_cells, max_size=40))
+def test_parse_values_matches_parse_value(values):
+    expected = [parse_value(v) for v in values]
+    actual = parse_values(values)
+    assert len(actual) == len(expected)
+    assert all(_same(a, e) for a, e in zip(actual, expected))
+
+
+def test_parse_values_numeric_fast_path():
+    assert parse_values([1, 2.5, 3]) == [1.0, 2.5, 3.0]
+    assert parse_values(["4,550", "4,550", None, "45%"]) == [4550.0, 4550.0, None, 0.45]
+
+
+def test_value_memo_reports_hits_and_interns_strings():
+    memo = ValueMemo()
+    column = ["4,550", "".join(["4,5", "50"]), "YES", None, 7]
+    assert column[0] is not column[1]
+    assert parse_values(column, memo) == [4550.0, 4550.0, 1.0, None, 7.0]
+    assert column[0] is column[1]
+    assert memo.stats()["hits"] == 1 and memo.stats()["misses"] == 2
+
+
+def test_value_memo_is_bounded():
+    memo = ValueMemo(max_entries=2)
+    parse_values(["1", "2", "3", "3"], memo)
+    assert memo.stats()["entries"] == 2 and memo.stats()["hits"] == 0
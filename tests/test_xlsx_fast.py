@@ -0,0 +1,119 @@
+from io import BytesIO
+import datetime
+import re
+import zipfile
+
+import pytest
+from openpyxl import Workbook
+
+from app.services import xlsx_fast
+from app.services.excel_reader import iter_sheet_rows, list_sheet_names
+
+
+RICH_SI = b'<si><r><t xml:space="preserve">Coal </t></r><r><rPr><b/></rPr><t>Use</t></r><rPh sb="0" eb="1"><t>KOORU</t></rPh></si>'
+
+
+def _save(wb):
+    buf = BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def _with_shared_strings(data: bytes) -> bytes:
+    """Rewrite openpyxl's inline strings into a shared string table, as Excel writes them."""
+    strings = []
+
+    def to_shared(m):
+        inner = RICH_SI[4:-5] if b"RICH" in m.group(2) else m.group(2)
+        strings.append(inner)
+        return b'<c%s t="s"><v>%d</v></c>' % (m.group(1), len(strings) - 1)
+
+    src = zipfile.ZipFile(BytesIO(data))
+    out = BytesIO()
+    with zipfile.ZipFile(out, "w") as dst:
+        for name in src.namelist():
+            body = src.read(name)
+            if name.startswith("xl/worksheets/"):
+                body = re.sub(rb'<c([^>]*?) t="inlineStr"><is>(.*?)</is></c>', to_shared, body)
+            elif name == "[Content_Types].xml":
+                body = body.replace(b"</Types>", b'<Override PartName="/xl/sharedStrings.xml" ContentType='
+                                    b'"application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/></Types>')
+            elif name == "xl/_rels/workbook.xml.rels":
+                body = body.replace(b"</Relationships>", b'<Relationship Id="rIdSS" Target="sharedStrings.xml" Type='
+                                    b'"http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings"/></Relationships>')
+            dst.writestr(name, body)
+        sst = b"".join(b"<si>" + s + b"</si>" for s in strings)
+        dst.writestr("xl/sharedStrings.xml", b'<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">' + sst + b"</sst>")
+    return out.getvalue()
+
+
+def _typed(rows):
+    return [[(type(v), v) for v in row] for row in rows]
+
+
+def _assert_same(file_bytes):
+    assert list_sheet_names(file_bytes, backend="fast") == list_sheet_names(file_bytes, backend="openpyxl")
+    index = 0
+    while True:
+        try:
+            title, rows = iter_sheet_rows(file_bytes, index, backend="openpyxl")
+        except IndexError:
+            with pytest.raises(IndexError):
+                iter_sheet_rows(file_bytes, index, backend="fast")
+            return
+        fast_title, fast_rows = iter_sheet_rows(file_bytes, index, backend="fast")
+        assert fast_title == title
+        assert _typed(fast_rows) == _typed(rows)
+        index += 1
+
+
+def _mixed_workbook():
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["Date", "Value", "Flag", "Text", "Time", "Delta"])
+    ws.append([datetime.datetime(2026, 2, 20, 13, 5), 1.5, True, "  spaced  ", datetime.time(10, 30), datetime.timedelta(hours=5)])
+    ws.append([datetime.date(2026, 2, 21), 10**20, False, "ünïcødé", None, -0.0])
+    ws["A5"] = "=SUM(B2:B3)"
+    ws["B5"] = "#N/A"
+    ws["C7"] = "RICH"
+    ws["H9"] = "far"
+    ws["B12"] = 3
+    sparse = wb.create_sheet("Sparse")
+    sparse["C3"] = "x"
+    sparse["A10"] = 5
+    wb.create_sheet("Empty")
+    return _save(wb)
+
+
+@pytest.mark.parametrize("name", ["clean_data.xlsx", "messy_data.xlsx", "multi_asset.xlsx"])
+def test_fast_reader_matches_openpyxl_on_samples(name):
+    _assert_same(open(f"sample_files/{name}", "rb").read())
+
+
+def test_fast_reader_matches_openpyxl_on_mixed_cells():
+    data = _mixed_workbook()
+    _assert_same(data)
+    _assert_same(_with_shared_strings(data))
+
+
+def test_shared_strings_drop_phonetic_runs():
+    _, rows = iter_sheet_rows(_with_shared_strings(_mixed_workbook()), backend="fast")
+    assert list(rows)[6][2] == "Coal Use"
+
+
+def test_prefixed_namespace_falls_back_to_openpyxl():
+    src = zipfile.ZipFile(BytesIO(open("sample_files/clean_data.xlsx", "rb").read()))
+    out = BytesIO()
+    with zipfile.ZipFile(out, "w") as dst:
+        for name in src.namelist():
+            body = src.read(name)
+            if name == "xl/worksheets/sheet1.xml":
+                body = re.sub(rb"<(/?)(\w)", rb"<\1x:\2", body).replace(b"<x:worksheet xmlns=", b"<x:worksheet xmlns:x=")
+            dst.writestr(name, body)
+    data = out.getvalue()
+
+    with pytest.raises(xlsx_fast.UnsupportedWorkbook):
+        xlsx_fast.iter_sheet_rows(data)
+    _, rows = iter_sheet_rows(data, backend="fast")
+    _, expected = iter_sheet_rows(open("sample_files/clean_data.xlsx", "rb").read(), backend="openpyxl")
+    assert list(rows) == list(expected)